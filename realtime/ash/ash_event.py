@@ -10,7 +10,6 @@ import pytz
 import shutil
 
 from PyQt4.QtCore import QObject, QFileInfo, QUrl, Qt
-from PyQt4.QtXml import QDomDocument
 from qgis.core import (
     QgsProject,
     QgsCoordinateReferenceSystem,
@@ -23,6 +22,7 @@ from qgis.core import (
 from jinja2 import Template
 from headless.tasks.utilities import download_file
 from realtime.exceptions import MapComposerError
+from realtime.rendering import render_context
 from realtime.utilities import realtime_logger_name
 from safe.common.exceptions import ZeroImpactException, KeywordNotFoundError
 from safe.common.utilities import format_int
@@ -141,19 +141,22 @@ class AshEvent(QObject):
 
         # load layers
         self.hazard_layer = read_qgis_layer(self.hazard_path, 'Ash Fall')
-        self.population_layer = read_qgis_layer(
+        # the exposure and context layers are shared by the events of this
+        # process, see realtime.datasets
+        context = render_context()
+        self.population_layer = context.static_layer(
             self.population_path, 'Population')
-        self.landcover_layer = read_qgis_layer(
+        self.landcover_layer = context.static_layer(
             self.landcover_path, 'Landcover')
-        self.cities_layer = read_qgis_layer(
+        self.cities_layer = context.static_layer(
             self.cities_path, 'Cities')
-        self.airport_layer = read_qgis_layer(
+        self.airport_layer = context.static_layer(
             self.airport_path, 'Airport')
-        self.volcano_layer = read_qgis_layer(
+        self.volcano_layer = context.static_layer(
             self.volcano_path, 'Volcano')
-        self.highlight_base_layer = read_qgis_layer(
+        self.highlight_base_layer = context.static_layer(
             self.highlight_base_path, 'Base Map')
-        self.overview_layer = read_qgis_layer(
+        self.overview_layer = context.static_layer(
             self.overview_path, 'Overview')
 
         # Write metadata for self reference
@@ -651,6 +654,16 @@ class AshEvent(QObject):
             'airport_impact')
         self.impact_exists = True
 
+        # The tables are written from the impact results, the report only
+        # loads them so it can be generated in another process
+        self.render_tables()
+
+    def render_tables(self):
+        """Write the html tables of the report."""
+        self.render_population_table()
+        self.render_nearby_table()
+        self.render_landcover_table()
+
     def generate_report(self):
         # Generate pdf report from impact/hazard
         LOGGER.info('Generating report')
@@ -659,13 +672,15 @@ class AshEvent(QObject):
             LOGGER.info('Cannot Generate report when no impact present.')
             return
 
+        # Templates and context layers are loaded once per process, the
+        # event project only brings its settings, not its layers
+        context = render_context()
+        context.load_project(self.project_path)
+        context.reset()
         project_instance = QgsProject.instance()
-        project_instance.setFileName(self.project_path)
-        project_instance.read()
 
         # get layer registry
         layer_registry = QgsMapLayerRegistry.instance()
-        layer_registry.removeAllMapLayers()
 
         # Set up the map renderer that will be assigned to the composition
         map_renderer = CANVAS.mapRenderer()
@@ -678,13 +693,13 @@ class AshEvent(QObject):
         map_renderer.setDestinationCrs(crs)
 
         # add place name layer
-        layer_registry.addMapLayer(self.cities_layer, False)
+        context.add_static_layer(self.cities_layer)
 
         # add airport layer
-        layer_registry.addMapLayer(self.airport_layer, False)
+        context.add_static_layer(self.airport_layer)
 
         # add volcano layer
-        layer_registry.addMapLayer(self.volcano_layer, False)
+        context.add_static_layer(self.volcano_layer)
 
         # add impact layer
         hazard_layer = read_qgis_layer(
@@ -692,21 +707,17 @@ class AshEvent(QObject):
         layer_registry.addMapLayer(hazard_layer, False)
 
         # add basemap layer
-        layer_registry.addMapLayer(self.highlight_base_layer, False)
+        context.add_static_layer(self.highlight_base_layer)
 
         # add basemap layer
-        layer_registry.addMapLayer(self.overview_layer, False)
+        context.add_static_layer(self.overview_layer)
 
         CANVAS.setExtent(hazard_layer.extent())
         CANVAS.refresh()
 
         template_path = self.ash_fixtures_dir('realtime-ash.qpt')
 
-        with open(template_path) as f:
-            template_content = f.read()
-
-        document = QDomDocument()
-        document.setContent(template_content)
+        document = context.template_document(template_path)
 
         # Now set up the composition
         # map_settings = QgsMapSettings()
@@ -752,11 +763,7 @@ class AshEvent(QObject):
                 template_path)
             raise MapComposerError
 
-        # setup impact table
-        self.render_population_table()
-        self.render_nearby_table()
-        self.render_landcover_table()
-
+        # setup impact table, written by calculate_impact
         impact_table = composition.getComposerItemById(
             'table-impact')
         if impact_table is None:
@@ -818,7 +825,7 @@ class AshEvent(QObject):
 
         project_instance.write(QFileInfo(self.project_path))
 
-        layer_registry.removeAllMapLayers()
+        context.reset()
         map_renderer.setDestinationCrs(default_crs)
         map_renderer.setProjectionsEnabled(False)
         LOGGER.info('Report generation completed.')
@@ -8,6 +8,9 @@ from dateutil.parser import parse
 
 from realtime.ash.ash_event import AshEvent
 from realtime.ash.push_ash import push_ash_event_to_rest
+from realtime.instrumentation import (
+    ANALYSIS_METRICS_FILE_NAME,
+    EventMetrics)
 from realtime.utilities import realtime_logger_name
 
 __author__ = 'Rizky Maulana Nugraha <lana.pcfre@gmail.com>'
@@ -40,45 +43,149 @@ def process_event(
     :param hazard_url:
     :return:
     """
-    population_path = os.environ['INASAFE_ASH_POPULATION_PATH']
-    landcover_path = os.environ['INASAFE_ASH_LANDCOVER_PATH']
-    cities_path = os.environ['INASAFE_ASH_CITIES_PATH']
-    airport_path = os.environ['INASAFE_ASH_AIRPORT_PATH']
-    volcano_path = os.environ['INASAFE_ASH_VOLCANO_PATH']
-    highlight_base_path = os.environ['INASAFE_ASH_HIGHLIGHT_BASE_PATH']
-    overview_path = os.environ['INASAFE_ASH_OVERVIEW_PATH']
+    event_args = {
+        'event_time': event_time,
+        'volcano_name': volcano_name,
+        'volcano_location': volcano_location,
+        'eruption_height': eruption_height,
+        'region': region,
+        'alert_level': alert_level,
+        # It will be processed either if it is a file or a url
+        'hazard_path': hazard_url
+    }
+
+    # Time spent in each processing stage, see realtime.instrumentation
+    metrics = EventMetrics('ash')
+    event_path = None
+    for locale in locales(locale_option):
+        event_path = process_locale(working_dir, locale, event_args, metrics)
+
+    metrics.write(event_path)
+
+
+def analyse_event(
+        working_dir,
+        locale_option='en',
+        event_time=None,
+        volcano_name=None,
+        volcano_location=None,
+        eruption_height=None,
+        region=None,
+        alert_level=None,
+        hazard_url=None):
+    """Calculate the impact of an ash event without generating the report.
+
+    The impact layers, the html tables and the metadata of the event are
+    written in the event folder, see :func:`render_event`. The parameters
+    are the ones of :func:`process_event`.
+
+    :return: The event folder, for render_event
+    :rtype: str
+    """
+    event_args = {
+        'event_time': event_time,
+        'volcano_name': volcano_name,
+        'volcano_location': volcano_location,
+        'eruption_height': eruption_height,
+        'region': region,
+        'alert_level': alert_level,
+        'hazard_path': hazard_url
+    }
+
+    metrics = EventMetrics('ash')
+    event_path = None
+    for locale in locales(locale_option):
+        event_path = process_locale(
+            working_dir, locale, event_args, metrics, render_flag=False)
 
+    metrics.write(event_path, ANALYSIS_METRICS_FILE_NAME)
+    return event_path
+
+
+def render_event(working_dir, event_folder, locale_option='en'):
+    """Generate and push the report of an event analysed by analyse_event.
+
+    :param working_dir: The working directory of ash reports
+    :param event_folder: The event folder returned by analyse_event
+    :param locale_option: the locale of the report
+    :return:
+    """
+    event_args = extract_folder_metadata(event_folder)
+    # The hazard layer is in the event folder already
+    event_args['hazard_path'] = None
+
+    metrics = EventMetrics('ash')
+    event_path = None
+    for locale in locales(locale_option):
+        event_path = process_locale(
+            working_dir, locale, event_args, metrics, analyse_flag=False)
+
+    metrics.write(event_path)
+
+
+def locales(locale_option):
+    """The locales of the reports.
+
+    :param locale_option: the locale of the report
+    :return: the locales, en is always included
+    :rtype: list
+    """
     # We always want to generate en products too so we manipulate the locale
     # list and loop through them:
     locale_list = [locale_option]
     if 'en' not in locale_list:
         locale_list.append('en')
+    return locale_list
+
 
-    for locale in locale_list:
-        LOGGER.info('Creating Ash Event for locale %s.' % locale)
+def process_locale(
+        working_dir,
+        locale,
+        event_args,
+        metrics,
+        analyse_flag=True,
+        render_flag=True):
+    """Calculate the impact and generate the report of a locale.
+
+    :param working_dir: The working directory of ash reports
+    :param locale: the locale of the report
+    :param event_args: The arguments of the AshEvent describing the event
+    :param metrics: The metrics of the event
+    :param analyse_flag: Whether to calculate the impact. If False it must
+        have been calculated by analyse_event.
+    :param render_flag: Whether to generate and push the report.
+    :return: The event folder
+    """
+    LOGGER.info('Creating Ash Event for locale %s.' % locale)
+    with metrics.stage('setup'):
         event = AshEvent(
             working_dir=working_dir,
             locale='en',
-            event_time=event_time,
-            volcano_name=volcano_name,
-            volcano_location=volcano_location,
-            eruption_height=eruption_height,
-            region=region,
-            alert_level=alert_level,
-            overview_path=overview_path,
-            population_path=population_path,
-            highlight_base_path=highlight_base_path,
-            volcano_path=volcano_path,
-            landcover_path=landcover_path,
-            cities_path=cities_path,
-            airport_path=airport_path,
-            # It will be processed either if it is a file or a url
-            hazard_path=hazard_url)
-
-        event.calculate_impact()
-        event.generate_report()
-        ret = push_ash_event_to_rest(ash_event=event)
+            overview_path=os.environ['INASAFE_ASH_OVERVIEW_PATH'],
+            population_path=os.environ['INASAFE_ASH_POPULATION_PATH'],
+            highlight_base_path=os.environ[
+                'INASAFE_ASH_HIGHLIGHT_BASE_PATH'],
+            volcano_path=os.environ['INASAFE_ASH_VOLCANO_PATH'],
+            landcover_path=os.environ['INASAFE_ASH_LANDCOVER_PATH'],
+            cities_path=os.environ['INASAFE_ASH_CITIES_PATH'],
+            airport_path=os.environ['INASAFE_ASH_AIRPORT_PATH'],
+            **event_args)
+
+    event_path = event.working_dir_path()
+    metrics.event_id = os.path.basename(os.path.normpath(event_path))
+    if analyse_flag:
+        with metrics.stage('impact'):
+            event.calculate_impact()
+    else:
+        # The impact layers and the tables are in the event folder
+        event.impact_exists = True
+    if render_flag:
+        with metrics.stage('pdf'):
+            event.generate_report()
+        with metrics.stage('push'):
+            ret = push_ash_event_to_rest(ash_event=event)
         LOGGER.info('Is Push successful? %s.' % bool(ret))
+    return event_path
 
 
 def extract_folder_metadata(event_folder):
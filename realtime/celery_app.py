@@ -1,6 +1,7 @@
 # coding=utf-8
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 
 __author__ = 'Rizky Maulana Nugraha <lana.pcfre@gmail.com>'
 __date__ = '12/11/15'
@@ -18,5 +19,25 @@ QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
 
 app.autodiscover_tasks(packages)
 
+
+@worker_init.connect
+def warm_up_worker(**kwargs):
+    """Build the indexes of the datasets before the processes are forked.
+
+    The worker processes must start within a few seconds, so the slow
+    builds (e.g. the exposure store of a new population raster) are done
+    here and shared with them, see realtime.datasets.
+    """
+    from realtime.datasets import warm_up
+    warm_up(fork_safe_only=True)
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    """Load the datasets of the tasks once per worker process."""
+    from realtime.datasets import warm_up
+    warm_up()
+
+
 if __name__ == '__main__':
     app.worker_main()
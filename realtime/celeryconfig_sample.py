@@ -4,6 +4,8 @@ Celery configuration file
 """
 import os
 
+from realtime.routing import RENDER_QUEUE, compute_queue, realtime_queues
+
 __author__ = 'Rizky Maulana Nugraha <lana.pcfre@gmail.com>'
 __date__ = '12/30/15'
 
@@ -13,15 +15,34 @@ BROKER_URL = os.environ.get('INASAFE_REALTIME_BROKER_HOST')
 
 CELERY_RESULT_BACKEND = BROKER_URL
 
+# Every hazard has its compute queue, the render queue is shared with task
+# priorities. See realtime.routing. The queues are declared with a maximum
+# priority, existing queues declared without it must be deleted first.
+CELERY_QUEUES = realtime_queues()
+
 CELERY_ROUTES = {
-    'realtime.tasks.flood': {
-        'queue': 'inasafe-realtime'
+    'realtime.tasks.earthquake.process_shake': {
+        'queue': compute_queue('earthquake')
+    },
+    'realtime.tasks.earthquake.check_event_exists': {
+        'queue': compute_queue('earthquake')
+    },
+    'realtime.tasks.flood.process_flood': {
+        'queue': compute_queue('flood')
     },
-    'realtime.tasks.earthquake': {
-        'queue': 'inasafe-realtime'
+    'realtime.tasks.ash.process_ash': {
+        'queue': compute_queue('ash')
+    },
+    'realtime.tasks.generic.check_broker_connection': {
+        'queue': RENDER_QUEUE
     }
 }
 
+# Take a single task at a time, so the waiting task with the highest
+# priority is the next one started
+CELERYD_PREFETCH_MULTIPLIER = 1
+CELERY_ACKS_LATE = True
+
 # RMN: This is really important.
 
 # Long bug description ahead! Beware.
@@ -39,6 +60,27 @@ CELERY_ROUTES = {
 # http://docs.celeryproject.org/en/latest/configuration.html#celeryd-concurrency
 CELERYD_CONCURRENCY = 1
 
+# Only the rendering needs this. Each event is processed by a chain of an
+# analysis task (grid parsing, clipping, impact functions, html tables) on
+# the compute queue of its hazard and a render task on the inasafe-realtime
+# queue, handing off the analysis products on disk. Run the render worker
+# as above and a compute worker per hazard, with the processors of the
+# machine shared by hazard weight. The commands are printed by:
+#
+#   python -m realtime.routing --workers
+#
+# e.g. on 8 cores:
+#
+#   celery worker -A realtime.celery_app -Q inasafe-realtime -c 1
+#   celery worker -A realtime.celery_app \
+#       -Q inasafe-realtime-compute-earthquake -c 5
+#   celery worker -A realtime.celery_app -Q inasafe-realtime-compute-ash -c 2
+#   celery worker -A realtime.celery_app -Q inasafe-realtime-compute-flood \
+#       -c 1
+#
+# The compute workers only run analysis tasks, which do not render
+# anything, and their processes do not share threads.
+
 CELERY_ALWAYS_EAGER = os.environ.get('CELERY_ALWAYS_EAGER', 'False') == 'True'
 
 FLOOD_WORKING_DIRECTORY = os.environ.get(
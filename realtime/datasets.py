@@ -0,0 +1,247 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Exposure datasets warmed up once per worker process.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+The tasks get their exposure datasets from per process caches: the
+exposure store of the population raster, the geonames index, the flood
+population layer (see :func:`shared_layer`) and the ash layers (the static
+layers of :func:`realtime.rendering.render_context`). :func:`warm_up` fills
+these caches before the first event, so it does not pay for them.
+
+The datasets without open file handles (exposure stores and geonames
+indexes) are warmed up in the parent of the celery workers and shared
+copy-on-write with the forked processes, which would otherwise be killed
+for starting too slowly while the exposure store is built. The layers are
+warmed up in every worker process. Set INASAFE_WARMUP_HAZARDS to a comma
+separated list of hazards to only warm up the datasets of these hazards,
+e.g. 'earthquake' on a machine only processing shakes.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from realtime.exceptions import FileNotFoundError, InvalidLayerError
+from realtime.routing import HAZARDS
+from realtime.utilities import realtime_logger_name
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Ash layers: environment variable of their path and title in AshEvent
+ASH_LAYERS = OrderedDict([
+    ('population', ('INASAFE_ASH_POPULATION_PATH', 'Population')),
+    ('landcover', ('INASAFE_ASH_LANDCOVER_PATH', 'Landcover')),
+    ('cities', ('INASAFE_ASH_CITIES_PATH', 'Cities')),
+    ('airport', ('INASAFE_ASH_AIRPORT_PATH', 'Airport')),
+    ('volcano', ('INASAFE_ASH_VOLCANO_PATH', 'Volcano')),
+    ('highlight-base', ('INASAFE_ASH_HIGHLIGHT_BASE_PATH', 'Base Map')),
+    ('overview', ('INASAFE_ASH_OVERVIEW_PATH', 'Overview')),
+])
+
+# Layers read by shared_layer in this process, path -> (mtime, layer)
+_LAYERS = {}
+
+# Outcome of the warm up of every dataset in this process, keyed by name
+_WARM = OrderedDict()
+
+
+def _modification_time(path):
+    """Modification time of a file or None if it does not exist."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def shared_layer(layer_path):
+    """Get a layer read with safe read_layer, once per process.
+
+    The layer is shared by the tasks of the process, which must not modify
+    it. It is read again if its file changed.
+
+    :param layer_path: Path to the layer.
+    :type layer_path: str
+
+    :rtype: safe.storage.layer.Layer
+    """
+    # noinspection PyPackageRequirements
+    from safe.storage.core import read_layer
+    layer_path = os.path.abspath(layer_path)
+    mtime = _modification_time(layer_path)
+    cached = _LAYERS.get(layer_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    layer = read_layer(layer_path)
+    _LAYERS[layer_path] = (mtime, layer)
+    return layer
+
+
+def warmup_hazards():
+    """The hazards whose datasets are warmed up.
+
+    :rtype: list
+    """
+    if 'INASAFE_WARMUP_HAZARDS' not in os.environ:
+        return list(HAZARDS)
+    return [
+        hazard.strip()
+        for hazard in os.environ['INASAFE_WARMUP_HAZARDS'].split(',')
+        if hazard.strip() in HAZARDS]
+
+
+def _shake_population_path():
+    """Path to the population raster of the shakes, None if not found."""
+    from realtime.earthquake.make_map import event_settings
+    from realtime.earthquake.shake_event import population_raster_path
+    try:
+        return population_raster_path(event_settings()[0])
+    except FileNotFoundError:
+        return None
+
+
+def _shake_geonames_path():
+    """Path to the geonames sqlite of the shakes, None if not found."""
+    from realtime.earthquake.shake_event import geonames_sqlite_path
+    try:
+        return geonames_sqlite_path()
+    except FileNotFoundError:
+        return None
+
+
+def _load_exposure_store(raster_path):
+    """Open the exposure store of a raster, building it if needed."""
+    from realtime.exposure_store import exposure_store
+    store = exposure_store(raster_path)
+    return '%d x %d cells' % (store.columns, store.rows)
+
+
+def _load_geonames_index(sqlite_path):
+    """Load the geonames index of a sqlite."""
+    from realtime.earthquake.geonames_index import geonames_index
+    return '%d places' % len(geonames_index(sqlite_path))
+
+
+def _load_shared_layer(layer_path):
+    """Read a layer shared with shared_layer."""
+    shared_layer(layer_path)
+    return None
+
+
+def _static_layer_loader(title):
+    """Loader of a static layer of the render context with a title."""
+    def load(layer_path):
+        from realtime.rendering import render_context
+        layer = render_context().static_layer(layer_path, title)
+        if not layer.isValid():
+            raise InvalidLayerError('%s is not a valid layer' % layer_path)
+        return None
+    return load
+
+
+def _environment_path(name):
+    """Getter of a path from an environment variable, None if unset."""
+    def path():
+        return os.environ.get(name)
+    return path
+
+
+def datasets(hazards=None):
+    """The datasets warmed up.
+
+    :param hazards: (Optional) The hazards of the datasets, defaults to
+        :func:`warmup_hazards`.
+    :type hazards: list
+
+    :return: Tuples of (name, hazard, path getter, loader, fork safe). The
+        path getter returns None if the dataset is not configured. The
+        loader returns a description of what was loaded or None.
+    :rtype: list
+    """
+    if hazards is None:
+        hazards = warmup_hazards()
+    specs = [
+        ('earthquake-population', 'earthquake', _shake_population_path,
+         _load_exposure_store, True),
+        ('earthquake-geonames', 'earthquake', _shake_geonames_path,
+         _load_geonames_index, True),
+        ('flood-population', 'flood',
+         _environment_path('INASAFE_FLOOD_POPULATION_PATH'),
+         _load_shared_layer, False),
+    ]
+    for name, (variable, title) in ASH_LAYERS.items():
+        specs.append((
+            'ash-%s' % name, 'ash', _environment_path(variable),
+            _static_layer_loader(title), False))
+    return [spec for spec in specs if spec[1] in hazards]
+
+
+def warm_up(fork_safe_only=False, hazards=None):
+    """Load and validate the datasets into the caches of this process.
+
+    A dataset failing to load is reported by :func:`warm_status` and
+    loaded again by the first task using it.
+
+    :param fork_safe_only: (Optional) Whether to only warm up the datasets
+        that can be shared with forked processes.
+    :type fork_safe_only: bool
+
+    :param hazards: (Optional) The hazards of the datasets, defaults to
+        :func:`warmup_hazards`.
+    :type hazards: list
+
+    :return: The status of the datasets, see :func:`warm_status`.
+    :rtype: OrderedDict
+    """
+    for name, hazard, path_getter, loader, fork_safe in datasets(hazards):
+        if fork_safe_only and not fork_safe:
+            continue
+        status = OrderedDict([
+            ('hazard', hazard),
+            ('path', None),
+            ('state', 'missing'),
+            ('detail', None),
+            ('seconds', 0.0),
+            ('pid', os.getpid())])
+        start = time.time()
+        # noinspection PyBroadException
+        try:
+            status['path'] = path_getter()
+            if status['path'] is None:
+                status['detail'] = 'Not configured'
+            elif not os.path.exists(status['path']):
+                status['detail'] = 'No such file'
+            else:
+                status['detail'] = loader(status['path'])
+                status['state'] = 'warm'
+        except Exception as e:  # pylint: disable=broad-except
+            LOGGER.exception('Warming up %s failed' % name)
+            status['state'] = 'failed'
+            status['detail'] = '%s: %s' % (type(e).__name__, e)
+        status['seconds'] = time.time() - start
+        _WARM[name] = status
+        LOGGER.info('Dataset %s is %s in %.2fs: %s' % (
+            name, status['state'], status['seconds'], status['detail']))
+    return warm_status()
+
+
+def warm_status():
+    """The outcome of the warm up of the datasets in this process.
+
+    :return: A dict keyed by dataset name, with the hazard, path, state
+        ('warm', 'missing' or 'failed'), detail, seconds and pid of the
+        process that loaded it.
+    :rtype: OrderedDict
+    """
+    return OrderedDict(
+        (name, dict(status)) for name, status in _WARM.items())
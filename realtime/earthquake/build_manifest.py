@@ -0,0 +1,232 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Manifest of the products built in an event directory.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+from realtime.utilities import realtime_logger_name
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+
+def inputs_hash(inputs):
+    """Fingerprint of a set of inputs.
+
+    Use it as the input of the products depending on another product, so
+    they are rebuilt when any input of that product changes.
+
+    :param inputs: Fingerprints of the inputs keyed by input name. Values
+        must be JSON serialisable.
+    :type inputs: dict
+
+    :return: SHA-1 of the inputs.
+    :rtype: str
+    """
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True)).hexdigest()
+
+
+class BuildManifest(object):
+    """Products of an event directory with the fingerprints of their inputs.
+
+    The manifest is a manifest.json file in the event directory mapping
+    each product name to::
+
+        {'inputs': {input name: fingerprint}, 'outputs': [paths],
+         'single': whether the builder returned a path or a list}
+
+    Output paths inside the event directory are stored relative to it. A
+    product is current when it was built from the same inputs and all its
+    outputs still exist, otherwise :func:`build` runs its builder again.
+
+    Several processes may build the products of an event, so saving only
+    merges the products recorded or invalidated by this manifest into the
+    file, under an exclusive lock.
+    """
+
+    file_name = 'manifest.json'
+
+    lock_file_name = 'manifest.lock'
+
+    def __init__(self, directory):
+        """Constructor.
+
+        :param directory: The event directory.
+        :type directory: str
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, self.file_name)
+        # Entries recorded by this manifest, None for the invalidated ones
+        self.changes = {}
+        self.products = self._read()
+
+    def _read(self):
+        """Read the products of the manifest file, if any."""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as manifest_file:
+                return json.loads(manifest_file.read())
+        except (IOError, ValueError) as e:
+            LOGGER.warning('Ignoring unreadable manifest %s' % self.path)
+            LOGGER.exception(e)
+            return {}
+
+    @contextmanager
+    def _lock(self):
+        """Hold the exclusive lock of the manifest, like
+        :meth:`realtime.idempotency.IdempotencyStore.lock`."""
+        lock_path = os.path.join(self.directory, self.lock_file_name)
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _relative_path(self, path):
+        """Path relative to the event directory if it is inside it."""
+        relative_path = os.path.relpath(
+            os.path.abspath(path), os.path.abspath(self.directory))
+        if relative_path.startswith(os.pardir):
+            return os.path.abspath(path)
+        return relative_path
+
+    def outputs(self, product):
+        """Absolute paths of the outputs recorded for a product.
+
+        :param product: The product name.
+        :type product: str
+
+        :return: The paths, None if the product is not recorded.
+        :rtype: list
+        """
+        entry = self.products.get(product)
+        if entry is None:
+            return None
+        return [
+            os.path.join(self.directory, path) for path in entry['outputs']]
+
+    def is_current(self, product, inputs):
+        """Check whether a product was built from the given inputs.
+
+        :param product: The product name.
+        :type product: str
+
+        :param inputs: Fingerprints of the inputs keyed by input name.
+        :type inputs: dict
+
+        :return: True if the recorded inputs are the same and every output
+            exists.
+        :rtype: bool
+        """
+        entry = self.products.get(product)
+        if entry is None or entry['inputs'] != inputs:
+            return False
+        return all(os.path.exists(path) for path in self.outputs(product))
+
+    def record(self, product, inputs, outputs):
+        """Record a product and save the manifest.
+
+        :param product: The product name.
+        :type product: str
+
+        :param inputs: Fingerprints of the inputs keyed by input name.
+        :type inputs: dict
+
+        :param outputs: Path, or list of paths, of the files built.
+        :type outputs: str, list
+        """
+        single = not isinstance(outputs, (list, tuple))
+        if single:
+            outputs = [outputs]
+        self.products[product] = {
+            'inputs': inputs,
+            'outputs': [self._relative_path(path) for path in outputs],
+            'single': single}
+        self.changes[product] = self.products[product]
+        self.save()
+
+    def invalidate(self, product):
+        """Forget a product so it is built again.
+
+        :param product: The product name.
+        :type product: str
+        """
+        if self.products.pop(product, None) is not None:
+            self.changes[product] = None
+            self.save()
+
+    def build(self, product, inputs, builder, force_flag=False):
+        """Build a product unless it is current.
+
+        :param product: The product name.
+        :type product: str
+
+        :param inputs: Fingerprints of the inputs keyed by input name.
+        :type inputs: dict
+
+        :param builder: Function without arguments building the product and
+            returning the path to it, or a list of paths.
+        :type builder: callable
+
+        :param force_flag: (Optional) Whether to build even if the product
+            is current.
+        :type force_flag: bool
+
+        :return: The path, or the list of paths, to the product.
+        :rtype: str, list
+        """
+        if not force_flag and self.is_current(product, inputs):
+            LOGGER.info('%s is up to date' % product)
+            outputs = self.outputs(product)
+            if self.products[product]['single']:
+                return outputs[0]
+            return outputs
+
+        LOGGER.info('Building %s' % product)
+        result = builder()
+        self.record(product, inputs, result)
+        return result
+
+    def save(self):
+        """Merge the changes of this manifest into the file atomically.
+
+        The file is read again under the lock, so the products built by
+        other processes since this manifest was read are kept.
+        """
+        with self._lock():
+            products = self._read()
+            for product, entry in self.changes.items():
+                if entry is None:
+                    products.pop(product, None)
+                else:
+                    products[product] = entry
+            handle, temp_path = tempfile.mkstemp(
+                prefix='.manifest-', suffix='.json', dir=self.directory)
+            try:
+                with os.fdopen(handle, 'w') as manifest_file:
+                    manifest_file.write(
+                        json.dumps(products, indent=2, sort_keys=True))
+                os.rename(temp_path, self.path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        self.products = products
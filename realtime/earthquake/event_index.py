@@ -0,0 +1,245 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Persistent index of the event directories of a shakemaps folder.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import calendar
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from realtime.utilities import (
+    is_event_id,
+    make_directory,
+    realtime_logger_name,
+    shakemap_data_dir)
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# A directory modified less than this many seconds before it was scanned
+# may still get entries within the same mtime tick, so it is scanned again
+MTIME_RESOLUTION = 2.0
+
+# Indexes opened by this process, keyed by working dir, index dir and
+# thread, as sqlite connections can only be used by their thread
+_INDEXES = {}
+
+
+def event_index_dir():
+    """Create (if needed) and return the path to the event index dir."""
+    dir_path = os.path.join(shakemap_data_dir(), 'event-index')
+    make_directory(dir_path)
+    return dir_path
+
+
+def event_timestamp(event_id):
+    """Seconds since the epoch of an event id, read as UTC.
+
+    Only differences between timestamps are used, so the time zone of the
+    ids does not matter.
+
+    :param event_id: The event id e.g. 20130110204706.
+    :type event_id: str
+
+    :rtype: int
+    """
+    return calendar.timegm(
+        datetime.strptime(event_id, '%Y%m%d%H%M%S').timetuple())
+
+
+class EventIndex(object):
+    """Event ids of a shakemaps working dir held in a sqlite database.
+
+    The working dir is only listed again when its modification time
+    changed, i.e. when event directories were added or removed, and then
+    only the new names are validated as event ids. Queries are answered
+    from the database without touching the event directories.
+    """
+
+    def __init__(self, working_dir, index_path=None):
+        """Constructor.
+
+        :param working_dir: The directory holding one directory per event.
+        :type working_dir: str
+
+        :param index_path: (Optional) Path of the sqlite database. Defaults
+            to a file named after the working dir in
+            :func:`event_index_dir`.
+        :type index_path: str
+        """
+        self.working_dir = os.path.abspath(working_dir)
+        if index_path is None:
+            index_path = os.path.join(
+                event_index_dir(),
+                '%s.sqlite' % hashlib.sha1(self.working_dir).hexdigest())
+        self.index_path = index_path
+        # sqlite connections must not be shared with forked workers
+        self.pid = os.getpid()
+        self.connection = sqlite3.connect(index_path, timeout=30)
+        # Event ids are used as str everywhere else
+        self.connection.text_factory = str
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'event_id TEXT PRIMARY KEY, timestamp INTEGER NOT NULL)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS state ('
+                'key TEXT PRIMARY KEY, value)')
+
+    def _state(self, key):
+        """Get a value of the state table."""
+        row = self.connection.execute(
+            'SELECT value FROM state WHERE key = ?', (key, )).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def refresh(self, force_flag=False):
+        """Bring the index up to date with the working dir.
+
+        :param force_flag: (Optional) Whether to list the working dir even
+            if it was not modified.
+        :type force_flag: bool
+
+        :return: False if the working dir does not exist.
+        :rtype: bool
+        """
+        try:
+            mtime = os.stat(self.working_dir).st_mtime
+        except OSError:
+            return False
+        if not force_flag and self._state('mtime') == mtime:
+            return True
+
+        names = set(os.listdir(self.working_dir))
+        indexed = set(
+            row[0] for row in self.connection.execute(
+                'SELECT event_id FROM events'))
+        added = [
+            (name, event_timestamp(name)) for name in names - indexed
+            if is_event_id(name)]
+        removed = [(event_id, ) for event_id in indexed - names]
+        if time.time() - mtime < MTIME_RESOLUTION:
+            # Do not trust an mtime that may not change again
+            mtime = None
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO events (event_id, timestamp) '
+                'VALUES (?, ?)', added)
+            self.connection.executemany(
+                'DELETE FROM events WHERE event_id = ?', removed)
+            self.connection.execute(
+                'INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                ('mtime', mtime))
+        LOGGER.debug('Event index of %s: %d added, %d removed' % (
+            self.working_dir, len(added), len(removed)))
+        return True
+
+    def event_ids(self):
+        """All the event ids, sorted ascending.
+
+        :return: The event ids, None if the working dir does not exist.
+        :rtype: list
+        """
+        if not self.refresh():
+            return None
+        return [
+            row[0] for row in self.connection.execute(
+                'SELECT event_id FROM events ORDER BY event_id')]
+
+    def exists(self, event_id):
+        """Check whether an event is in the working dir.
+
+        :param event_id: The event id.
+        :type event_id: str
+
+        :rtype: bool
+        """
+        self.refresh()
+        return self.connection.execute(
+            'SELECT 1 FROM events WHERE event_id = ?',
+            (event_id, )).fetchone() is not None
+
+    def latest(self, before=None):
+        """The most recent event id.
+
+        :param before: (Optional) Ignore the ids after this one, e.g. ids
+            in the future.
+        :type before: str
+
+        :return: The event id, None if there is none.
+        :rtype: str
+        """
+        self.refresh()
+        if before is None:
+            row = self.connection.execute(
+                'SELECT MAX(event_id) FROM events').fetchone()
+        else:
+            row = self.connection.execute(
+                'SELECT MAX(event_id) FROM events WHERE event_id <= ?',
+                (before, )).fetchone()
+        return row[0]
+
+    def within(self, seconds, newest=None):
+        """The event ids within some seconds of the newest one.
+
+        :param seconds: Maximum time between an event and the newest one.
+        :type seconds: int
+
+        :param newest: (Optional) The newest event id, defaults to the
+            latest event.
+        :type newest: str
+
+        :return: The event ids, newest first.
+        :rtype: list
+        """
+        if newest is None:
+            newest = self.latest()
+        else:
+            self.refresh()
+        if newest is None:
+            return []
+        timestamp = event_timestamp(newest)
+        return [
+            row[0] for row in self.connection.execute(
+                'SELECT event_id FROM events '
+                'WHERE timestamp > ? AND event_id <= ? '
+                'ORDER BY event_id DESC',
+                (timestamp - seconds, newest))]
+
+
+def event_index(working_dir):
+    """Get the event index of a working dir, opened once per thread.
+
+    The watcher processes events on the threads of its work queue, each of
+    them gets its own connection to the database.
+
+    :param working_dir: The directory holding one directory per event.
+    :type working_dir: str
+
+    :rtype: EventIndex
+    """
+    key = (
+        os.path.abspath(working_dir),
+        event_index_dir(),
+        threading.current_thread().ident)
+    index = _INDEXES.get(key)
+    if index is None or index.pid != os.getpid():
+        index = EventIndex(working_dir)
+        _INDEXES[key] = index
+    return index
@@ -0,0 +1,123 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Great circle distances and bearings on arrays of places.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import numpy
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+# Mean radius of the earth in km
+EARTH_RADIUS = 6371.0
+
+# Compass points, clockwise from north
+CARDINAL_DIRECTIONS = numpy.array([
+    'N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE',
+    'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW',
+    'NW', 'NNW'])
+
+
+def distance(longitude, latitude, longitudes, latitudes):
+    """Great circle distance from a location to places (haversine).
+
+    :param longitude: Longitude of the location e.g. the epicentre.
+    :type longitude: float
+
+    :param latitude: Latitude of the location.
+    :type latitude: float
+
+    :param longitudes: Longitudes of the places.
+    :type longitudes: list, numpy.ndarray
+
+    :param latitudes: Latitudes of the places.
+    :type latitudes: list, numpy.ndarray
+
+    :return: The distance in km to every place.
+    :rtype: numpy.ndarray
+    """
+    latitude = numpy.radians(latitude)
+    latitudes = numpy.radians(numpy.asarray(latitudes, dtype=numpy.float64))
+    delta_longitudes = numpy.radians(
+        numpy.asarray(longitudes, dtype=numpy.float64) - longitude)
+    half_chord = (
+        numpy.sin((latitudes - latitude) / 2) ** 2 +
+        numpy.cos(latitude) * numpy.cos(latitudes) *
+        numpy.sin(delta_longitudes / 2) ** 2)
+    return 2 * EARTH_RADIUS * numpy.arcsin(
+        numpy.sqrt(numpy.clip(half_chord, 0, 1)))
+
+
+def bearing(from_longitudes, from_latitudes, to_longitudes, to_latitudes):
+    """Initial great circle bearing between locations.
+
+    Scalars and arrays can be mixed, e.g. to get the bearing from the
+    epicentre to every place.
+
+    :return: The bearing in degrees clockwise from north, in the range
+        [-180, 180] like QgsPoint.azimuth.
+    :rtype: numpy.ndarray
+    """
+    from_latitudes = numpy.radians(
+        numpy.asarray(from_latitudes, dtype=numpy.float64))
+    to_latitudes = numpy.radians(
+        numpy.asarray(to_latitudes, dtype=numpy.float64))
+    delta_longitudes = numpy.radians(
+        numpy.asarray(to_longitudes, dtype=numpy.float64) -
+        numpy.asarray(from_longitudes, dtype=numpy.float64))
+    y = numpy.sin(delta_longitudes) * numpy.cos(to_latitudes)
+    x = (
+        numpy.cos(from_latitudes) * numpy.sin(to_latitudes) -
+        numpy.sin(from_latitudes) * numpy.cos(to_latitudes) *
+        numpy.cos(delta_longitudes))
+    return numpy.degrees(numpy.arctan2(y, x))
+
+
+def distance_and_bearings(longitude, latitude, longitudes, latitudes):
+    """Distance and bearings between a location and places in one call.
+
+    :param longitude: Longitude of the location e.g. the epicentre.
+    :type longitude: float
+
+    :param latitude: Latitude of the location.
+    :type latitude: float
+
+    :param longitudes: Longitudes of the places.
+    :type longitudes: list, numpy.ndarray
+
+    :param latitudes: Latitudes of the places.
+    :type latitudes: list, numpy.ndarray
+
+    :return: A tuple of (distance in km, bearing from each place to the
+        location, bearing from the location to each place).
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    return (
+        distance(longitude, latitude, longitudes, latitudes),
+        bearing(longitudes, latitudes, longitude, latitude),
+        bearing(longitude, latitude, longitudes, latitudes))
+
+
+def cardinal_directions(bearings):
+    """Convert bearings to compass points e.g. SSE.
+
+    :param bearings: Bearings in degrees clockwise from north.
+    :type bearings: list, numpy.ndarray
+
+    :return: The 16 wind compass point nearest to every bearing.
+    :rtype: numpy.ndarray
+    """
+    interval = 360. / len(CARDINAL_DIRECTIONS)
+    # Round half away from zero like the builtin round()
+    bearings = numpy.asarray(bearings, dtype=numpy.float64) / interval
+    indices = (numpy.sign(bearings) * numpy.floor(
+        numpy.abs(bearings) + 0.5)).astype(numpy.intp)
+    return CARDINAL_DIRECTIONS[indices % len(CARDINAL_DIRECTIONS)]
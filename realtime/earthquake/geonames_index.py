@@ -0,0 +1,334 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **In memory spatial index of the geonames populated places.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import logging
+import os
+import sqlite3
+import struct
+
+import numpy
+
+from realtime.exceptions import InvalidLayerError
+from realtime.utilities import realtime_logger_name
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Size of the index buckets in degrees
+DEFAULT_CELL_SIZE = 1.0
+
+# Indexes loaded by this process, keyed by sqlite path
+_INDEXES = {}
+
+
+def blob_to_point(blob):
+    """Get the coordinates of a point from a spatialite geometry blob.
+
+    The centre of the minimum bounding rectangle stored in the blob header
+    is used, which for a point is the point itself.
+
+    :param blob: Spatialite geometry blob.
+    :type blob: buffer, str
+
+    :return: Tuple of (x, y) or None if the blob is not a spatialite
+        geometry.
+    :rtype: (float, float)
+    """
+    blob = str(blob)
+    if len(blob) < 39 or blob[0] != '\x00' or blob[38] != '\x7c':
+        return None
+    byte_order = '<' if blob[1] == '\x01' else '>'
+    x_minimum, y_minimum, x_maximum, y_maximum = struct.unpack(
+        byte_order + '4d', blob[6:38])
+    return (x_minimum + x_maximum) / 2, (y_minimum + y_maximum) / 2
+
+
+class GeonamesIndex(object):
+    """Populated places of a geonames sqlite held in compact arrays.
+
+    Only places with 'PPL' in their fcode and a population of at least 1 are
+    queried. The places are bucketed on a regular grid of cells so bounding
+    box and nearest neighbour queries only look at nearby places.
+
+    Queries return indices into the ids, names, populations, longitudes and
+    latitudes arrays. The features attribute is the index of every geonames
+    feature, whose counts drive :func:`expanding_bbox`.
+    """
+
+    def __init__(self, ids, names, populations, longitudes, latitudes,
+                 cell_size=DEFAULT_CELL_SIZE, features=None):
+        """Constructor.
+
+        Use :func:`from_sqlite` or :func:`geonames_index` to load an index
+        from a geonames sqlite.
+
+        :param ids: Feature ids of the places.
+        :type ids: list
+
+        :param names: Ascii names of the places.
+        :type names: list
+
+        :param populations: Populations of the places.
+        :type populations: list
+
+        :param longitudes: Longitudes of the places.
+        :type longitudes: list
+
+        :param latitudes: Latitudes of the places.
+        :type latitudes: list
+
+        :param cell_size: Size of the index buckets in degrees.
+        :type cell_size: float
+
+        :param features: (Optional) Index of every feature of the geonames,
+            populated or not. Defaults to this index.
+        :type features: GeonamesIndex
+        """
+        self.ids = numpy.asarray(ids, dtype=numpy.int64)
+        self.names = numpy.asarray(names, dtype=object)
+        self.populations = numpy.asarray(populations, dtype=numpy.int64)
+        self.longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+        self.latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+        self.cell_size = cell_size
+        self.features = features if features is not None else self
+        # Path and modification time of the source sqlite, if any
+        self.source_path = None
+        self.source_mtime = None
+
+        # Sort the places by bucket so each bucket is a slice of _order
+        columns = self._cell(self.longitudes)
+        rows = self._cell(self.latitudes)
+        self._order = numpy.lexsort((rows, columns))
+        self._buckets = {}
+        if self._order.size:
+            keys = numpy.column_stack(
+                (columns[self._order], rows[self._order]))
+            boundaries = numpy.flatnonzero(
+                numpy.any(keys[1:] != keys[:-1], axis=1)) + 1
+            starts = numpy.concatenate(([0], boundaries))
+            ends = numpy.concatenate((boundaries, [self._order.size]))
+            for start, end in zip(starts, ends):
+                key = (int(keys[start, 0]), int(keys[start, 1]))
+                self._buckets[key] = (start, end)
+
+    @classmethod
+    def from_sqlite(cls, sqlite_path, cell_size=DEFAULT_CELL_SIZE):
+        """Load the populated places and the features of a geonames sqlite.
+
+        :param sqlite_path: Path to the geonames sqlite e.g.
+            indonesia.sqlite.
+        :type sqlite_path: str
+
+        :param cell_size: Size of the index buckets in degrees.
+        :type cell_size: float
+
+        :return: The index.
+        :rtype: GeonamesIndex
+
+        :raises: InvalidLayerError
+        """
+        LOGGER.debug('Loading geonames index from %s' % sqlite_path)
+        # The columns of the places and of the features
+        places = ([], [], [], [], [])
+        features = ([], [], [], [], [])
+        try:
+            connection = sqlite3.connect(sqlite_path)
+            try:
+                cursor = connection.execute(
+                    'SELECT rowid, asciiname, fcode, population, geometry '
+                    'FROM geonames')
+                for feature_id, name, code, population, geometry in cursor:
+                    if geometry is None:
+                        continue
+                    point = blob_to_point(geometry)
+                    if point is None:
+                        continue
+                    row = (
+                        feature_id, str(name or ''), int(population or 0),
+                        point[0], point[1])
+                    columns = [features]
+                    # Make sure the place is a populated place
+                    if 'PPL' in str(code) and row[2] >= 1:
+                        columns.append(places)
+                    for column_lists in columns:
+                        for values, value in zip(column_lists, row):
+                            values.append(value)
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            raise InvalidLayerError(
+                'Failed to load geonames from %s.\n%s' % (sqlite_path, e))
+
+        index = cls(
+            *places, cell_size=cell_size,
+            features=cls(*features, cell_size=cell_size))
+        index.source_path = sqlite_path
+        index.source_mtime = os.path.getmtime(sqlite_path)
+        LOGGER.debug('Loaded %d populated places of %d features' % (
+            len(index), len(index.features)))
+        return index
+
+    def __len__(self):
+        return self.ids.size
+
+    def _cell(self, values):
+        """Bucket number of coordinates."""
+        return numpy.floor(
+            numpy.asarray(values) / self.cell_size).astype(numpy.int64)
+
+    def _candidates(self, x_minimum, y_minimum, x_maximum, y_maximum):
+        """Indices of the places in the buckets covering a bounding box."""
+        column_range = self._cell([x_minimum, x_maximum])
+        row_range = self._cell([y_minimum, y_maximum])
+        slices = []
+        for column in range(column_range[0], column_range[1] + 1):
+            for row in range(row_range[0], row_range[1] + 1):
+                bucket = self._buckets.get((column, row))
+                if bucket is not None:
+                    slices.append(self._order[bucket[0]:bucket[1]])
+        if not slices:
+            return numpy.empty(0, dtype=numpy.intp)
+        return numpy.concatenate(slices)
+
+    def bbox(self, x_minimum, y_minimum, x_maximum, y_maximum):
+        """Find the places inside a bounding box (edges included).
+
+        :return: Indices of the places sorted ascending.
+        :rtype: numpy.ndarray
+        """
+        candidates = self._candidates(
+            x_minimum, y_minimum, x_maximum, y_maximum)
+        longitudes = self.longitudes[candidates]
+        latitudes = self.latitudes[candidates]
+        inside = (
+            (longitudes >= x_minimum) & (longitudes <= x_maximum) &
+            (latitudes >= y_minimum) & (latitudes <= y_maximum))
+        return numpy.sort(candidates[inside])
+
+    def expanding_bbox(
+            self, x_minimum, y_minimum, x_maximum, y_maximum,
+            zoom_factor, attempts_limit, minimum_count=1):
+        """Find the smallest expansion of a box holding enough features.
+
+        This gives the same result as querying the box, scaling it around
+        its centre by zoom_factor and querying again until at least
+        minimum_count geonames features are found or attempts_limit boxes
+        were tried. Like the spatialite query it replaces, every feature is
+        counted, populated place or not. Only one query is made, for the
+        largest box, and the count of every smaller box is derived from it.
+
+        :param zoom_factor: Factor the box is scaled by on each attempt.
+        :type zoom_factor: float
+
+        :param attempts_limit: Maximum number of boxes to try.
+        :type attempts_limit: int
+
+        :param minimum_count: Number of features to find.
+        :type minimum_count: int
+
+        :return: A tuple of (boxes, selection, found flag). boxes is a list
+            of (x_minimum, y_minimum, x_maximum, y_maximum, count) for every
+            box tried, count being the number of features in the box.
+            selection is the indices of the populated places in the last box
+            tried. When no box holds enough places the box is scaled one
+            more time and this final box is the last item of boxes, with a
+            count of None.
+        :rtype: (list, numpy.ndarray, bool)
+        """
+        centre_x = (x_minimum + x_maximum) / 2.0
+        centre_y = (y_minimum + y_maximum) / 2.0
+        extents = []
+        width = x_maximum - x_minimum
+        height = y_maximum - y_minimum
+        for _ in range(attempts_limit + 1):
+            extents.append((
+                centre_x - width / 2.0, centre_y - height / 2.0,
+                centre_x + width / 2.0, centre_y + height / 2.0))
+            width *= zoom_factor
+            height *= zoom_factor
+
+        features = self.features
+        candidates = features.bbox(*extents[attempts_limit - 1])
+        longitudes = features.longitudes[candidates]
+        latitudes = features.latitudes[candidates]
+        boxes = []
+        for extent in extents[:attempts_limit]:
+            count = numpy.count_nonzero(
+                (longitudes >= extent[0]) & (longitudes <= extent[2]) &
+                (latitudes >= extent[1]) & (latitudes <= extent[3]))
+            boxes.append(extent + (int(count), ))
+            if count >= minimum_count:
+                return boxes, self.bbox(*extent), True
+        selection = self.bbox(*extents[attempts_limit - 1])
+        boxes.append(extents[attempts_limit] + (None, ))
+        return boxes, selection, False
+
+    def nearest(self, longitude, latitude, count=1):
+        """Find the places nearest to a location.
+
+        Distances are measured in degrees, like the QGIS geometry API.
+
+        :param longitude: Longitude of the location.
+        :type longitude: float
+
+        :param latitude: Latitude of the location.
+        :type latitude: float
+
+        :param count: Number of places to find.
+        :type count: int
+
+        :return: Indices of the places ordered from the nearest.
+        :rtype: numpy.ndarray
+        """
+        count = min(count, len(self))
+        if count < 1:
+            return numpy.empty(0, dtype=numpy.intp)
+        # Grow the searched square until it holds enough places and the
+        # furthest one found is closer than the edge of the square.
+        radius = self.cell_size
+        while True:
+            candidates = self._candidates(
+                longitude - radius, latitude - radius,
+                longitude + radius, latitude + radius)
+            if candidates.size >= count:
+                distances = numpy.hypot(
+                    self.longitudes[candidates] - longitude,
+                    self.latitudes[candidates] - latitude)
+                order = numpy.argsort(distances, kind='mergesort')[:count]
+                if (distances[order[-1]] <= radius or
+                        candidates.size == len(self)):
+                    return candidates[order]
+            radius *= 2
+
+
+def geonames_index(sqlite_path):
+    """Get the geonames index of a sqlite, loading it once per process.
+
+    The index is loaded again if the sqlite was modified since.
+
+    :param sqlite_path: Path to the geonames sqlite.
+    :type sqlite_path: str
+
+    :return: The index.
+    :rtype: GeonamesIndex
+
+    :raises: InvalidLayerError
+    """
+    sqlite_path = os.path.abspath(sqlite_path)
+    index = _INDEXES.get(sqlite_path)
+    if index is None or index.source_mtime != os.path.getmtime(sqlite_path):
+        index = GeonamesIndex.from_sqlite(sqlite_path)
+        _INDEXES[sqlite_path] = index
+    return index
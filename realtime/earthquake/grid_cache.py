@@ -0,0 +1,263 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **On disk cache of parsed grid.xml files.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from realtime.earthquake.grid_model import GridModel
+from realtime.utilities import (
+    shakemap_data_dir,
+    make_directory,
+    realtime_logger_name)
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Default upper bound of the cache size in bytes (512 MiB)
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+
+def file_sha1(path, block_size=1024 * 1024):
+    """Compute the SHA-1 hex digest of a file without loading it at once.
+
+    :param path: Path to the file.
+    :type path: str
+
+    :param block_size: Number of bytes read per iteration.
+    :type block_size: int
+
+    :return: The hex digest.
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as input_file:
+        while True:
+            block = input_file.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def grid_cache_dir():
+    """Create (if needed) and return the path to the grid cache dir."""
+    dir_path = os.path.join(shakemap_data_dir(), 'grid-cache')
+    make_directory(dir_path)
+    return dir_path
+
+
+class GridCache(object):
+    """Cache of GridModel instances keyed by the SHA-1 of their grid.xml.
+
+    Each entry is a directory named after the hash holding:
+
+        * data.npy - the grid body, loaded memory mapped.
+        * header.json - grid attributes, event, specification and fields.
+
+    The cache is bounded by total size. The modification time of an entry
+    is refreshed every time it is used, and the least recently used entries
+    are removed first when the cache grows beyond its size.
+    """
+
+    data_file_name = 'data.npy'
+    header_file_name = 'header.json'
+
+    def __init__(self, cache_dir=None, max_size=None):
+        """Constructor.
+
+        :param cache_dir: (Optional) The directory holding the entries.
+            Defaults to grid-cache under :func:`shakemap_data_dir`.
+        :type cache_dir: str
+
+        :param max_size: (Optional) Maximum total size in bytes. Defaults to
+            the INASAFE_GRID_CACHE_SIZE environment variable if set,
+            otherwise to DEFAULT_CACHE_SIZE.
+        :type max_size: int
+        """
+        if cache_dir is None:
+            cache_dir = grid_cache_dir()
+        else:
+            make_directory(cache_dir)
+        self.cache_dir = cache_dir
+
+        if max_size is None:
+            if 'INASAFE_GRID_CACHE_SIZE' in os.environ:
+                max_size = int(os.environ['INASAFE_GRID_CACHE_SIZE'])
+            else:
+                max_size = DEFAULT_CACHE_SIZE
+        self.max_size = max_size
+
+    def entry_path(self, key):
+        """Path of the entry directory for a key.
+
+        :param key: SHA-1 hex digest of a grid.xml.
+        :type key: str
+
+        :rtype: str
+        """
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """Get a cached grid model.
+
+        :param key: SHA-1 hex digest of a grid.xml.
+        :type key: str
+
+        :return: The grid model with its data memory mapped, or None if the
+            key is not cached.
+        :rtype: GridModel
+        """
+        entry_path = self.entry_path(key)
+        header_path = os.path.join(entry_path, self.header_file_name)
+        data_path = os.path.join(entry_path, self.data_file_name)
+        if not (os.path.exists(header_path) and os.path.exists(data_path)):
+            return None
+        try:
+            with open(header_path) as header_file:
+                header = json.loads(header_file.read())
+            data = numpy.load(data_path, mmap_mode='r')
+        except (IOError, ValueError) as e:
+            LOGGER.warning('Discarding unreadable grid cache entry %s' % key)
+            LOGGER.exception(e)
+            shutil.rmtree(entry_path, ignore_errors=True)
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+
+        grid_model = GridModel(
+            header['grid_attributes'],
+            header['event'],
+            header['specification'],
+            header['fields'],
+            data)
+        grid_model.source_hash = key
+        return grid_model
+
+    def put(self, key, grid_model):
+        """Store a grid model in the cache.
+
+        The entry is written to a temporary directory and renamed into place
+        so other processes never see a partial entry.
+
+        :param key: SHA-1 hex digest of a grid.xml.
+        :type key: str
+
+        :param grid_model: The grid model to store.
+        :type grid_model: GridModel
+        """
+        entry_path = self.entry_path(key)
+        if os.path.exists(entry_path):
+            return
+        temp_path = tempfile.mkdtemp(prefix='.%s-' % key, dir=self.cache_dir)
+        try:
+            numpy.save(
+                os.path.join(temp_path, self.data_file_name),
+                numpy.ascontiguousarray(grid_model.data))
+            header = {
+                'grid_attributes': grid_model.grid_attributes,
+                'event': grid_model.event,
+                'specification': grid_model.specification,
+                'fields': grid_model.fields
+            }
+            with open(
+                    os.path.join(temp_path, self.header_file_name),
+                    'w') as header_file:
+                header_file.write(json.dumps(header))
+            os.rename(temp_path, entry_path)
+        except OSError:
+            # Most likely another process stored the same grid meanwhile
+            LOGGER.debug('Grid cache entry %s was not stored' % key)
+        finally:
+            if os.path.exists(temp_path):
+                shutil.rmtree(temp_path, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """List the cache entries.
+
+        :return: List of (last used time, size in bytes, key) tuples.
+        :rtype: list
+        """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            if key.startswith('.'):
+                continue
+            entry_path = self.entry_path(key)
+            if not os.path.isdir(entry_path):
+                continue
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(entry_path, name))
+                    for name in os.listdir(entry_path))
+                last_used = os.path.getmtime(entry_path)
+            except OSError:
+                continue
+            entries.append((last_used, size, key))
+        return entries
+
+    def size(self):
+        """Total size of the cache in bytes."""
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits.
+
+        :return: The keys of the removed entries.
+        :rtype: list
+        """
+        entries = sorted(self.entries())
+        total_size = sum(entry[1] for entry in entries)
+        removed = []
+        for _, size, key in entries:
+            if total_size <= self.max_size:
+                break
+            LOGGER.debug('Evicting grid cache entry %s' % key)
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total_size -= size
+            removed.append(key)
+        return removed
+
+    def load(self, grid_xml_path):
+        """Get the grid model of a grid.xml, parsing it only if needed.
+
+        :param grid_xml_path: Path to the grid.xml file.
+        :type grid_xml_path: str
+
+        :return: The grid model.
+        :rtype: GridModel
+
+        :raises: GridXmlParseError
+        """
+        key = file_sha1(grid_xml_path)
+        grid_model = self.get(key)
+        if grid_model is not None:
+            LOGGER.debug('Grid cache hit for %s' % grid_xml_path)
+            return grid_model
+
+        LOGGER.debug('Grid cache miss for %s' % grid_xml_path)
+        grid_model = GridModel.from_file(grid_xml_path)
+        grid_model.source_hash = key
+        self.put(key, grid_model)
+        return grid_model
@@ -0,0 +1,445 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **In memory model of a shakemap grid.xml.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import hashlib
+import json
+import logging
+# noinspection PyPep8Naming
+import xml.etree.cElementTree as ElementTree
+
+import numpy
+
+from realtime.exceptions import GridXmlParseError
+from realtime.utilities import realtime_logger_name
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+
+def _local_name(tag):
+    """Strip the xml namespace from an element tag.
+
+    :param tag: Tag as reported by ElementTree e.g.
+        '{http://earthquake.usgs.gov/eqcenter/shakemap}event'
+    :type tag: str
+
+    :return: The tag without namespace e.g. 'event'
+    :rtype: str
+    """
+    if '}' in tag:
+        return tag.split('}', 1)[1]
+    return tag
+
+
+def read_grid_header(grid_xml_path):
+    """Read only the header (event and grid specification) of a grid.xml.
+
+    Parsing stops as soon as the grid_data element is reached, so this is
+    cheap even for very large grids.
+
+    :param grid_xml_path: Path to the grid.xml file.
+    :type grid_xml_path: str
+
+    :return: A tuple of (grid attributes, event attributes,
+        grid specification attributes, list of field names).
+    :rtype: (dict, dict, dict, list)
+
+    :raises: GridXmlParseError
+    """
+    return _parse_grid_xml(grid_xml_path, header_only=True)[:4]
+
+
+def _parse_grid_xml(grid_xml_path, header_only=False):
+    """Parse a grid.xml using iterparse.
+
+    :param grid_xml_path: Path to the grid.xml file.
+    :type grid_xml_path: str
+
+    :param header_only: Whether to stop before reading the grid_data.
+    :type header_only: bool
+
+    :return: A tuple of (grid attributes, event attributes, grid
+        specification attributes, list of field names, data array). The data
+        array is None when header_only is True.
+    :rtype: (dict, dict, dict, list, numpy.ndarray)
+
+    :raises: GridXmlParseError
+    """
+    grid_attributes = {}
+    event = {}
+    specification = {}
+    fields = {}
+    data = None
+    try:
+        context = ElementTree.iterparse(
+            grid_xml_path, events=('start', 'end'))
+        root = None
+        for action, element in context:
+            tag = _local_name(element.tag)
+            if action == 'start':
+                if root is None:
+                    root = element
+                    grid_attributes = dict(element.attrib)
+                elif tag == 'grid_data' and header_only:
+                    break
+                continue
+
+            if tag == 'event':
+                event = dict(element.attrib)
+            elif tag == 'grid_specification':
+                specification = dict(element.attrib)
+            elif tag == 'grid_field':
+                fields[int(element.attrib['index'])] = (
+                    element.attrib['name'].upper())
+            elif tag == 'grid_data':
+                # Bulk conversion of the whole body in C instead of
+                # splitting every line in Python.
+                data = numpy.fromstring(
+                    element.text or '', dtype=numpy.float64, sep=' ')
+            # We do not need the element any more, release its memory
+            element.clear()
+            if root is not None and element is not root:
+                root.clear()
+    except (SyntaxError, IOError, KeyError, ValueError) as e:
+        LOGGER.exception('Grid xml parse failed')
+        raise GridXmlParseError(
+            'Failed to parse grid file %s.\n%s\n%s' % (
+                grid_xml_path, e.__class__, str(e)))
+
+    if not event or not specification or not fields:
+        raise GridXmlParseError(
+            'Grid file %s has no event, grid_specification or grid_field '
+            'elements.' % grid_xml_path)
+
+    field_names = [fields[index] for index in sorted(fields.keys())]
+    if data is not None:
+        if data.size % len(field_names) != 0:
+            raise GridXmlParseError(
+                'Grid file %s has %d values which is not a multiple of the '
+                '%d grid fields.' % (
+                    grid_xml_path, data.size, len(field_names)))
+        data = data.reshape(-1, len(field_names))
+    elif not header_only:
+        raise GridXmlParseError(
+            'Grid file %s has no grid_data element.' % grid_xml_path)
+
+    return grid_attributes, event, specification, field_names, data
+
+
+class GridModel(object):
+    """Typed numpy representation of a shakemap grid.xml.
+
+    The header (event and grid specification) is kept as plain attributes
+    and the body is kept as a single (points, fields) float64 array. Each
+    grid field (LON, LAT, MMI, PGA ...) is available as a column of that
+    array so the raster, city and impact stages can work from memory instead
+    of going back to the xml.
+    """
+
+    def __init__(self, grid_attributes, event, specification, fields, data):
+        """Constructor.
+
+        Use :func:`from_file` to build a model from a grid.xml.
+
+        :param grid_attributes: Attributes of the shakemap_grid element.
+        :type grid_attributes: dict
+
+        :param event: Attributes of the event element.
+        :type event: dict
+
+        :param specification: Attributes of the grid_specification element.
+        :type specification: dict
+
+        :param fields: Upper cased field names ordered by their index.
+        :type fields: list
+
+        :param data: Array of shape (points, len(fields)).
+        :type data: numpy.ndarray
+        """
+        self.grid_attributes = grid_attributes
+        self.event = event
+        self.specification = specification
+        self.fields = list(fields)
+        self.data = data
+        # SHA-1 of the grid.xml this model was read from, set by GridCache
+        self.source_hash = None
+        self._data_hash = None
+        self._grids = {}
+
+    @classmethod
+    def from_file(cls, grid_xml_path):
+        """Parse a grid.xml into a new model.
+
+        :param grid_xml_path: Path to the grid.xml file.
+        :type grid_xml_path: str
+
+        :return: The grid model.
+        :rtype: GridModel
+
+        :raises: GridXmlParseError
+        """
+        LOGGER.debug('Parsing grid.xml into grid model: %s' % grid_xml_path)
+        grid_attributes, event, specification, fields, data = (
+            _parse_grid_xml(grid_xml_path))
+        return cls(grid_attributes, event, specification, fields, data)
+
+    @property
+    def event_id(self):
+        """The event id as declared in the grid."""
+        return self.grid_attributes.get('event_id')
+
+    @property
+    def longitude(self):
+        """Longitude of the epicentre."""
+        return float(self.event['lon'])
+
+    @property
+    def latitude(self):
+        """Latitude of the epicentre."""
+        return float(self.event['lat'])
+
+    @property
+    def magnitude(self):
+        """Magnitude of the event."""
+        return float(self.event['magnitude'])
+
+    @property
+    def depth(self):
+        """Depth of the event in km."""
+        return float(self.event['depth'])
+
+    @property
+    def location(self):
+        """Description of the event location e.g. 'Papua'."""
+        return self.event.get('event_description', '').strip()
+
+    @property
+    def event_timestamp(self):
+        """Raw event time stamp e.g. '2012-08-07T01:55:12WIB'."""
+        return self.event['event_timestamp']
+
+    @property
+    def x_minimum(self):
+        return float(self.specification['lon_min'])
+
+    @property
+    def x_maximum(self):
+        return float(self.specification['lon_max'])
+
+    @property
+    def y_minimum(self):
+        return float(self.specification['lat_min'])
+
+    @property
+    def y_maximum(self):
+        return float(self.specification['lat_max'])
+
+    @property
+    def columns(self):
+        """Number of grid columns (nlon)."""
+        return int(self.specification['nlon'])
+
+    @property
+    def rows(self):
+        """Number of grid rows (nlat)."""
+        return int(self.specification['nlat'])
+
+    @property
+    def x_spacing(self):
+        """Distance between two grid columns in degrees."""
+        if 'nominal_lon_spacing' in self.specification:
+            return float(self.specification['nominal_lon_spacing'])
+        return (self.x_maximum - self.x_minimum) / max(self.columns - 1, 1)
+
+    @property
+    def y_spacing(self):
+        """Distance between two grid rows in degrees."""
+        if 'nominal_lat_spacing' in self.specification:
+            return float(self.specification['nominal_lat_spacing'])
+        return (self.y_maximum - self.y_minimum) / max(self.rows - 1, 1)
+
+    @property
+    def data_hash(self):
+        """SHA-1 of the grid specification, fields and body.
+
+        Unlike :attr:`source_hash` it does not change when only the event
+        header of a republished grid.xml changes, so it identifies the
+        products computed from the grid values alone.
+        """
+        if self._data_hash is None:
+            digest = hashlib.sha1(json.dumps(
+                [self.specification, self.fields], sort_keys=True))
+            digest.update(numpy.ascontiguousarray(self.data).tostring())
+            self._data_hash = digest.hexdigest()
+        return self._data_hash
+
+    @property
+    def point_count(self):
+        """Number of points in the grid body."""
+        return self.data.shape[0]
+
+    def has_field(self, name):
+        """Check whether the grid contains a field.
+
+        :param name: Field name, case insensitive e.g. 'mmi'.
+        :type name: str
+
+        :rtype: bool
+        """
+        return name.upper() in self.fields
+
+    def field(self, name):
+        """Get the values of a field for every point of the grid.
+
+        :param name: Field name, case insensitive e.g. 'mmi'.
+        :type name: str
+
+        :return: One dimensional array of the field values.
+        :rtype: numpy.ndarray
+
+        :raises: KeyError if the grid has no such field.
+        """
+        try:
+            index = self.fields.index(name.upper())
+        except ValueError:
+            raise KeyError('Grid has no field %s' % name)
+        return self.data[:, index]
+
+    @property
+    def lon(self):
+        return self.field('LON')
+
+    @property
+    def lat(self):
+        return self.field('LAT')
+
+    @property
+    def mmi(self):
+        return self.field('MMI')
+
+    @property
+    def pga(self):
+        return self.field('PGA')
+
+    def grid_indices(self):
+        """Row and column of every point of the grid body.
+
+        Row 0 is the northern most row, column 0 the western most column,
+        matching the order BMKG writes grid_data in.
+
+        :return: Tuple of (rows, columns) integer arrays.
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        columns = numpy.rint(
+            (self.lon - self.x_minimum) / self.x_spacing).astype(numpy.intp)
+        rows = numpy.rint(
+            (self.y_maximum - self.lat) / self.y_spacing).astype(numpy.intp)
+        return rows, columns
+
+    def grid(self, name='MMI'):
+        """Get a field as a two dimensional (rows, columns) array.
+
+        Cells without a point in the grid body are set to NaN.
+
+        :param name: Field name, case insensitive. Defaults to MMI.
+        :type name: str
+
+        :return: Array of shape (rows, columns).
+        :rtype: numpy.ndarray
+        """
+        name = name.upper()
+        if name in self._grids:
+            return self._grids[name]
+        values = self.field(name)
+        shape = (self.rows, self.columns)
+        if values.size == self.rows * self.columns:
+            # The usual case, the body is a complete row major grid.
+            grid = values.reshape(shape)
+        else:
+            grid = numpy.empty(shape, dtype=numpy.float64)
+            grid.fill(numpy.nan)
+            rows, columns = self.grid_indices()
+            valid = (
+                (rows >= 0) & (rows < shape[0]) &
+                (columns >= 0) & (columns < shape[1]))
+            grid[rows[valid], columns[valid]] = values[valid]
+        self._grids[name] = grid
+        return grid
+
+    def sample(self, longitudes, latitudes, name='MMI', no_data=0.0):
+        """Look up the value of a field at many locations at once.
+
+        The lookup matches a pixel identify on the raster written by
+        ShakeGrid.mmi_to_raster: the grid extent is divided in
+        (columns x rows) pixels and each pixel holds the value of the grid
+        point nearest to its centre (gdal_grid nearest neighbour).
+
+        :param longitudes: Longitudes of the locations.
+        :type longitudes: list, numpy.ndarray
+
+        :param latitudes: Latitudes of the locations.
+        :type latitudes: list, numpy.ndarray
+
+        :param name: Field name, case insensitive. Defaults to MMI.
+        :type name: str
+
+        :param no_data: Value for locations outside of the grid extent or
+            on a cell without data. Defaults to 0.
+        :type no_data: float
+
+        :return: One value per location.
+        :rtype: numpy.ndarray
+        """
+        longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+        latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+        grid = self.grid(name)
+        values = numpy.empty(longitudes.shape, dtype=numpy.float64)
+        values.fill(no_data)
+
+        inside = (
+            (longitudes >= self.x_minimum) & (longitudes <= self.x_maximum) &
+            (latitudes >= self.y_minimum) & (latitudes <= self.y_maximum))
+        if not inside.any():
+            return values
+
+        # Pixel of the raster holding each location
+        pixel_width = (self.x_maximum - self.x_minimum) / self.columns
+        pixel_height = (self.y_maximum - self.y_minimum) / self.rows
+        pixel_columns = numpy.clip(numpy.floor(
+            (longitudes[inside] - self.x_minimum) / pixel_width),
+            0, self.columns - 1)
+        pixel_rows = numpy.clip(numpy.floor(
+            (self.y_maximum - latitudes[inside]) / pixel_height),
+            0, self.rows - 1)
+
+        # Grid point nearest to the centre of that pixel
+        columns = numpy.clip(numpy.rint(
+            (pixel_columns + 0.5) * pixel_width / self.x_spacing),
+            0, self.columns - 1).astype(numpy.intp)
+        rows = numpy.clip(numpy.rint(
+            (pixel_rows + 0.5) * pixel_height / self.y_spacing),
+            0, self.rows - 1).astype(numpy.intp)
+
+        sampled = grid[rows, columns]
+        sampled[numpy.isnan(sampled)] = no_data
+        values[inside] = sampled
+        return values
+
+    def __unicode__(self):
+        return 'GridModel %s: %d points, fields %s' % (
+            self.event_id, self.point_count, ', '.join(self.fields))
+
+    def __str__(self):
+        return self.__unicode__()
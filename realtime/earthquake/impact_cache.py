@@ -0,0 +1,237 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **On disk cache of ITB impact results.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from realtime.utilities import (
+    shakemap_data_dir,
+    make_directory,
+    realtime_logger_name)
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Default maximum number of cached impact results
+DEFAULT_MAX_ENTRIES = 256
+
+# Bump when the impact model changes so older results are not reused
+IMPACT_CACHE_VERSION = '1'
+
+# Keywords holding dicts keyed by MMI band
+MMI_KEYWORDS = ['fatalities_per_mmi', 'exposed_per_mmi', 'displaced_per_mmi']
+
+
+def impact_cache_dir():
+    """Create (if needed) and return the path to the impact cache dir."""
+    dir_path = os.path.join(shakemap_data_dir(), 'impact-cache')
+    make_directory(dir_path)
+    return dir_path
+
+
+def impact_key(hazard_fingerprint, exposure_fingerprint, algorithm, engine):
+    """Build the cache key of an impact analysis.
+
+    :param hazard_fingerprint: Fingerprint of the hazard e.g. the SHA-1 of
+        the grid.xml.
+    :type hazard_fingerprint: str
+
+    :param exposure_fingerprint: Fingerprint of the population raster.
+    :type exposure_fingerprint: str
+
+    :param algorithm: Interpolation algorithm of the shake raster.
+    :type algorithm: str
+
+    :param engine: The impact engine used.
+    :type engine: str
+
+    :return: The key.
+    :rtype: str
+    """
+    return hashlib.sha1('|'.join([
+        IMPACT_CACHE_VERSION,
+        hazard_fingerprint,
+        exposure_fingerprint,
+        algorithm,
+        engine])).hexdigest()
+
+
+class ImpactCache(object):
+    """Cache of impact analysis results.
+
+    Each entry is a directory named after the key holding:
+
+        * impact.tif and impact.xml - the impact layer and its keywords.
+        * result.json - the fatalities, exposed and displaced counts per mmi
+          band and the total fatalities.
+
+    The least recently used entries are removed when there are more than
+    max_entries entries.
+    """
+
+    result_file_name = 'result.json'
+    layer_file_name = 'impact.tif'
+    keywords_file_name = 'impact.xml'
+
+    def __init__(self, cache_dir=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """Constructor.
+
+        :param cache_dir: (Optional) The directory holding the entries.
+            Defaults to impact-cache under :func:`shakemap_data_dir`.
+        :type cache_dir: str
+
+        :param max_entries: (Optional) Maximum number of entries.
+        :type max_entries: int
+        """
+        if cache_dir is None:
+            cache_dir = impact_cache_dir()
+        else:
+            make_directory(cache_dir)
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def entry_path(self, key):
+        """Path of the entry directory for a key.
+
+        :param key: Key built with :func:`impact_key`.
+        :type key: str
+
+        :rtype: str
+        """
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key, tif_path=None, keywords_path=None):
+        """Get a cached impact result, copying its layer into place.
+
+        :param key: Key built with :func:`impact_key`.
+        :type key: str
+
+        :param tif_path: (Optional) Path to copy the impact layer to. The
+            layer is not copied if not given.
+        :type tif_path: str
+
+        :param keywords_path: (Optional) Path to copy the impact keywords
+            to. The keywords are not copied if not given.
+        :type keywords_path: str
+
+        :return: The impact keywords (see :func:`put`) or None if the key is
+            not cached.
+        :rtype: dict
+        """
+        entry_path = self.entry_path(key)
+        result_path = os.path.join(entry_path, self.result_file_name)
+        if not os.path.exists(result_path):
+            return None
+        try:
+            with open(result_path) as result_file:
+                result = json.loads(result_file.read())
+            if tif_path is not None:
+                shutil.copyfile(
+                    os.path.join(entry_path, self.layer_file_name), tif_path)
+            if keywords_path is not None:
+                shutil.copyfile(
+                    os.path.join(entry_path, self.keywords_file_name),
+                    keywords_path)
+        except (IOError, ValueError) as e:
+            LOGGER.warning('Discarding unreadable impact cache entry %s' % key)
+            LOGGER.exception(e)
+            shutil.rmtree(entry_path, ignore_errors=True)
+            return None
+
+        # JSON only has string keys, give the mmi bands back their int keys
+        for keyword in MMI_KEYWORDS:
+            result[keyword] = dict(
+                (int(mmi), value) for mmi, value in result[keyword].items())
+
+        # Mark the entry as recently used
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, keywords, tif_path, keywords_path):
+        """Store an impact result in the cache.
+
+        :param key: Key built with :func:`impact_key`.
+        :type key: str
+
+        :param keywords: The impact keywords. Only the counts per mmi band
+            and the total fatalities are stored.
+        :type keywords: dict
+
+        :param tif_path: Path to the impact layer.
+        :type tif_path: str
+
+        :param keywords_path: Path to the impact keywords.
+        :type keywords_path: str
+        """
+        entry_path = self.entry_path(key)
+        if os.path.exists(entry_path):
+            return
+        result = {'total_fatalities': keywords['total_fatalities']}
+        if hasattr(result['total_fatalities'], 'item'):
+            # numpy scalar
+            result['total_fatalities'] = result['total_fatalities'].item()
+        for keyword in MMI_KEYWORDS:
+            result[keyword] = dict(
+                (int(mmi), float(value))
+                for mmi, value in keywords[keyword].items())
+        temp_path = tempfile.mkdtemp(prefix='.%s-' % key, dir=self.cache_dir)
+        try:
+            shutil.copyfile(
+                tif_path, os.path.join(temp_path, self.layer_file_name))
+            shutil.copyfile(
+                keywords_path,
+                os.path.join(temp_path, self.keywords_file_name))
+            with open(
+                    os.path.join(temp_path, self.result_file_name),
+                    'w') as result_file:
+                result_file.write(json.dumps(result))
+            os.rename(temp_path, entry_path)
+        except (IOError, OSError):
+            # Most likely another process stored the same result meanwhile
+            LOGGER.debug('Impact cache entry %s was not stored' % key)
+        finally:
+            if os.path.exists(temp_path):
+                shutil.rmtree(temp_path, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries above max_entries.
+
+        :return: The keys of the removed entries.
+        :rtype: list
+        """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_path = self.entry_path(key)
+            if key.startswith('.') or not os.path.isdir(entry_path):
+                continue
+            try:
+                entries.append((os.path.getmtime(entry_path), key))
+            except OSError:
+                continue
+        entries.sort()
+        removed = []
+        for _, key in entries[:max(len(entries) - self.max_entries, 0)]:
+            LOGGER.debug('Evicting impact cache entry %s' % key)
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            removed.append(key)
+        return removed
@@ -0,0 +1,150 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **In process ITB earthquake fatality model.**
+
+This computes the same exposed, displaced and fatality counts per MMI band
+as the safe ITBFatalityFunction, directly on aligned MMI and population
+arrays.
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+
+import numpy
+
+from safe.impact_functions.core import population_rounding
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+# Engines computing the impacts of a shake event, selected with the
+# INASAFE_REALTIME_IMPACT_ENGINE environment variable
+NATIVE_IMPACT_ENGINE = 'native'
+IMPACT_FUNCTION_ENGINE = 'impact_function'
+
+# Coefficients of the ITB fatality rate power model
+FATALITY_X = 0.62275231
+FATALITY_Y = 8.03314466
+
+# MMI bands reported, each band covers (mmi - step, mmi + step]
+MMI_RANGE = range(2, 11)
+MMI_STEP = 0.5
+
+# Rates of people displaced for each MMI band
+DISPLACEMENT_RATE = {
+    2: 0.0, 3: 0.0, 4: 0.0009, 5: 0.0077, 6: 0.0304, 7: 0.0777, 8: 0.1045,
+    9: 0.1208, 10: 0.1397
+}
+
+
+def impact_engine():
+    """Get the engine used to compute the impacts of shake events.
+
+    The safe ITBFatalityFunction is used by default. Set the
+    INASAFE_REALTIME_IMPACT_ENGINE environment variable to 'native' to opt
+    in to the in process engine, see test_native_impacts_parity of
+    realtime.test.test_shake_event for its comparison with the impact
+    function.
+
+    :return: NATIVE_IMPACT_ENGINE or IMPACT_FUNCTION_ENGINE.
+    :rtype: str
+    """
+    engine = os.environ.get(
+        'INASAFE_REALTIME_IMPACT_ENGINE', IMPACT_FUNCTION_ENGINE)
+    if engine not in [NATIVE_IMPACT_ENGINE, IMPACT_FUNCTION_ENGINE]:
+        return IMPACT_FUNCTION_ENGINE
+    return engine
+
+
+def fatality_rate(mmi):
+    """ITB fatality rate of an MMI level.
+
+    No fatalities are assumed for MMI levels below 4.
+
+    :param mmi: The MMI level(s).
+    :type mmi: float, numpy.ndarray
+
+    :return: Fraction of the exposed people killed.
+    :rtype: float, numpy.ndarray
+    """
+    mmi = numpy.asarray(mmi, dtype=numpy.float64)
+    rate = numpy.where(
+        mmi < 4, 0.0, numpy.power(10.0, FATALITY_X * mmi - FATALITY_Y))
+    if rate.ndim == 0:
+        return float(rate)
+    return rate
+
+
+def mmi_bands(mmi):
+    """Get the MMI band of every cell.
+
+    :param mmi: MMI values, NaN where unknown.
+    :type mmi: numpy.ndarray
+
+    :return: The band (one of MMI_RANGE) of every cell, -1 for cells outside
+        of all the bands.
+    :rtype: numpy.ndarray
+    """
+    mmi = numpy.asarray(mmi, dtype=numpy.float64)
+    bands = numpy.empty(mmi.shape, dtype=numpy.intp)
+    bands.fill(-1)
+    known = ~numpy.isnan(mmi)
+    known_bands = numpy.ceil(mmi[known] - MMI_STEP).astype(numpy.intp)
+    known_bands[
+        (known_bands < MMI_RANGE[0]) | (known_bands > MMI_RANGE[-1])] = -1
+    bands[known] = known_bands
+    return bands
+
+
+def itb_fatality(mmi, population):
+    """Run the ITB fatality model on aligned arrays.
+
+    :param mmi: MMI of every cell, NaN where unknown.
+    :type mmi: numpy.ndarray
+
+    :param population: Number of people in every cell, aligned with mmi.
+        NaN and negative values are counted as 0.
+    :type population: numpy.ndarray
+
+    :return: A dict with the same keys as the keywords of the safe
+        ITBFatalityFunction impact layer: exposed_per_mmi,
+        fatalities_per_mmi, displaced_per_mmi (dicts keyed by MMI band),
+        total_fatalities, total_fatalities_raw and total_population.
+    :rtype: dict
+    """
+    population = numpy.nan_to_num(
+        numpy.asarray(population, dtype=numpy.float64).ravel())
+    bands = mmi_bands(mmi).ravel()
+    valid = (bands >= 0) & (population > 0)
+    exposed_counts = numpy.bincount(
+        bands[valid],
+        weights=population[valid],
+        minlength=MMI_RANGE[-1] + 1)
+
+    exposed_per_mmi = {}
+    fatalities_per_mmi = {}
+    displaced_per_mmi = {}
+    for mmi_band in MMI_RANGE:
+        exposed = float(exposed_counts[mmi_band])
+        fatalities = fatality_rate(mmi_band) * exposed
+        exposed_per_mmi[mmi_band] = exposed
+        fatalities_per_mmi[mmi_band] = fatalities
+        displaced_per_mmi[mmi_band] = (
+            DISPLACEMENT_RATE[mmi_band] * (exposed - fatalities))
+
+    total_fatalities_raw = sum(fatalities_per_mmi.values())
+    return {
+        'exposed_per_mmi': exposed_per_mmi,
+        'fatalities_per_mmi': fatalities_per_mmi,
+        'displaced_per_mmi': displaced_per_mmi,
+        'total_fatalities_raw': total_fatalities_raw,
+        'total_fatalities': population_rounding(total_fatalities_raw),
+        'total_population': float(sum(exposed_per_mmi.values()))
+    }
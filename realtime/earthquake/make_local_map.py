@@ -11,11 +11,12 @@ if __name__ == '__main__':
     # To ensure that realtime is working for not just en locale, use other
     # locale here to test realtime
     locales = ['en', 'id']
+    shake_event = ShakeEvent(
+        working_dir=working_dir,
+        event_id=SHAKE_ID,
+        locale=locales[0],
+        force_flag=False,
+        data_is_local_flag=True)
     for locale in locales:
-        shake_event = ShakeEvent(
-            working_dir=working_dir,
-            event_id=SHAKE_ID,
-            locale=locale,
-            force_flag=False,
-            data_is_local_flag=True)
+        shake_event.set_locale(locale)
         shake_event.render_map(force_flag=False)
@@ -26,14 +26,27 @@ from zipfile import BadZipfile
 
 from realtime.earthquake.shake_event import ShakeEvent
 
+from realtime.earthquake.event_index import event_index
 from realtime.earthquake.push_shake import push_shake_event_to_rest
-from realtime.earthquake.shake_data import ShakeData
-from realtime.exceptions import EmptyShakeDirectoryError
-from realtime.utilities import data_dir, is_event_id, realtime_logger_name
+from realtime.exceptions import (
+    EmptyShakeDirectoryError,
+    EventProcessingError)
+from realtime.idempotency import idempotency_store
+from realtime.instrumentation import (
+    ANALYSIS_METRICS_FILE_NAME,
+    METRICS_FILE_NAME)
+from realtime.utilities import (
+    data_dir,
+    is_event_id,
+    realtime_logger_name,
+    shakemap_extract_dir)
 
 # Initialised in realtime.__init__
 LOGGER = logging.getLogger(realtime_logger_name())
 
+# Events this many seconds before the newest one are processed with it
+SHAKE_BURST_SECONDS = 100
+
 
 def process_event(working_dir=None, event_id=None, locale='en'):
     """Launcher that actually runs the event processing.
@@ -45,13 +58,106 @@ def process_event(working_dir=None, event_id=None, locale='en'):
     :param locale: The locale that will be used. Default to en.
     :type locale: str
 
-    :return: Return True if succeeded
+    :return: Return True if succeeded, False if an event could not be set
+        up, None if there is nothing to process.
     :rtype: bool
+
+    :raises: The errors listing the events, see :func:`list_events`.
+    """
+    population_path, force_flag, locale_list = event_settings(locale)
+    shake_events = list_events(
+        working_dir, event_id, locale_list[0], force_flag, population_path)
+    if shake_events is None:
+        return
+
+    _, setup_failed = process_handles(shake_events, locale_list, force_flag)
+    return not setup_failed
+
+
+def analyse_event(working_dir=None, event_id=None, locale='en'):
+    """Run the analysis of the events without rendering them.
+
+    This is the part of :func:`process_event` that does not need a
+    display. Its products are handed off on disk through the manifest of
+    each event directory, see :func:`render_event`.
+
+    :param working_dir: The working dir where all the shakemaps are located.
+    :type working_dir: str
+
+    :param event_id: The event id to process. If None the latest events are
+        processed.
+    :type event_id: str
+
+    :param locale: The locale that will be used. Default to en.
+    :type locale: str
+
+    :return: The ids of the events analysed, None if the events could not
+        be listed.
+    :rtype: list
+
+    :raises: EventProcessingError if an event could not be set up.
+    """
+    population_path, force_flag, locale_list = event_settings(locale)
+    shake_events = list_events(
+        working_dir, event_id, locale_list[0], force_flag, population_path)
+    if shake_events is None:
+        return
+
+    event_ids, setup_failed = process_handles(
+        shake_events, locale_list, force_flag, render_flag=False)
+    if setup_failed:
+        raise EventProcessingError(
+            'An event could not be set up, analysed: %s' % event_ids)
+    return event_ids
+
+
+def render_event(working_dir=None, event_ids=None, locale='en'):
+    """Render and push the reports of events analysed by analyse_event.
+
+    :param working_dir: The working dir where all the shakemaps are located.
+    :type working_dir: str
+
+    :param event_ids: The ids of the analysed events.
+    :type event_ids: list
+
+    :param locale: The locale that will be used. Default to en.
+    :type locale: str
+
+    :return: Return True if succeeded, False if an event could not be set
+        up.
+    :rtype: bool
+    """
+    population_path, force_flag, locale_list = event_settings(locale)
+    # The shake data was extracted by the analysis
+    shake_events = [
+        ShakeEventHandle(
+            working_dir=working_dir,
+            event_id=shake_id,
+            locale=locale_list[0],
+            population_path=population_path)
+        for shake_id in event_ids or []]
+
+    _, setup_failed = process_handles(
+        shake_events, locale_list, force_flag, analyse_flag=False)
+    return not setup_failed
+
+
+def event_settings(locale='en'):
+    """Settings of the event processing, read from the environment.
+
+    :param locale: The locale that will be used. Default to en.
+    :type locale: str
+
+    :return: A tuple of (population path, force flag, locales). The
+        population path is None if there is no population raster.
+    :rtype: (str, bool, list)
     """
     population_path = os.path.join(
         data_dir(),
         'exposure',
         'population.tif')
+    if not os.path.exists(population_path):
+        population_path = None
 
     # Use cached data where available
     # Whether we should always regenerate the products
@@ -66,43 +172,180 @@ def process_event(working_dir=None, event_id=None, locale='en'):
     locale_list = [locale]
     if 'en' not in locale_list:
         locale_list.append('en')
+    return population_path, force_flag, locale_list
 
-    # Now generate the products
-    for locale in locale_list:
-        # Extract the event
-        # noinspection PyBroadException
-        try:
-            shake_events = create_shake_events(
-                event_id=event_id,
-                force_flag=force_flag,
-                locale=locale,
-                population_path=population_path,
-                working_dir=working_dir)
-        except (BadZipfile, URLError):
-            # retry with force flag true
-            shake_events = create_shake_events(
-                event_id=event_id,
-                force_flag=True,
-                locale=locale,
-                population_path=population_path,
-                working_dir=working_dir)
-        except EmptyShakeDirectoryError as ex:
-            LOGGER.info(ex)
-            return
-        except Exception:  # pylint: disable=broad-except
-            LOGGER.exception('An error occurred setting up the shake event.')
-            return
 
-        LOGGER.info('Event Id: %s', [s.event_id for s in shake_events])
-        LOGGER.info('-------------------------------------------')
+def list_events(
+        working_dir, event_id, locale, force_flag, population_path):
+    """List the events to process, logging why there are none.
+
+    See :func:`create_shake_events` for the parameters.
 
-        for shake_event in shake_events:
-            shake_event.render_map(force_flag)
-            # push the shakemap to realtime server
-            ret = push_shake_event_to_rest(shake_event)
-            LOGGER.info('Is Push successful? %s' % bool(ret))
+    :return: The shake events, None if there is nothing to process.
+    :rtype: list[ShakeEventHandle]
+
+    :raises: The errors listing the events, e.g. an unreadable event index,
+        so the event is retried.
+    """
+    # List the events, they are only extracted and parsed when processed
+    try:
+        shake_events = create_shake_events(
+            event_id=event_id,
+            force_flag=force_flag,
+            locale=locale,
+            population_path=population_path,
+            working_dir=working_dir)
+    except EmptyShakeDirectoryError as ex:
+        LOGGER.info(ex)
+        return None
+
+    LOGGER.info('Event Id: %s', [s.event_id for s in shake_events])
+    LOGGER.info('-------------------------------------------')
+    return shake_events
 
-    return True
+
+def process_handles(
+        shake_events,
+        locale_list,
+        force_flag=False,
+        analyse_flag=True,
+        render_flag=True):
+    """Generate the products of the events.
+
+    The analysis does not depend on the locale, so it is done once per
+    event (for the first locale) and only the presentation is done again
+    for every locale. Processes working on the same event take turns.
+
+    :param shake_events: The events to process.
+    :type shake_events: list[ShakeEventHandle]
+
+    :param locale_list: The locales of the reports.
+    :type locale_list: list
+
+    :param force_flag: (Optional) Whether to regenerate the products.
+    :type force_flag: bool
+
+    :param analyse_flag: (Optional) Whether to run the analysis. If False it
+        must have been run by :func:`analyse_event`.
+    :type analyse_flag: bool
+
+    :param render_flag: (Optional) Whether to render and push the reports.
+    :type render_flag: bool
+
+    :return: A tuple of (ids of the events processed, whether an event could
+        not be set up).
+    :rtype: (list, bool)
+    """
+    # The analysis run apart from the rendering keeps its own metrics file
+    metrics_file_name = METRICS_FILE_NAME
+    if not render_flag:
+        metrics_file_name = ANALYSIS_METRICS_FILE_NAME
+
+    event_ids = []
+    setup_failed = False
+    store = idempotency_store('earthquake')
+    for handle in shake_events:
+        # Another process (watcher, cron, worker) may process the event
+        with store.lock(handle.event_id):
+            # noinspection PyBroadException
+            try:
+                shake_event = handle.materialize()
+            except EmptyShakeDirectoryError as ex:
+                LOGGER.info(ex)
+                continue
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception(
+                    'An error occurred setting up the shake event %s.' %
+                    handle.event_id)
+                setup_failed = True
+                continue
+
+            try:
+                for locale in locale_list:
+                    shake_event.set_locale(locale)
+                    if not render_flag:
+                        shake_event.prepare_report(force_flag)
+                        continue
+                    # A forced analysis invalidated the reports already
+                    shake_event.render_map(force_flag and analyse_flag)
+                    # push the shakemap to realtime server
+                    with shake_event.metrics.stage('push'):
+                        ret = push_shake_event_to_rest(shake_event)
+                    LOGGER.info('Is Push successful? %s' % bool(ret))
+                event_ids.append(handle.event_id)
+            finally:
+                # Record the time spent in every stage of the event
+                shake_event.metrics.write(
+                    handle.event_dir(), metrics_file_name)
+                # Free the grid before the next event of the burst is parsed
+                handle.release()
+
+    return event_ids, setup_failed
+
+
+class ShakeEventHandle(object):
+    """An event to process, only materialized as a ShakeEvent when needed.
+
+    Creating a ShakeEvent extracts the shake data, parses the grid and
+    loads the translations, so a handle only holds the event id and the
+    paths until the event is processed.
+    """
+
+    def __init__(
+            self,
+            working_dir,
+            event_id,
+            locale='en',
+            force_flag=False,
+            population_path=None):
+        """Constructor.
+
+        See :class:`ShakeEvent` for the parameters.
+        """
+        self.working_dir = working_dir
+        self.event_id = event_id
+        self.locale = locale
+        self.force_flag = force_flag
+        self.population_path = population_path
+        self._shake_event = None
+
+    def event_dir(self):
+        """Path to the directory the event is extracted to.
+
+        :rtype: str
+        """
+        return os.path.join(shakemap_extract_dir(), self.event_id)
+
+    def materialize(self):
+        """Create the ShakeEvent of the handle, once.
+
+        If the shake data can not be extracted it is retrieved again.
+
+        :return: The shake event.
+        :rtype: ShakeEvent
+
+        :raises: EmptyShakeDirectoryError, EventIdError, EventXmlParseError
+        """
+        if self._shake_event is None:
+            try:
+                self._shake_event = self._create(self.force_flag)
+            except (BadZipfile, URLError):
+                # retry with force flag true
+                self._shake_event = self._create(True)
+        return self._shake_event
+
+    def release(self):
+        """Drop the ShakeEvent so its grid can be garbage collected."""
+        self._shake_event = None
+
+    def _create(self, force_flag):
+        """Create a ShakeEvent for the handle."""
+        return ShakeEvent(
+            working_dir=self.working_dir,
+            event_id=self.event_id,
+            locale=self.locale,
+            force_flag=force_flag,
+            population_raster_path=self.population_path)
 
 
 def create_shake_events(
@@ -111,7 +354,10 @@ def create_shake_events(
         working_dir=None,
         locale='en',
         force_flag=False):
-    """
+    """List the shake events to process.
+
+    Only handles are created, the shake data of an event is extracted and
+    parsed by :func:`ShakeEventHandle.materialize` when it is processed.
 
     :param working_dir: The locale working dir where all the shakemaps are
             located.
@@ -132,12 +378,13 @@ def create_shake_events(
     :param force_flag: Whether to force retrieval of the dataset.
     :type force_flag: bool
 
-    :return: Shake Events to process
-    :rtype: list[ShakeEvent]
+    :return: Shake Events to process, an empty list if the working dir
+        does not contain any shakemaps.
+    :rtype: list[ShakeEventHandle]
     """
     shake_events = []
 
-    if not os.path.exists(population_path):
+    if population_path is not None and not os.path.exists(population_path):
         population_path = None
 
     # cron job executed this script minutely, so it is possible in one
@@ -145,35 +392,31 @@ def create_shake_events(
     # by only retrieveng the shake id for that particular minute.
 
     # retrieve all the shake ids
-    shake_ids = ShakeData.get_list_event_ids_from_folder(working_dir)
-    shake_ids.sort()
-    shake_ids.reverse()
+    shake_ids = event_index(working_dir).within(SHAKE_BURST_SECONDS)
     if not shake_ids:
+        LOGGER.info(
+            'The directory %s does not contain any shakemaps.' % working_dir)
         return []
 
     if event_id:
         shake_events.append(
-            ShakeEvent(
+            ShakeEventHandle(
                 working_dir=working_dir,
                 event_id=event_id,
                 locale=locale,
                 force_flag=force_flag,
-                population_raster_path=population_path)
+                population_path=population_path)
         )
     else:
-        last_int = int(shake_ids[0])
-        # sort descending
+        # newest first
         for shake_id in shake_ids:
-            if last_int - int(shake_id) < 100:
-                shake_event = ShakeEvent(
+            shake_events.append(
+                ShakeEventHandle(
                     working_dir=working_dir,
                     event_id=shake_id,
                     locale=locale,
                     force_flag=force_flag,
-                    population_raster_path=population_path)
-                shake_events.append(shake_event)
-            else:
-                break
+                    population_path=population_path))
 
     return shake_events
 
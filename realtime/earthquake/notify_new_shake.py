@@ -14,7 +14,13 @@ from tzlocal import get_localzone
 
 from realtime.earthquake.make_map import process_event
 from realtime.earthquake.push_shake import notify_realtime_rest
-from realtime.utilities import realtime_logger_name
+from realtime.exceptions import EventProcessingError
+from realtime.utilities import dead_letter_dir, realtime_logger_name
+from realtime.work_queue import (
+    DEFAULT_DEBOUNCE,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_WORKERS,
+    DebouncedWorkQueue)
 
 __author__ = 'Rizky Maulana Nugraha "lucernae" <lana.pcfre@gmail.com>'
 __date__ = '03/09/15'
@@ -25,20 +31,48 @@ LOGGER = logging.getLogger(realtime_logger_name())
 
 class ShakemapPushHandler(pyinotify.ProcessEvent):
 
-    def __init__(self, working_dir, callback=None):
+    def __init__(
+            self,
+            working_dir,
+            callback=None,
+            debounce=DEFAULT_DEBOUNCE,
+            workers=DEFAULT_WORKERS,
+            max_attempts=DEFAULT_MAX_ATTEMPTS,
+            dead_letter_path=None):
         """
 
+        The callback does not run in the notifier thread: the events of a
+        shake are debounced and coalesced by a :class:`DebouncedWorkQueue`
+        which runs the callback on its worker threads, and retries it with
+        a backoff when it raises.
+
         :param working_dir: location of shakemaps folder
         :param callback: function which receives a shake_id
+        :param debounce: seconds without events for a grid.xml before the
+            callback is called
+        :param workers: number of shakes processed at the same time
+        :param max_attempts: number of runs of the callback for a shake
+            before it is given up
+        :param dead_letter_path: directory where the shakes given up are
+            recorded
         :return:
         """
         self.working_dir = working_dir
         self.callback = callback
-
-    def process_IN_CREATE(self, event):
-        """Handle created event of grid.xml.
+        self.queue = None
+        if callback:
+            self.queue = DebouncedWorkQueue(
+                callback,
+                debounce=debounce,
+                workers=workers,
+                max_attempts=max_attempts,
+                dead_letter_dir=dead_letter_path)
+
+    def submit(self, event, complete=False):
+        """Submit the shake of an event on a grid.xml.
 
         :param event: Inotify event
+        :param complete: whether the grid.xml is completely written
         """
         # we only listen to pushed output/grid.xml files
         rel_path = os.path.relpath(event.pathname, self.working_dir)
@@ -46,18 +80,32 @@ class ShakemapPushHandler(pyinotify.ProcessEvent):
         if os.path.exists(event.pathname) and pattern.search(rel_path):
             # if we got grid.xml
             LOGGER.info('Got grid.xml: %s' % rel_path)
-            if self.callback:
+            if self.queue:
                 shake_id = pattern.match(rel_path).group('shake_id')
-                self.callback(shake_id=shake_id)
+                self.queue.submit(
+                    shake_id,
+                    path=event.pathname,
+                    complete=complete,
+                    shake_id=shake_id)
+
+    def process_IN_CREATE(self, event):
+        """Handle created event of grid.xml.
+
+        The grid.xml may still be written, it is dispatched once its size
+        is stable.
+
+        :param event: Inotify event
+        """
+        self.submit(event)
 
     def process_IN_MOVED_TO(self, event):
         """Handle rename event of grid.xml.
 
-        Should be the same with Create event
+        A renamed grid.xml is complete.
 
         :param event: Inotify event
         """
-        self.process_IN_CREATE(event)
+        self.submit(event, complete=True)
 
     def process_IN_MODIFY(self, event):
         """Handle modify event of grid.xml.
@@ -66,7 +114,19 @@ class ShakemapPushHandler(pyinotify.ProcessEvent):
 
         :param event: Inotify event
         """
-        self.process_IN_CREATE(event)
+        self.submit(event)
+
+    def process_IN_CLOSE_WRITE(self, event):
+        """Handle the end of the writing of grid.xml.
+
+        :param event: Inotify event
+        """
+        self.submit(event, complete=True)
+
+    def stop(self):
+        """Stop the worker threads of the handler."""
+        if self.queue:
+            self.queue.stop()
 
 
 def watch_shakemaps_push(
@@ -76,7 +136,9 @@ def watch_shakemaps_push(
         notifier = pyinotify.ThreadedNotifier(wm, handler, timeout=timeout)
     else:
         notifier = pyinotify.Notifier(wm, handler, timeout=timeout)
-    flags = pyinotify.IN_CREATE | pyinotify.IN_MODIFY | pyinotify.IN_MOVED_TO
+    flags = (
+        pyinotify.IN_CREATE | pyinotify.IN_MODIFY | pyinotify.IN_MOVED_TO |
+        pyinotify.IN_CLOSE_WRITE)
     wm.add_watch(working_dir, flags, rec=True, auto_add=True)
 
     return notifier
@@ -91,24 +153,27 @@ if __name__ == '__main__':
         locale_option = 'en'
 
     def process_shakemap(shake_id=None):
-        """Process a given shake_id for realtime shake"""
+        """Process a given shake_id for realtime shake.
+
+        Failures raise so the work queue retries the shake later. Nothing
+        to process (process_event returns None) is not a failure.
+        """
         LOGGER.info('Inotify received new shakemap')
         tz = get_localzone()
         notify_realtime_rest(datetime.datetime.now(tz=tz))
-        done = False
-        while not done:
-            try:
-                done = process_event(
-                    working_dir=working_dir,
-                    event_id=shake_id,
-                    locale=locale_option)
-            except Exception as e:  # pylint: disable=W0702
-                LOGGER.info('Process event failed')
-                LOGGER.exception(e)
-                LOGGER.info('Retrying to process event')
+        done = process_event(
+            working_dir=working_dir,
+            event_id=shake_id,
+            locale=locale_option)
+        if done is False:
+            raise EventProcessingError(
+                'Shakemap %s was not processed' % shake_id)
         LOGGER.info('Shakemap %s handled' % (shake_id, ))
 
-    handler = ShakemapPushHandler(working_dir, callback=process_shakemap)
+    handler = ShakemapPushHandler(
+        working_dir,
+        callback=process_shakemap,
+        dead_letter_path=os.path.join(dead_letter_dir(), 'earthquake'))
     notifier = watch_shakemaps_push(working_dir, daemon=True, handler=handler)
     LOGGER.info('Monitoring %s' % working_dir)
     notifier.loop()
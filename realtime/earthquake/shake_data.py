@@ -17,16 +17,18 @@ __date__ = '14/12/2014'
 __copyright__ = ('Copyright 2012, Australia Indonesia Facility for '
                  'Disaster Reduction')
 
+import json
 import os
 import shutil
 from datetime import datetime
 import logging
-import filecmp
 
 
-from realtime.utilities import is_event_id
+from realtime.earthquake.event_index import event_index
+from realtime.earthquake.grid_cache import file_sha1
 from realtime.utilities import (
     shakemap_extract_dir,
+    link_or_copy,
     make_directory,
     realtime_logger_name)
 from realtime.exceptions import (
@@ -78,6 +80,8 @@ class ShakeData(object):
         self.working_dir = working_dir
         self.force_flag = force_flag
         self.input_file_name = 'grid.xml'
+        # Sidecar of the extracted grid.xml, see :func:`is_extracted`
+        self.extract_manifest_file_name = 'grid.xml.json'
 
         if self.event_id is None:
             try:
@@ -110,18 +114,23 @@ class ShakeData(object):
 
     @staticmethod
     def get_list_event_ids_from_folder(working_dir):
-        """Get all event id indicated by folder in working dir."""
-        if os.path.exists(working_dir):
-            directories = os.listdir(working_dir)
-        else:
+        """Get all event id indicated by folder in working dir.
+
+        The ids come from the event index of the working dir (see
+        :mod:`realtime.earthquake.event_index`) which only lists the
+        directory again when it was modified.
+
+        :return: The event ids sorted ascending, None if the working dir
+            does not exist.
+        :rtype: list
+
+        :raises: EmptyShakeDirectoryError
+        """
+        valid_dirs = event_index(working_dir).event_ids()
+        if valid_dirs is None:
             LOGGER.debug(
                 'Directory %s does not exist, return None' % working_dir)
             return None
-        # Filter the dirs to only contain valid event dirs
-        valid_dirs = []
-        for directory in directories:
-            if is_event_id(directory):
-                valid_dirs.append(directory)
 
         if len(valid_dirs) == 0:
             raise EmptyShakeDirectoryError(
@@ -133,25 +142,19 @@ class ShakeData(object):
         return ShakeData.get_list_event_ids_from_folder(self.working_dir)
 
     def get_latest_event_id(self):
-        """Return latest event id."""
-        try:
-            event_ids = self.get_list_event_ids()
-        except EmptyShakeDirectoryError:
-            raise
-
-        now = datetime.now()
-        now = int(
-            '%04d%02d%02d%02d%02d%02d' %
-            (now.year, now.month, now.day, now.hour, now.minute, now.second))
-
-        if event_ids is not None:
-            event_ids.sort()
+        """Return latest event id, ignoring the ids in the future."""
+        index = event_index(self.working_dir)
+        if not index.refresh():
+            raise EventIdError('Latest Event Id could not be obtained')
+        if index.latest() is None:
+            raise EmptyShakeDirectoryError(
+                'The directory %s does not contain any shakemaps.' %
+                self.working_dir)
 
-        latest_event_id = now + 1
-        while int(latest_event_id) > now:
-            if len(event_ids) < 1:
-                raise EventIdError('Latest Event Id could not be obtained')
-            latest_event_id = event_ids.pop()
+        now = datetime.now().strftime('%Y%m%d%H%M%S')
+        latest_event_id = index.latest(before=now)
+        if latest_event_id is None:
+            raise EventIdError('Latest Event Id could not be obtained')
 
         self.event_id = latest_event_id
         return self.event_id
@@ -171,6 +174,10 @@ class ShakeData(object):
     def extract(self, force_flag=False):
         """Checking the grid.xml file in the machine, if found use it.
 
+        The grid.xml is hard linked (or copied if it can not be linked) to
+        the extracted dir, unless it was already extracted, see
+        :func:`is_extracted`.
+
         :param force_flag: force flag to extract.
         :type force_flag: bool
 
@@ -187,10 +194,9 @@ class ShakeData(object):
 
         if force_flag or self.force_flag:
             self.remove_extracted_files()
-        elif os.path.exists(final_grid_xml_file):
-            if filecmp.cmp(final_grid_xml_file, source_grid_xml):
-                return final_grid_xml_file
-            # if it is not identical, copy again
+        elif self.is_extracted(source_grid_xml, final_grid_xml_file):
+            return final_grid_xml_file
+        # if it is not identical, copy again
 
         if not os.path.exists(self.extract_dir()):
             make_directory(self.extract_dir())
@@ -201,11 +207,95 @@ class ShakeData(object):
                 source_grid_xml)
 
         # move the file we care about to the top of the extract dir
-        shutil.copyfile(source_grid_xml, final_grid_xml_file)
+        link_or_copy(source_grid_xml, final_grid_xml_file)
         if not os.path.exists(final_grid_xml_file):
             raise CopyError('Error copying grid.xml')
+        self.write_extract_manifest(
+            source_grid_xml, final_grid_xml_file, file_sha1(source_grid_xml))
         return final_grid_xml_file
 
+    def extract_manifest_path(self):
+        """Path to the sidecar manifest of the extracted grid.xml.
+
+        :rtype: str
+        """
+        return os.path.join(
+            self.extract_dir(), self.extract_manifest_file_name)
+
+    def write_extract_manifest(self, source_path, extracted_path, sha1):
+        """Record the size, mtime and hash of an extracted grid.xml.
+
+        :param source_path: Path to the grid.xml in the working dir.
+        :type source_path: str
+
+        :param extracted_path: Path to the extracted grid.xml.
+        :type extracted_path: str
+
+        :param sha1: SHA-1 of the grid.xml.
+        :type sha1: str
+        """
+        source_stat = os.stat(source_path)
+        extracted_stat = os.stat(extracted_path)
+        manifest = {
+            'source': os.path.abspath(source_path),
+            'source_size': source_stat.st_size,
+            'source_mtime': source_stat.st_mtime,
+            'extracted_size': extracted_stat.st_size,
+            'extracted_mtime': extracted_stat.st_mtime,
+            'sha1': sha1}
+        with open(self.extract_manifest_path(), 'w') as manifest_file:
+            manifest_file.write(json.dumps(manifest))
+
+    def is_extracted(self, source_path, extracted_path):
+        """Check whether a grid.xml was already extracted.
+
+        The extraction is reused when the stat of the source and of the
+        extracted file match the sidecar manifest. The source is only hashed
+        when its stat changed, e.g. it was touched or written again, and the
+        manifest is updated if the content is the same.
+
+        :param source_path: Path to the grid.xml in the working dir.
+        :type source_path: str
+
+        :param extracted_path: Path to the extracted grid.xml.
+        :type extracted_path: str
+
+        :return: True if the extracted grid.xml can be used.
+        :rtype: bool
+        """
+        if not os.path.exists(extracted_path):
+            return False
+        try:
+            with open(self.extract_manifest_path()) as manifest_file:
+                manifest = json.loads(manifest_file.read())
+            source_stat = os.stat(source_path)
+            extracted_stat = os.stat(extracted_path)
+        except (IOError, OSError, ValueError):
+            return False
+
+        # A hard link is the source itself, a copy must be left untouched
+        linked = (
+            source_stat.st_ino == extracted_stat.st_ino and
+            source_stat.st_dev == extracted_stat.st_dev)
+        if manifest['source'] != os.path.abspath(source_path):
+            return False
+        if not linked and (
+                manifest['extracted_size'] != extracted_stat.st_size or
+                manifest['extracted_mtime'] != extracted_stat.st_mtime):
+            return False
+        if (manifest['source_size'] == source_stat.st_size and
+                manifest['source_mtime'] == source_stat.st_mtime):
+            return True
+        if manifest['source_size'] != source_stat.st_size:
+            return False
+
+        LOGGER.debug('Hashing %s, its mtime changed' % source_path)
+        if file_sha1(source_path) != manifest['sha1']:
+            return False
+        self.write_extract_manifest(
+            source_path, extracted_path, manifest['sha1'])
+        return True
+
     def remove_extracted_files(self):
         """Tidy up the filesystem by removing all extracted files
         for the given event instance.
@@ -37,9 +37,7 @@ from qgis.core import (
     QgsFeature,
     QgsGeometry,
     QgsVectorLayer,
-    QgsRaster,
     QgsRasterLayer,
-    QgsDataSourceURI,
     QgsVectorFileWriter,
     QgsCoordinateReferenceSystem,
     QgsProject,
@@ -47,6 +45,7 @@ from qgis.core import (
     QgsMapLayerRegistry,
     QgsPalLabeling,
     QgsProviderRegistry,
+    QgsRectangle,
     QgsFeatureRequest,
     QgsVectorDataProvider)
 
@@ -56,30 +55,48 @@ from PyQt4.QtCore import (
     QVariant,
     QFileInfo,
     QUrl,
-    QSize,
-    Qt,
     QTranslator)
 # noinspection PyPackageRequirements
 from PyQt4.QtXml import QDomDocument
-from PyQt4.QtGui import (
-    QPainter,
-    QImage)
 
 from safe.test.utilities import get_qgis_app
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
 
 from safe.impact_functions.impact_function_manager import ImpactFunctionManager
 from safe.storage.core import read_layer as safe_read_layer
+from safe.storage.core import read_qgis_layer
 from safe.common.version import get_version
 from safe.common.utilities import romanise
 from safe.utilities.clipper import extent_to_geoarray, clip_layer
 from safe.utilities.styling import mmi_colour
 from safe.utilities.gis import get_wgs84_resolution
 from safe.utilities.resources import resources_path
+from safe.utilities.keyword_io import KeywordIO
 from safe.common.exceptions import TranslationLoadError
-from safe.gui.tools.shake_grid.shake_grid import ShakeGrid
 import safe.messaging as m
+from realtime.earthquake.build_manifest import BuildManifest, inputs_hash
+from realtime.earthquake.geodesic import (
+    cardinal_directions,
+    distance_and_bearings)
+from realtime.earthquake.geonames_index import geonames_index
+from realtime.earthquake.grid_cache import GridCache, file_sha1
+from realtime.earthquake.impact_cache import ImpactCache, impact_key
+from realtime.earthquake.itb_fatality import (
+    NATIVE_IMPACT_ENGINE,
+    impact_engine,
+    itb_fatality,
+    mmi_bands)
 from realtime.earthquake.shake_data import ShakeData
+from realtime.earthquake.shake_grid import RealtimeShakeGrid
+from realtime.exposure_store import (
+    exposure_store,
+    raster_key,
+    write_raster)
+from realtime.instrumentation import EventMetrics, timed
+from realtime.rendering import (
+    export_composition,
+    render_context,
+    render_mode)
 from realtime.utilities import (
     shakemap_extract_dir,
     data_dir,
@@ -99,6 +116,104 @@ from realtime.exceptions import (
 LOGGER = logging.getLogger(realtime_logger_name())
 
 
+def geonames_sqlite_path(preferred_path=None):
+    """Helper to determine sqlite file with geonames places in it.
+
+    The following priority will be used to determine the path:
+        1) the preferred path will be checked and if not None and the
+           file exists it will be used.
+        2) the environment variable 'GEONAMES_SQLITE_PATH' will be
+           checked and if the file exists if set it will be used.
+        4) A hard coded path of
+           :file:`/fixtures/indonesia.sqlite` will be appended
+           to os.path.abspath(os.path.curdir)
+        5) A hard coded path of
+           :file:`/usr/local/share/inasafe/indonesia.tif`
+           will be used.
+
+    :param preferred_path: (Optional) The path given to the event.
+    :type preferred_path: str
+
+    :returns: Path to a geonames sqlite file.
+    :rtype: str
+
+    :raises: FileNotFoundError
+    """
+    # When used via the scripts make_shakemap.sh
+    fixture_path = os.path.join(
+        data_dir(), 'indonesia.sqlite')
+
+    local_path = '/usr/local/share/inasafe/indonesia.sqlite'
+    if preferred_path is not None:
+        if os.path.exists(preferred_path):
+            return preferred_path
+
+    if 'GEONAMES_SQLITE_PATH' in os.environ:
+        population_path = os.environ['GEONAMES_SQLITE_PATH']
+        if os.path.exists(population_path):
+            return population_path
+
+    if os.path.exists(fixture_path):
+        return fixture_path
+
+    if os.path.exists(local_path):
+        return local_path
+
+    raise FileNotFoundError('Geonames sqlite file could not be found')
+
+
+def population_raster_path(preferred_path=None):
+    """Helper to determine population raster's path.
+
+    The following priority will be used to determine the path:
+        1) the preferred path will be checked and if not None and the
+           file exists it will be used.
+        2) the environment variable 'INASAFE_POPULATION_PATH' will be
+           checked and if the file exists if set it will be used.
+        4) A hard coded path of
+           :file:`/fixtures/exposure/population.tif` will be appended
+           to os.path.abspath(os.path.curdir)
+        5) A hard coded path of
+           :file:`/usr/local/share/inasafe/exposure/population.tif`
+           will be used.
+
+    :param preferred_path: (Optional) The path given to the event.
+    :type preferred_path: str
+
+    :return: path to a population raster file.
+    :rtype: str
+
+    :raises: FileNotFoundError
+
+    TODO: Consider automatically fetching from
+    http://web.clas.ufl.edu/users/atatem/pub/IDN.7z
+
+    Also see http://web.clas.ufl.edu/users/atatem/pub/
+    https://github.com/AIFDR/inasafe/issues/381
+    """
+    # When used via the scripts make_shakemap.sh
+    fixture_path = os.path.join(
+        data_dir(), 'exposure', 'population.tif')
+
+    local_path = '/usr/local/share/inasafe/exposure/population.tif'
+    if preferred_path is not None:
+        if os.path.exists(preferred_path):
+            return preferred_path
+
+    if 'INASAFE_POPULATION_PATH' in os.environ:
+        population_path = os.environ['INASAFE_POPULATION_PATH']
+        if os.path.exists(population_path):
+            return population_path
+
+    if os.path.exists(fixture_path):
+        return fixture_path
+
+    if os.path.exists(local_path):
+        return local_path
+
+    raise FileNotFoundError('Population file could not be found')
+
+
 class ShakeEvent(QObject):
     """Behaviour and data relating to an earthquake.
 
@@ -172,11 +287,23 @@ class ShakeEvent(QObject):
             self.data.extract()
             self.event_id = self.data.event_id
 
+        # Time spent in each processing stage, see realtime.instrumentation
+        self.metrics = EventMetrics('earthquake', self.event_id)
+
+        # Parse grid.xml once into numpy arrays, every stage that needs the
+        # grid values reads them from self.grid_model. Grids already seen
+        # (e.g. for another locale) are loaded from the on disk cache.
+        with self.metrics.stage('grid_parse'):
+            self.grid_model = GridCache().load(self.grid_file_path())
+
         # Convert grid.xml (we'll give the title with event_id)
         # RM: convert event_id to str too. This avoid the layer name is
         # falsely read as int
-        self.shake_grid = ShakeGrid(
-            str(self.event_id), get_grid_source(), self.grid_file_path())
+        self.shake_grid = RealtimeShakeGrid(
+            str(self.event_id),
+            get_grid_source(),
+            self.grid_file_path(),
+            grid_model=self.grid_model)
 
         self.population_raster_path = population_raster_path
         self.geonames_sqlite_path = geonames_sqlite_path
@@ -211,6 +338,21 @@ class ShakeEvent(QObject):
         # 'population': 33317}
         self.most_affected_city = None
         self.shake_grid_location_city = None
+        # City analysis results shared by the cities shapefile, the search
+        # boxes, the impacted cities table and the event dict. See
+        # :func:`city_analysis_cache`.
+        self.city_cache = {}
+        # Locale independent products, created once by analyse() and
+        # reused when rendering every locale
+        self.mmi_shapefile = None
+        self.contours_shapefile = None
+        self.cities_shapefile = None
+        self.search_boxes_shapefile = None
+        self.cities_analysed = False
+        # Products of the event directory with the fingerprints of their
+        # inputs, so only the products whose inputs changed are rebuilt
+        self.manifest = BuildManifest(
+            os.path.join(shakemap_extract_dir(), self.event_id))
         # for localization
         self.translator = None
         self.locale = locale
@@ -459,21 +601,20 @@ class ShakeEvent(QObject):
         The 'name' and 'population' fields will be obtained from our geonames
         dataset.
 
-        A raster lookup for each city will be done to set the mmi field
-        in the city feature with the value on the raster. The raster should be
-        one generated using :func:`mmiDatToRaster`. The raster will be created
-        first if needed.
+        The mmi field of every city is set with one vectorised lookup on the
+        in memory grid (see :func:`GridModel.sample`), giving the same value
+        as the raster generated by :func:`mmi_to_raster` would.
 
-        The distance to and direction to/from fields will be set using QGIS
-        geometry API.
+        The distance (in km) to and direction to/from fields will be set using
+        great circle calculations (see :mod:`realtime.earthquake.geodesic`).
 
         It is a requirement that there will always be at least one city
-        on the map for context so we will iteratively do a city selection,
-        starting with the extents of the MMI dataset and then zooming
-        out by self.zoom_factor until we have some cities selected.
+        on the map for context so we select the cities in the extents of the
+        MMI dataset zoomed out by self.zoom_factor as many times as needed to
+        have some cities selected (see :func:`GeonamesIndex.expanding_bbox`).
 
         After making a selection the extents used (taking into account the
-        iterative scaling mentioned above) will be stored in the class
+        scaling mentioned above) will be stored in the class
         attributes so that when producing a map it can be used to ensure
         the cities and the shake area are visible on the map. See
         :samp:`self.extent_with_cities` in :func:`__init__`.
@@ -481,61 +622,45 @@ class ShakeEvent(QObject):
         .. note:: We separate the logic of creating features from writing a
           layer so that we can write to any format we like whilst reusing the
           core logic.
-
-        .. note:: The original dataset will be modified in place.
         """
         LOGGER.debug('localCityValues requested.')
-        # Setup the raster layer for interpolated mmi lookups
-        path = self.shake_grid.mmi_to_raster()
-        file_info = QFileInfo(path)
-        base_name = file_info.baseName()
-        raster_layer = QgsRasterLayer(path, base_name)
-        if not raster_layer.isValid():
-            raise InvalidLayerError('Layer failed to load!\n%s' % path)
-
-        # Setup the cities table, querying on event bbox
-        # Path to sqlitedb containing geonames table
-        db_path = self._get_sqlite_path()
-        uri = QgsDataSourceURI()
-        uri.setDatabase(db_path)
-        table = 'geonames'
-        geometry_column = 'geometry'
-        schema = ''
-        uri.setDataSource(schema, table, geometry_column)
-        layer = QgsVectorLayer(uri.uri(), 'Towns', 'spatialite')
-        if not layer.isValid():
-            raise InvalidLayerError(db_path)
+        cache = self.city_analysis_cache()
+        if 'cities' in cache:
+            self.search_boxes = cache['search_boxes']
+            self.extent_with_cities = cache['extent_with_cities']
+            return [QgsFeature(feature) for feature in cache['cities']]
+
+        # Populated places of the geonames sqlite, loaded once per process
+        places = geonames_index(self._get_sqlite_path())
 
         rectangle = self.shake_grid.grid_bounding_box
 
-        # Do iterative selection using expanding selection area
-        # Until we have got some cities selected
+        # Find the smallest expansion of the grid extent (zooming out by
+        # self.zoom_factor) holding some geonames features, with a single
+        # query. The cities are the populated places of that box.
         attempts_limit = 5
         minimum_city_count = 1
-        found_flag = False
+        boxes, selection, found_flag = places.expanding_bbox(
+            rectangle.xMinimum(),
+            rectangle.yMinimum(),
+            rectangle.xMaximum(),
+            rectangle.yMaximum(),
+            self.zoom_factor,
+            attempts_limit,
+            minimum_city_count)
         search_boxes = []
-        request = None
         LOGGER.debug('Search polygons for cities:')
-        for _ in range(attempts_limit):
-            LOGGER.debug(rectangle.asWktPolygon())
-            layer.removeSelection()
-            request = QgsFeatureRequest().setFilterRect(rectangle)
-            request.setFlags(QgsFeatureRequest.ExactIntersect)
-            # This is klunky - must be a better way in the QGIS api!?
-            # but layer.selectedFeatureCount() relates to gui
-            # selection it seems...
-            count = 0
-            for _ in layer.getFeatures(request):
-                count += 1
+        for x_minimum, y_minimum, x_maximum, y_maximum, count in boxes:
+            rectangle = QgsRectangle(
+                x_minimum, y_minimum, x_maximum, y_maximum)
+            if count is None:
+                # Final zoom out when no box held enough cities
+                break
             # Store the box plus city count so we can visualise it later
             record = {'city_count': count, 'geometry': rectangle}
+            LOGGER.debug(rectangle.asWktPolygon())
             LOGGER.debug('Found cities in search box: %s' % record)
             search_boxes.append(record)
-            if count < minimum_city_count:
-                rectangle.scale(self.zoom_factor)
-            else:
-                found_flag = True
-                break
 
         self.search_boxes = search_boxes
         # TODO: Perhaps it might be neater to combine the bbox of cities and
@@ -548,79 +673,81 @@ class ShakeEvent(QObject):
         # Setup field indexes of our input and out datasets
         cities = []
 
-        # For measuring distance and direction from each city to epicenter
-        epicenter = QgsPoint(
-            self.shake_grid.longitude,
-            self.shake_grid.latitude)
+        longitudes = places.longitudes[selection]
+        latitudes = places.latitudes[selection]
 
-        # Now loop through the db adding selected features to mem layer
-        for feature in layer.getFeatures(request):
-            if not feature.isValid():
-                LOGGER.debug('Skipping feature')
-                continue
-                # LOGGER.debug('Writing feature to mem layer')
-            # calculate the distance and direction from this point
-            # to and from the epicenter
-            feature_id = str(feature.id())
-
-            # Make sure the fcode contains PPL (populated place)
-            code = str(feature['fcode'])
-            if 'PPL' not in code:
-                continue
+        # Populate the mmi of every place with a single lookup on the grid
+        mmi_values = self.grid_model.sample(longitudes, latitudes)
 
-            # Make sure the place is populated
-            population = int(feature['population'])
-            if population < 1:
-                continue
-
-            point = feature.geometry().asPoint()
-            distance = point.sqrDist(epicenter)
-            direction_to = point.azimuth(epicenter)
-            direction_from = epicenter.azimuth(point)
-            place_name = str(feature['asciiname'])
-
-            new_feature = QgsFeature()
-            new_feature.setGeometry(feature.geometry())
-
-            # Populate the mmi field by raster lookup
-            # Get a {int, QVariant} back
-            raster_values = raster_layer.dataProvider().identify(
-                point, QgsRaster.IdentifyFormatValue).results()
-            raster_values = raster_values.values()
-            if not raster_values or len(raster_values) < 1:
-                # position not found on raster
-                continue
-            value = raster_values[0]  # Band 1
-
-            LOGGER.debug('Raster Value: %s' % value)
-            if 'no data' in str(value) or value is None:
-                mmi = 0
-            else:
-                mmi = float(value)
+        # Calculate the distance and direction from every place to and from
+        # the epicenter
+        distances, directions_to, directions_from = distance_and_bearings(
+            self.shake_grid.longitude,
+            self.shake_grid.latitude,
+            longitudes,
+            latitudes)
+
+        for index, mmi, distance, direction_to, direction_from in zip(
+                selection, mmi_values, distances, directions_to,
+                directions_from):
+            point = QgsPoint(
+                places.longitudes[index], places.latitudes[index])
+            feature_id = str(places.ids[index])
+            population = int(places.populations[index])
+            place_name = places.names[index]
+            mmi = float(mmi)
 
             LOGGER.debug(
-                'Looked up mmi of %s on raster for %s' % (mmi, str(point)))
+                'Looked up mmi of %s on grid for %s' % (mmi, str(point)))
 
             roman = romanise(mmi)
             if roman is None:
                 continue
 
-            # new_feature.setFields(myFields)
+            new_feature = QgsFeature()
+            # noinspection PyArgumentList
+            new_feature.setGeometry(QgsGeometry.fromPoint(point))
             # Column positions are determined by setFields above
             attributes = [
                 feature_id,
                 place_name,
                 population,
                 mmi,
-                distance,
-                direction_to,
-                direction_from,
+                float(distance),
+                float(direction_to),
+                float(direction_from),
                 roman,
                 mmi_colour(mmi)]
             new_feature.setAttributes(attributes)
             cities.append(new_feature)
 
-        return cities
+        cache['cities'] = cities
+        cache['search_boxes'] = search_boxes
+        cache['extent_with_cities'] = rectangle
+        return [QgsFeature(feature) for feature in cities]
+
+    def city_analysis_cache(self):
+        """Get the cached city analysis results of this event.
+
+        The results only depend on the shake grid, the geonames sqlite and
+        the zoom factor, so they are computed once and reused by every
+        consumer until one of those changes.
+
+        :return: A dict holding the cached results, emptied if its sources
+            changed since they were computed.
+        :rtype: dict
+        """
+        sqlite_path = self._get_sqlite_path()
+        key = (
+            self.grid_model.source_hash,
+            os.path.abspath(sqlite_path),
+            os.path.getmtime(sqlite_path),
+            self.zoom_factor)
+        if self.city_cache.get('key') != key:
+            if self.city_cache:
+                LOGGER.debug('City analysis sources changed, recomputing.')
+            self.city_cache = {'key': key}
+        return self.city_cache
 
     def local_cities_memory_layer(self):
         """Fetch a collection of the cities that are nearby.
@@ -631,6 +758,9 @@ class ShakeEvent(QObject):
         :raises: Any exceptions will be propagated.
         """
         LOGGER.debug('local_cities_memory_layer requested.')
+        cache = self.city_analysis_cache()
+        if 'memory_layer' in cache:
+            return cache['memory_layer']
         # Now store the selection in a temporary memory layer
         memory_layer = QgsVectorLayer('Point', 'affected_cities', 'memory')
         layer_provider = memory_layer.dataProvider()
@@ -662,6 +792,7 @@ class ShakeEvent(QObject):
 
             LOGGER.debug('Feature count of mem layer:  %s' %
                          memory_layer.featureCount())
+            cache['memory_layer'] = memory_layer
             return memory_layer
         else:
             raise InvalidLayerError(
@@ -767,6 +898,33 @@ class ShakeEvent(QObject):
         .. note:: RMN: self.shake_grid_location_city will also be populated
             with details.
         """
+        cache = self.city_analysis_cache()
+        if 'sorted_cities' not in cache:
+            cache['sorted_cities'] = self._sort_impacted_cities()
+        sorted_cities = list(cache['sorted_cities'])
+        # TODO: Assumption that place names are unique is bad....
+        if len(sorted_cities) > 0:
+            self.most_affected_city = sorted_cities[0]
+        else:
+            self.most_affected_city = None
+        # RMN: Fill in details for self.shake_grid_location_city
+        for c in sorted_cities:
+            if c['name'].strip() == self.shake_grid.location.strip():
+                self.shake_grid_location_city = c
+
+        # Slice off just the top row_count records now
+        if len(sorted_cities) > 5:
+            sorted_cities = sorted_cities[0: row_count]
+        return sorted_cities
+
+    def _sort_impacted_cities(self):
+        """Read the nearby cities and sort them by mmi then population.
+
+        See :func:`sorted_impacted_cities`.
+
+        :return: A list of dicts containing all the sorted cities.
+        :rtype: list
+        """
         layer = self.local_cities_memory_layer()
         fields = layer.dataProvider().fields()
         cities = []
@@ -826,19 +984,6 @@ class ShakeEvent(QObject):
                 d['dir_to'],
                 d['dir_from'],
                 d['id']))
-        # TODO: Assumption that place names are unique is bad....
-        if len(sorted_cities) > 0:
-            self.most_affected_city = sorted_cities[0]
-        else:
-            self.most_affected_city = None
-        # RMN: Fill in details for self.shake_grid_location_city
-        for c in sorted_cities:
-            if c['name'].strip() == self.shake_grid.location.strip():
-                self.shake_grid_location_city = c
-
-        # Slice off just the top row_count records now
-        if len(sorted_cities) > 5:
-            sorted_cities = sorted_cities[0: row_count]
         return sorted_cities
 
     def write_html_table(self, file_name, table):
@@ -885,6 +1030,7 @@ class ShakeEvent(QObject):
 
         return path
 
+    @timed('html')
     def impacted_cities_table(self, row_count=5):
         """Return a table object of sorted impacted cities.
 
@@ -946,6 +1092,7 @@ class ShakeEvent(QObject):
 
         return table, path
 
+    @timed('html')
     def impact_table(self):
         """Create the html listing affected people per mmi interval.
 
@@ -1011,7 +1158,43 @@ class ShakeEvent(QObject):
             population_raster_path=None,
             force_flag=False,
             algorithm='nearest'):
-        """Use the SAFE ITB earthquake function to calculate impacts.
+        """Calculate impacts and write the impacts html table.
+
+        This is :func:`analyse_impacts` followed by :func:`impact_table`.
+        See :func:`analyse_impacts` for the parameters.
+
+        :returns:
+            str: the path to the computed impact file.
+            str: Path to the html report showing a table of affected people per
+                mmi interval.
+        """
+        self.analyse_impacts(
+            population_raster_path=population_raster_path,
+            force_flag=force_flag,
+            algorithm=algorithm)
+        impact_table_path = self.impact_table()
+        return self.impact_file, impact_table_path
+
+    @timed('impact')
+    def analyse_impacts(
+            self,
+            population_raster_path=None,
+            force_flag=False,
+            algorithm='nearest'):
+        """Use the ITB earthquake fatality model to calculate impacts.
+
+        The SAFE ITBFatalityFunction is used (see
+        :func:`impact_function_impacts`) unless the
+        INASAFE_REALTIME_IMPACT_ENGINE environment variable is set to
+        'native', in which case the model runs in process on the grid and
+        population arrays (see :func:`native_impacts`), falling back to the
+        impact function if it fails.
+
+        The result does not depend on the locale, the translated html table
+        is written separately by :func:`impact_table`. It is cached (see
+        :mod:`realtime.earthquake.impact_cache`) under the fingerprints of
+        the grid, the population raster and the algorithm, so reruns of the
+        same event only copy the cached impact layer in place.
 
         :param population_raster_path: optional. see
                 :func:`_get_population_path` for more details on how the path
@@ -1036,8 +1219,6 @@ class ShakeEvent(QObject):
                 self.*Counts are dicts containing fatality / displaced /
                 affected counts for the shake events. Keys for the dict will be
                 MMI classes (I-X) and values will be count type for that class.
-            str: Path to the html report showing a table of affected people per
-                mmi interval.
         """
         if (
                 population_raster_path is None or (
@@ -1048,9 +1229,115 @@ class ShakeEvent(QObject):
         else:
             exposure_path = population_raster_path
 
-        hazard_path = self.shake_grid.mmi_to_raster(
-            force_flag=force_flag,
-            algorithm=algorithm)
+        tif_path = os.path.join(
+            shakemap_extract_dir(),
+            self.event_id,
+            'impact-%s.tif' % algorithm)
+        keywords_path = '%s.xml' % os.path.splitext(tif_path)[0]
+        engine = impact_engine()
+        cache = ImpactCache()
+        cache_key = self.impact_cache_key(exposure_path, algorithm)
+        product = 'impact-%s' % algorithm
+        inputs = {'impact': cache_key}
+        keywords = None
+        if self.manifest.is_current(product, inputs):
+            # The impact layer is already in place, only load its counts
+            keywords = cache.get(cache_key)
+        if keywords is None:
+            keywords = cache.get(cache_key, tif_path, keywords_path)
+        if keywords is not None:
+            LOGGER.info('Using cached impact result %s' % cache_key)
+        else:
+            tif_path, keywords_path, keywords = self.compute_impacts(
+                exposure_path, engine, force_flag, algorithm)
+            cache.put(cache_key, keywords, tif_path, keywords_path)
+        self.manifest.record(product, inputs, [tif_path, keywords_path])
+
+        self.impact_file = tif_path
+        self.impact_keywords_file = keywords_path
+        self.fatality_counts = keywords['fatalities_per_mmi']
+        self.fatality_total = keywords['total_fatalities']
+        self.displaced_counts = keywords['displaced_per_mmi']
+        self.affected_counts = keywords['exposed_per_mmi']
+        LOGGER.info('***** Fatalities: %s ********' % self.fatality_counts)
+        LOGGER.info('***** Displaced: %s ********' % self.displaced_counts)
+        LOGGER.info('***** Affected: %s ********' % self.affected_counts)
+
+        return self.impact_file
+
+    def impact_cache_key(self, exposure_path, algorithm):
+        """Key of the impact result in the impact cache.
+
+        :param exposure_path: Path to the population raster.
+        :type exposure_path: str
+
+        :param algorithm: Interpolation algorithm of the mmi raster.
+        :type algorithm: str
+
+        :return: The key, see :func:`impact_key`.
+        :rtype: str
+        """
+        return impact_key(
+            self.grid_model.data_hash,
+            raster_key(exposure_path),
+            algorithm,
+            impact_engine())
+
+    def compute_impacts(self, exposure_path, engine, force_flag, algorithm):
+        """Run the ITB fatality model with an engine.
+
+        :param exposure_path: Path to the population raster.
+        :type exposure_path: str
+
+        :param engine: NATIVE_IMPACT_ENGINE to run :func:`native_impacts`,
+            falling back to :func:`impact_function_impacts` if it fails, or
+            IMPACT_FUNCTION_ENGINE to only run the latter.
+        :type engine: str
+
+        :param force_flag: Whether to force the regeneration of the mmi
+            raster.
+        :type force_flag: bool
+
+        :param algorithm: Interpolation algorithm of the mmi raster.
+        :type algorithm: str
+
+        :return: A tuple of (impact tif path, impact keywords path, impact
+            keywords).
+        :rtype: tuple
+        """
+        if engine == NATIVE_IMPACT_ENGINE:
+            # noinspection PyBroadException
+            try:
+                return self.native_impacts(exposure_path, algorithm)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception(
+                    'Native ITB fatality engine failed, falling back to the '
+                    'impact function.')
+
+        return self.impact_function_impacts(
+            exposure_path, force_flag, algorithm)
+
+    def impact_function_impacts(self, exposure_path, force_flag, algorithm):
+        """Run the safe ITBFatalityFunction on clipped shake and population.
+
+        :param exposure_path: Path to the population raster.
+        :type exposure_path: str
+
+        :param force_flag: Whether to force the regeneration of the mmi
+            raster.
+        :type force_flag: bool
+
+        :param algorithm: Interpolation algorithm of the mmi raster.
+        :type algorithm: str
+
+        :return: A tuple of (impact tif path, impact keywords path, impact
+            keywords).
+        :rtype: (str, str, dict)
+        """
+        with self.metrics.stage('rasterize'):
+            hazard_path = self.shake_grid.mmi_to_raster(
+                force_flag=force_flag,
+                algorithm=algorithm)
 
         clipped_hazard, clipped_exposure = self.clip_layers(
             shake_raster_path=hazard_path,
@@ -1073,16 +1360,15 @@ class ShakeEvent(QObject):
         function.force_memory = True
         function.run_analysis()
         result = function.impact
-        try:
-            fatalities = result.keywords['fatalities_per_mmi']
-            affected = result.keywords['exposed_per_mmi']
-            displaced = result.keywords['displaced_per_mmi']
-            total_fatalities = result.keywords['total_fatalities']
-        except:
-            LOGGER.exception(
-                'Fatalities_per_mmi key not found in:\n%s' %
-                result.keywords)
-            raise
+        for key in [
+                'fatalities_per_mmi',
+                'exposed_per_mmi',
+                'displaced_per_mmi',
+                'total_fatalities']:
+            if key not in result.keywords:
+                LOGGER.error(
+                    '%s key not found in:\n%s' % (key, result.keywords))
+                raise KeyError(key)
         # Copy the impact layer into our extract dir.
         tif_path = os.path.join(shakemap_extract_dir(),
                                 self.event_id,
@@ -1099,20 +1385,121 @@ class ShakeEvent(QObject):
         shutil.copyfile(keywords_source, keywords_path)
         LOGGER.debug('Copied impact keywords to:\n%s\n' % keywords_path)
 
-        self.impact_file = tif_path
-        self.impact_keywords_file = keywords_path
-        self.fatality_counts = fatalities
-        self.fatality_total = total_fatalities
-        self.displaced_counts = displaced
-        self.affected_counts = affected
-        LOGGER.info('***** Fatalities: %s ********' % self.fatality_counts)
-        LOGGER.info('***** Displaced: %s ********' % self.displaced_counts)
-        LOGGER.info('***** Affected: %s ********' % self.affected_counts)
+        return tif_path, keywords_path, result.keywords
 
-        impact_table_path = self.impact_table()
-        return self.impact_file, impact_table_path
+    def native_impacts(self, exposure_path, algorithm):
+        """Run the ITB fatality model in process on the grid arrays.
 
-    # noinspection PyMethodMayBeStatic
+        The population inside the shake extent is read from the exposure
+        store and the mmi of every population cell is sampled from the
+        grid, so no raster has to be clipped, resampled or read back.
+        The exposed population raster is written as the impact layer.
+
+        :param exposure_path: Path to the population raster.
+        :type exposure_path: str
+
+        :param algorithm: Interpolation algorithm, used in the impact file
+            names.
+        :type algorithm: str
+
+        :return: A tuple of (impact tif path, impact keywords path, impact
+            keywords).
+        :rtype: (str, str, dict)
+        """
+        with self.metrics.stage('clip'):
+            store = exposure_store(exposure_path)
+            population, geotransform = store.window(
+                self.grid_model.x_minimum,
+                self.grid_model.y_minimum,
+                self.grid_model.x_maximum,
+                self.grid_model.y_maximum)
+        population = population.astype(numpy.float64)
+        if store.no_data is not None:
+            population[population == store.no_data] = numpy.nan
+
+        # mmi at the centre of every population cell
+        rows, columns = population.shape
+        longitudes = geotransform[0] + (
+            numpy.arange(columns) + 0.5) * geotransform[1]
+        latitudes = geotransform[3] + (
+            numpy.arange(rows) + 0.5) * geotransform[5]
+        longitudes, latitudes = numpy.meshgrid(longitudes, latitudes)
+        mmi = self.grid_model.sample(
+            longitudes.ravel(), latitudes.ravel(),
+            no_data=numpy.nan).reshape(population.shape)
+
+        keywords = itb_fatality(mmi, population)
+
+        tif_path = os.path.join(
+            shakemap_extract_dir(),
+            self.event_id,
+            'impact-%s.tif' % algorithm)
+        exposed = numpy.where(
+            mmi_bands(mmi) >= 0, numpy.nan_to_num(population), 0)
+        write_raster(
+            tif_path, exposed, geotransform, store.index['projection'])
+        LOGGER.debug('Wrote impact result to:\n%s\n' % tif_path)
+
+        impact_layer = read_qgis_layer(tif_path, 'Estimated exposed people')
+        KeywordIO().write_keywords(impact_layer, {
+            'keyword_version': u'3.5',
+            'title': u'Estimated exposed people',
+            'layer_purpose': u'impact',
+            'layer_geometry': u'raster',
+            'layer_mode': u'continuous',
+            # The counts written by ITBFatalityFunction too
+            'exposed_per_mmi': keywords['exposed_per_mmi'],
+            'fatalities_per_mmi': keywords['fatalities_per_mmi'],
+            'displaced_per_mmi': keywords['displaced_per_mmi'],
+            'total_fatalities': keywords['total_fatalities'],
+            'total_fatalities_raw': keywords['total_fatalities_raw'],
+            'total_population': keywords['total_population']})
+        keywords_path = '%s.xml' % os.path.splitext(tif_path)[0]
+        LOGGER.debug('Wrote impact keywords to:\n%s\n' % keywords_path)
+        return tif_path, keywords_path, keywords
+
+    def population_window(self, population_raster_path, extent):
+        """Write the part of the population raster covering an extent.
+
+        The window is read from the pre-tiled exposure store of the raster
+        (see :mod:`realtime.exposure_store`) so clipping only has to warp a
+        small raster instead of the whole national one. If the store can
+        not be used the full raster path is returned.
+
+        :param population_raster_path: Path to the population raster.
+        :type population_raster_path: str
+
+        :param extent: The extent needed, in the CRS of the population
+            raster.
+        :type extent: QgsRectangle
+
+        :return: Path to the population window raster.
+        :rtype: str
+        """
+        # noinspection PyBroadException
+        try:
+            store = exposure_store(population_raster_path)
+            # Pad by one cell so resampling has all the data it needs
+            padding = max(
+                abs(store.geotransform[1]), abs(store.geotransform[5]))
+            window_path = os.path.join(
+                shakemap_extract_dir(),
+                self.event_id,
+                'population-window.tif')
+            store.write_window(
+                window_path,
+                extent.xMinimum() - padding,
+                extent.yMinimum() - padding,
+                extent.xMaximum() + padding,
+                extent.yMaximum() + padding)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception(
+                'Exposure store could not be used, clipping the full '
+                'population raster.')
+            return population_raster_path
+        return window_path
+
+    @timed('clip')
     def clip_layers(self, shake_raster_path, population_raster_path):
         """Clip population (exposure) layer to dimensions of shake data.
 
@@ -1133,6 +1520,8 @@ class ShakeEvent(QObject):
         # _ is a syntactical trick to ignore second returned value
         base_name, _ = os.path.splitext(shake_raster_path)
         hazard_layer = QgsRasterLayer(shake_raster_path, base_name)
+        population_raster_path = self.population_window(
+            population_raster_path, hazard_layer.extent())
         base_name, _ = os.path.splitext(population_raster_path)
         exposure_layer = QgsRasterLayer(population_raster_path, base_name)
 
@@ -1192,98 +1581,243 @@ class ShakeEvent(QObject):
     def _get_sqlite_path(self):
         """Helper to determine sqlite file with geonames places in it.
 
-        The following priority will be used to determine the path:
-            1) the class attribute self.geonames_sqlite_path
-               will be checked and if not None and the file exists it will be
-               used.
-            2) the environment variable 'GEONAMES_SQLITE_PATH' will be
-               checked and if the file exists if set it will be used.
-            4) A hard coded path of
-               :file:`/fixtures/indonesia.sqlite` will be appended
-               to os.path.abspath(os.path.curdir)
-            5) A hard coded path of
-               :file:`/usr/local/share/inasafe/indonesia.tif`
-               will be used.
+        See :func:`geonames_sqlite_path`.
 
         :returns: Path to a geonames sqlite file.
         :rtype: str
 
         :raises: FileNotFoundError
         """
-        # When used via the scripts make_shakemap.sh
-        fixture_path = os.path.join(
-            data_dir(), 'indonesia.sqlite')
+        return geonames_sqlite_path(self.geonames_sqlite_path)
 
-        local_path = '/usr/local/share/inasafe/indonesia.sqlite'
-        if self.geonames_sqlite_path is not None:
-            if os.path.exists(self.geonames_sqlite_path):
-                return self.geonames_sqlite_path
+    def _get_population_path(self):
+        """Helper to determine population raster's path.
 
-        if 'GEONAMES_SQLITE_PATH' in os.environ:
-            population_path = os.environ['GEONAMES_SQLITE_PATH']
-            if os.path.exists(population_path):
-                return population_path
+        See :func:`population_raster_path`.
 
-        if os.path.exists(fixture_path):
-            return fixture_path
+        :return: path to a population raster file.
+        :rtype: str
 
-        if os.path.exists(local_path):
-            return local_path
+        :raises: FileNotFoundError
+        """
+        return population_raster_path(self.population_raster_path)
 
-        raise FileNotFoundError('Geonames sqlite file could not be found')
+    def product_inputs(self, product, algorithm='nearest'):
+        """Fingerprints of the inputs of a product of the event.
 
-    def _get_population_path(self):
-        """Helper to determine population raster's path.
+        The products computed from the grid depend on the grid values only
+        (see :attr:`GridModel.data_hash`), so a republished grid.xml with
+        the same values does not rebuild them. The report depends on the
+        whole grid.xml, the project, the template and the locale.
 
-        The following priority will be used to determine the path:
-            1) the class attribute self.population_raster_path
-               will be checked and if not None and the file exists it will be
-               used.
-            2) the environment variable 'INASAFE_POPULATION_PATH' will be
-               checked and if the file exists if set it will be used.
-            4) A hard coded path of
-               :file:`/fixtures/exposure/population.tif` will be appended
-               to os.path.abspath(os.path.curdir)
-            5) A hard coded path of
-               :file:`/usr/local/share/inasafe/exposure/population.tif`
-               will be used.
+        :param product: One of 'mmi-shapefile', 'contours', 'cities',
+            'impact', 'impacts-table', 'cities-table' or 'report'.
+        :type product: str
+
+        :param algorithm: (Optional) Interpolation algorithm of the mmi
+            raster.
+        :type algorithm: str
+
+        :return: Fingerprints keyed by input name, see
+            :class:`BuildManifest`.
+        :rtype: dict
+
+        :raises: FileNotFoundError if an input file can not be found.
+        """
+        grid_hash = self.grid_model.data_hash
+        if product == 'mmi-shapefile':
+            return {'grid': grid_hash}
+        elif product == 'contours':
+            return {'grid': grid_hash, 'algorithm': algorithm}
+        elif product == 'cities':
+            return {
+                'grid': grid_hash,
+                'geonames': raster_key(self._get_sqlite_path()),
+                'zoom_factor': self.zoom_factor}
+        elif product == 'impact':
+            return {'impact': self.impact_cache_key(
+                self._get_population_path(), algorithm)}
+        elif product == 'impacts-table':
+            return {
+                'impact': inputs_hash(
+                    self.product_inputs('impact', algorithm)),
+                'locale': self.locale}
+        elif product == 'cities-table':
+            return {
+                'cities': inputs_hash(self.product_inputs('cities')),
+                'locale': self.locale}
+        elif product == 'report':
+            inputs = {
+                'grid': self.grid_model.source_hash,
+                'project': file_sha1(self.project_path()),
+                'template': file_sha1(self.template_path()),
+                'render_mode': render_mode(),
+                'version': get_version(),
+                'locale': self.locale}
+            for dependency in ['contours', 'impact', 'cities']:
+                try:
+                    inputs[dependency] = inputs_hash(
+                        self.product_inputs(dependency, algorithm))
+                except FileNotFoundError:
+                    inputs[dependency] = None
+            return inputs
+        raise ValueError('Unknown product %s' % product)
+
+    # noinspection PyMethodMayBeStatic
+    def project_path(self):
+        """Path to the QGIS project used to render the map.
 
-        :return: path to a population raster file.
         :rtype: str
+        """
+        if 'INASAFE_REALTIME_PROJECT' in os.environ:
+            return os.environ['INASAFE_REALTIME_PROJECT']
+        return os.path.join(data_dir(), 'realtime.qgs')
 
-        :raises: FileNotFoundError
+    # noinspection PyMethodMayBeStatic
+    def template_path(self):
+        """Path to the composer template used to render the map.
+
+        :rtype: str
+        """
+        if 'INASAFE_REALTIME_TEMPLATE' in os.environ:
+            return os.environ['INASAFE_REALTIME_TEMPLATE']
+        return os.path.join(data_dir(), 'realtime-template.qpt')
 
-        TODO: Consider automatically fetching from
-        http://web.clas.ufl.edu/users/atatem/pub/IDN.7z
+    def analyse(self, force_flag=False, impact_flag=True):
+        """Run the locale independent part of the event processing.
 
-        Also see http://web.clas.ufl.edu/users/atatem/pub/
-        https://github.com/AIFDR/inasafe/issues/381
+        This creates the mmi shapefile, the contours, the nearby cities and
+        city search boxes shapefiles and (optionally) the impact analysis.
+        Each product is only computed once per instance, so rendering the
+        event for another locale reuses the results.
+
+        :param force_flag: (Optional). Whether to force the
+                regeneration of the products. Defaults to False.
+        :type force_flag: bool
+
+        :param impact_flag: (Optional). Whether to run the impact analysis
+                too. Defaults to True.
+        :type impact_flag: bool
+
+        :raise Propagates any exceptions.
         """
-        # When used via the scripts make_shakemap.sh
-        fixture_path = os.path.join(
-            data_dir(), 'exposure', 'population.tif')
+        # Products whose inputs did not change since they were recorded in
+        # the manifest are reused, the others are overwritten.
+        if self.mmi_shapefile is None:
+            with self.metrics.stage('mmi_shapefile'):
+                self.mmi_shapefile = self.manifest.build(
+                    'mmi-shapefile',
+                    self.product_inputs('mmi-shapefile'),
+                    lambda: self.shake_grid.mmi_to_shapefile(
+                        force_flag=True),
+                    force_flag=force_flag)
+            logging.info('Created: %s', self.mmi_shapefile)
 
-        local_path = '/usr/local/share/inasafe/exposure/population.tif'
-        if self.population_raster_path is not None:
-            if os.path.exists(self.population_raster_path):
-                return self.population_raster_path
+        # 'average', 'invdist', 'nearest' - currently only nearest works
+        algorithm = 'nearest'
+        if self.contours_shapefile is None:
+            # The contours are traced on the mmi raster, the rasterization
+            # is part of this stage
+            with self.metrics.stage('contours'):
+                self.contours_shapefile = self.manifest.build(
+                    'contours',
+                    self.product_inputs('contours', algorithm),
+                    lambda: self.shake_grid.mmi_to_contours(
+                        force_flag=True, algorithm=algorithm),
+                    force_flag=force_flag)
+            logging.info('Created: %s', self.contours_shapefile)
+
+        if not self.cities_analysed:
+            self.cities_analysed = True
+            # noinspection PyBroadException
+            try:
+                with self.metrics.stage('cities'):
+                    self.cities_shapefile, self.search_boxes_shapefile = (
+                        self.manifest.build(
+                            'cities',
+                            self.product_inputs('cities'),
+                            lambda: [
+                                self.cities_to_shapefile(force_flag=True),
+                                self.city_search_boxes_to_shapefile(
+                                    force_flag=True)],
+                            force_flag=force_flag))
+                logging.info('Created: %s', self.cities_shapefile)
+                logging.info('Created: %s', self.search_boxes_shapefile)
+            except:  # pylint: disable=W0702
+                logging.exception('No nearby cities found!')
+
+        if impact_flag and self.impact_file is None:
+            impact_file = self.analyse_impacts(algorithm=algorithm)
+            logging.info('Created: %s', impact_file)
+
+    def report_is_current(self):
+        """Check whether the report of the locale is rendered and current.
+
+        :rtype: bool
+        """
+        return self.manifest.is_current(
+            'report-%s' % self.locale, self.product_inputs('report'))
+
+    def prepare_report(self, force_flag=False, impact_flag=None):
+        """Build the products of the report without rendering it.
+
+        This runs :func:`analyse` and writes the html tables of the locale.
+        They are recorded in the manifest, so :func:`render_map` only loads
+        them, even in another process: the analysis can run on a worker
+        without a display and the rendering on the Xvfb one.
+
+        :param force_flag: (Optional). Whether to force the regeneration of
+            the products. The report is rendered again too. Defaults to
+            False.
+        :type force_flag: bool
 
-        if 'INASAFE_POPULATION_PATH' in os.environ:
-            population_path = os.environ['INASAFE_POPULATION_PATH']
-            if os.path.exists(population_path):
-                return population_path
+        :param impact_flag: (Optional). Whether to run the impact analysis
+            and write the impacts table. Defaults to whether the report
+            needs to be rendered.
+        :type impact_flag: bool
 
-        if os.path.exists(fixture_path):
-            return fixture_path
+        :return: A tuple of (cities html path, impacts html path), None
+            when a table was not written.
+        :rtype: (str, str)
 
-        if os.path.exists(local_path):
-            return local_path
+        :raise Propagates any exceptions.
+        """
+        if force_flag:
+            self.manifest.invalidate('report-%s' % self.locale)
+        if impact_flag is None:
+            impact_flag = not self.report_is_current()
+        self.analyse(force_flag=force_flag, impact_flag=impact_flag)
 
-        raise FileNotFoundError('Population file could not be found')
+        cities_html_path = None
+        if self.cities_shapefile is not None:
+            # noinspection PyBroadException
+            try:
+                cities_html_path = self.manifest.build(
+                    'cities-table',
+                    self.product_inputs('cities-table'),
+                    lambda: self.impacted_cities_table()[1],
+                    force_flag=force_flag)
+                logging.info('Created: %s', cities_html_path)
+            except:  # pylint: disable=W0702
+                logging.exception('No nearby cities found!')
+
+        impacts_html_path = None
+        if impact_flag:
+            impacts_html_path = self.manifest.build(
+                'impacts-table',
+                self.product_inputs('impacts-table'),
+                self.impact_table,
+                force_flag=force_flag)
+            logging.info('Created: %s', impacts_html_path)
+        return cities_html_path, impacts_html_path
 
     def render_map(self, force_flag=False):
         """This is the 'do it all' method to render a pdf.
 
+        The products of the report are built by :func:`prepare_report`,
+        unless they are already current, then the map is composed and
+        exported.
+
         :param force_flag: (Optional). Whether to force the
                 regeneration of map product. Defaults to False.
         :type force_flag: bool
@@ -1293,72 +1827,39 @@ class ShakeEvent(QObject):
         image_path, pdf_path, pickle_path, thumbnail_image_path = \
             self.generate_result_path()
 
-        short_circuit_flag = False
-        if not force_flag:
-            # Check if the images already exist and if so
-            # short circuit.
-            short_circuit_flag = True
-            if not os.path.exists(pdf_path):
-                short_circuit_flag = False
-            if not os.path.exists(image_path):
-                short_circuit_flag = False
-            if not os.path.exists(thumbnail_image_path):
-                short_circuit_flag = False
-            if short_circuit_flag:
-                LOGGER.info('%s (already exists)' % pdf_path)
-                LOGGER.info('%s (already exists)' % image_path)
-                LOGGER.info('%s (already exists)' % thumbnail_image_path)
-
-        # Make sure the map layers have all been removed before we
-        # start otherwise in batch mode we will get overdraws.
-        # noinspection PyArgumentList
-        QgsMapLayerRegistry.instance().removeAllMapLayers()
+        # Short circuit if the report was already rendered from the same
+        # inputs, see :func:`product_inputs`.
+        report_product = 'report-%s' % self.locale
+        report_inputs = self.product_inputs('report')
+        short_circuit_flag = (
+            not force_flag and
+            self.manifest.is_current(report_product, report_inputs))
+        if short_circuit_flag:
+            LOGGER.info('%s (up to date)' % pdf_path)
+            LOGGER.info('%s (up to date)' % image_path)
+            LOGGER.info('%s (up to date)' % thumbnail_image_path)
 
-        mmi_shape_file = self.shake_grid.mmi_to_shapefile(
-            force_flag=force_flag)
-        logging.info('Created: %s', mmi_shape_file)
-        cities_html_path = None
-        cities_shape_file = None
+        # Load our project
+        project_path = self.project_path()
 
-        # 'average', 'invdist', 'nearest' - currently only nearest works
-        algorithm = 'nearest'
-        try:
-            contours_shapefile = self.shake_grid.mmi_to_contours(
-                force_flag=force_flag,
-                algorithm=algorithm)
-        except:
-            raise
-        logging.info('Created: %s', contours_shapefile)
-        # noinspection PyBroadException
-        try:
-            cities_shape_file = self.cities_to_shapefile(
-                force_flag=force_flag)
-            logging.info('Created: %s', cities_shape_file)
-            search_box_file = self.city_search_boxes_to_shapefile(
-                force_flag=force_flag)
-            logging.info('Created: %s', search_box_file)
-            _, cities_html_path = self.impacted_cities_table()
-            logging.info('Created: %s', cities_html_path)
-        except:  # pylint: disable=W0702
-            logging.exception('No nearby cities found!')
+        # Make sure the layers of the previous event have all been removed
+        # before we start otherwise in batch mode we will get overdraws.
+        context = render_context()
+        context.reset(project_path)
+
+        # We only need the impacts if we are going to render the map
+        cities_html_path, impacts_html_path = self.prepare_report(
+            force_flag=force_flag, impact_flag=not short_circuit_flag)
 
         if short_circuit_flag:
             # short circuit after we calculated nearby cities
             # (used in realtime push)
             return pdf_path
 
-        _, impacts_html_path = self.calculate_impacts()
-        logging.info('Created: %s', impacts_html_path)
+        contours_shapefile = self.contours_shapefile
+        cities_shape_file = self.cities_shapefile
 
-        # Load our project
-        if 'INASAFE_REALTIME_PROJECT' in os.environ:
-            project_path = os.environ['INASAFE_REALTIME_PROJECT']
-        else:
-            project_path = os.path.join(data_dir(), 'realtime.qgs')
-        # noinspection PyArgumentList
-        QgsProject.instance().setFileName(project_path)
-        # noinspection PyArgumentList
-        QgsProject.instance().read()
+        context.load_project(project_path)
 
         # Load the contours and cities shapefile into the map
         layers_to_add = []
@@ -1378,16 +1879,9 @@ class ShakeEvent(QObject):
         QgsMapLayerRegistry.instance().addMapLayers(layers_to_add)
 
         # Load our template
-        if 'INASAFE_REALTIME_TEMPLATE' in os.environ:
-            template_path = os.environ['INASAFE_REALTIME_TEMPLATE']
-        else:
-            template_path = os.path.join(data_dir(), 'realtime-template.qpt')
+        template_path = self.template_path()
 
-        template_file = file(template_path)
-        template_content = template_file.read()
-        template_file.close()
-        document = QDomDocument()
-        document.setContent(template_content)
+        document = context.template_document(template_path)
 
         # Set up the map renderer that will be assigned to the composition
         map_renderer = CANVAS.mapRenderer()
@@ -1469,36 +1963,14 @@ class ShakeEvent(QObject):
             # if the event is way out in the ocean.
             LOGGER.info('No nearby cities found.')
 
-        # redraw things
-        # dpi = composition.printResolution()
-        # dpmm = dpi / 25.4
-        # width = int(dpmm * composition.paperWidth())
-        # height = int(dpmm * composition.paperHeight())
-        #
-        # image = QImage(QSize(width, height), QImage.Format_ARGB32)
-        # image.setDotsPerMeterX(dpmm * 1000)
-        # image.setDotsPerMeterY(dpmm * 1000)
-        # image.fill(0)
-        #
-        # image_painter = QPainter(image)
-        # composition.renderPage(image_painter, 0)
-        # image_painter.end()
-        # image.save(image_path)
-
-        # Save a pdf.
-        composition.exportAsPDF(pdf_path)
-        LOGGER.info('Generated PDF: %s' % pdf_path)
-        # Save a png
-        page_number = 0
-        image = composition.printPageAsRaster(page_number)
-        image.save(image_path)
-        LOGGER.info('Generated Image: %s' % image_path)
-        # Save a thumbnail
-        size = QSize(200, 200)
-        thumbnail_image = image.scaled(
-            size, Qt.KeepAspectRatioByExpanding)
-        thumbnail_image.save(thumbnail_image_path)
-        LOGGER.info('Generated Thumbnail: %s' % thumbnail_image_path)
+        # Save the pdf, png and thumbnail
+        export_composition(
+            composition, pdf_path, image_path, thumbnail_image_path,
+            metrics=self.metrics)
+        self.manifest.record(
+            report_product,
+            report_inputs,
+            [pdf_path, image_path, thumbnail_image_path, pickle_path])
 
         # Save a QGIS Composer template that you can open in QGIS
         template_document = QDomDocument()
@@ -1572,21 +2044,13 @@ class ShakeEvent(QObject):
         .. note:: This method is heavily based on http://hoegners.de/Maxi/geo/
            which is licensed under the GPL V3.
         """
-        direction_list = [
-            'N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE',
-            'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW',
-            'NW', 'NNW']
         try:
             bearing = float(bearing)
         except ValueError:
             LOGGER.exception('Error casting bearing to a float')
             return None
 
-        directions_count = len(direction_list)
-        directions_interval = 360. / directions_count
-        index = int(round(bearing / directions_interval))
-        index %= directions_count
-        return direction_list[index]
+        return str(cardinal_directions([bearing])[0])
 
     def event_info(self):
         """Get a short paragraph describing the event.
@@ -1891,6 +2355,26 @@ class ShakeEvent(QObject):
     def __str__(self):
         return self.__unicode__()
 
+    def set_locale(self, locale):
+        """Switch the locale used for the reports of this event.
+
+        The results of :func:`analyse` are kept, so the event can be
+        rendered for several locales while analysing it only once.
+
+        :param locale: The iso locale e.g. 'en' or 'id'.
+        :type locale: str
+
+        :raises: TranslationLoadError
+        """
+        if locale == self.locale:
+            return
+        if self.translator is not None:
+            # noinspection PyTypeChecker, PyCallByClass, PyArgumentList
+            QCoreApplication.removeTranslator(self.translator)
+            self.translator = None
+        self.locale = locale
+        self.setup_i18n()
+
     def setup_i18n(self):
         """Setup internationalisation for the reports.
 
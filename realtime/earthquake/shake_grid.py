@@ -0,0 +1,109 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Shake grid backed by the numpy grid model.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import logging
+
+from qgis.core import QgsRectangle
+
+from safe.gui.tools.shake_grid.shake_grid import ShakeGrid
+from realtime.earthquake.grid_model import GridModel
+from realtime.utilities import realtime_logger_name
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+
+class RealtimeShakeGrid(ShakeGrid):
+    """A ShakeGrid that takes its state from a GridModel.
+
+    The InaSAFE ShakeGrid parses the whole grid.xml with minidom and splits
+    every line of grid_data in Python. This subclass fills the same
+    attributes from an already parsed :class:`GridModel` so the xml is only
+    read once per event. The raster, contour and shapefile conversions are
+    inherited unchanged.
+    """
+
+    def __init__(
+            self,
+            title,
+            source,
+            grid_xml_path,
+            grid_model=None,
+            **kwargs):
+        """Constructor.
+
+        :param title: The title of the earthquake that will be also added
+            to the metadata.
+        :type title: str
+
+        :param source: The source of the earthquake.
+        :type source: str
+
+        :param grid_xml_path: Path to the grid.xml file.
+        :type grid_xml_path: str
+
+        :param grid_model: (Optional) The parsed grid. It will be read from
+            grid_xml_path if not given.
+        :type grid_model: GridModel
+
+        Any other keyword arguments are passed to ShakeGrid.
+        """
+        if grid_model is None:
+            grid_model = GridModel.from_file(grid_xml_path)
+        self.grid_model = grid_model
+        self._mmi_data = None
+        ShakeGrid.__init__(self, title, source, grid_xml_path, **kwargs)
+
+    def parse_grid_xml(self):
+        """Populate the ShakeGrid attributes from the grid model."""
+        LOGGER.debug('Populating shake grid from grid model.')
+        model = self.grid_model
+        self.event_id = model.event_id
+        self.magnitude = model.magnitude
+        self.longitude = model.longitude
+        self.latitude = model.latitude
+        self.location = model.location
+        self.depth = model.depth
+        # Sets day, month, year, hour, minute, second, time_zone and time
+        self.extract_date_time(model.event_timestamp)
+        self.x_minimum = model.x_minimum
+        self.x_maximum = model.x_maximum
+        self.y_minimum = model.y_minimum
+        self.y_maximum = model.y_maximum
+        self.grid_bounding_box = QgsRectangle(
+            self.x_minimum, self.y_maximum,
+            self.x_maximum, self.y_minimum)
+        # ShakeGrid stores these as floats
+        self.rows = float(model.rows)
+        self.columns = float(model.columns)
+
+    @property
+    def mmi_data(self):
+        """List of (longitude, latitude, mmi) tuples.
+
+        Only built when something still needs the ShakeGrid list form (e.g.
+        the delimited text used for gdal_grid), the numpy arrays are
+        available from :attr:`grid_model` at no cost.
+        """
+        if self._mmi_data is None and self.grid_model is not None:
+            self._mmi_data = zip(
+                self.grid_model.lon.tolist(),
+                self.grid_model.lat.tolist(),
+                self.grid_model.mmi.tolist())
+        return self._mmi_data
+
+    @mmi_data.setter
+    def mmi_data(self, value):
+        self._mmi_data = value
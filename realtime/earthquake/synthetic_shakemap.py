@@ -0,0 +1,349 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Synthetic shakemaps, population rasters and geonames for benchmarks.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import logging
+import os
+import sqlite3
+import struct
+from collections import OrderedDict
+
+import numpy
+# noinspection PyPackageRequirements
+from osgeo import osr
+
+from realtime.exposure_store import write_raster
+from realtime.utilities import make_directory, realtime_logger_name
+from safe.storage.core import read_qgis_layer
+from safe.utilities.keyword_io import KeywordIO
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Grids of the benchmark: half width of the extent in degrees, spacing of
+# the grid points in degrees and magnitude of the event
+GRID_PRESETS = OrderedDict([
+    ('small', {
+        'event_id': '20260101000001',
+        'half_width': 1.0,
+        'resolution': 0.05,
+        'magnitude': 5.0}),
+    ('typical', {
+        'event_id': '20260101000002',
+        'half_width': 2.5,
+        'resolution': 1 / 60.0,
+        'magnitude': 6.5}),
+    ('m8', {
+        'event_id': '20260101000003',
+        'half_width': 6.0,
+        'resolution': 1 / 60.0,
+        'magnitude': 8.0}),
+])
+
+# Default epicentre, off the south coast of Java
+DEFAULT_LONGITUDE = 107.0
+DEFAULT_LATITUDE = -7.5
+
+# Spacing of the population raster cells (30 arc seconds, as the usual
+# national population rasters)
+POPULATION_RESOLUTION = 1 / 120.0
+
+GRID_HEADER = """<?xml version="1.0" encoding="US-ASCII" standalone="yes"?>
+<shakemap_grid xmlns="http://earthquake.usgs.gov/eqcenter/shakemap" \
+event_id="%(event_id)s" shakemap_id="%(event_id)s" shakemap_version="1" \
+code_version="synthetic" process_timestamp="%(timestamp)sZ" \
+shakemap_originator="synthetic" map_status="RELEASED" \
+shakemap_event_type="SCENARIO">
+<event event_id="%(event_id)s" magnitude="%(magnitude).1f" \
+depth="%(depth).1f" lat="%(latitude).6f" lon="%(longitude).6f" \
+event_timestamp="%(timestamp)sWIB" event_network="" \
+event_description="%(description)s " />
+<grid_specification lon_min="%(lon_min).6f" lat_min="%(lat_min).6f" \
+lon_max="%(lon_max).6f" lat_max="%(lat_max).6f" \
+nominal_lon_spacing="%(resolution).6f" \
+nominal_lat_spacing="%(resolution).6f" nlon="%(nlon)d" nlat="%(nlat)d" />
+<grid_field index="1" name="LON" units="dd" />
+<grid_field index="2" name="LAT" units="dd" />
+<grid_field index="3" name="PGA" units="pctg" />
+<grid_field index="4" name="PGV" units="cms" />
+<grid_field index="5" name="MMI" units="intensity" />
+<grid_data>
+"""
+
+GRID_FOOTER = """</grid_data>
+</shakemap_grid>
+"""
+
+
+def synthetic_mmi(
+        longitudes, latitudes, magnitude, longitude, latitude, depth):
+    """Intensity of an event with a simple attenuation relation.
+
+    The relation has the form of the intensity prediction equations used
+    for Indonesia: MMI = 2.085 + 1.428 M - 1.402 ln(R), with R the
+    hypocentral distance in km. Values are clipped to [1, 10].
+
+    :param longitudes: Longitudes of the sites.
+    :type longitudes: numpy.ndarray
+
+    :param latitudes: Latitudes of the sites.
+    :type latitudes: numpy.ndarray
+
+    :param magnitude: Magnitude of the event.
+    :type magnitude: float
+
+    :param longitude: Longitude of the epicentre.
+    :type longitude: float
+
+    :param latitude: Latitude of the epicentre.
+    :type latitude: float
+
+    :param depth: Depth of the event in km.
+    :type depth: float
+
+    :return: The MMI of every site.
+    :rtype: numpy.ndarray
+    """
+    # Equirectangular distance is good enough for a synthetic event
+    x = (numpy.asarray(longitudes) - longitude) * numpy.cos(
+        numpy.radians(latitude))
+    y = numpy.asarray(latitudes) - latitude
+    distance = numpy.hypot(x, y) * 111.195
+    hypocentral_distance = numpy.sqrt(distance ** 2 + depth ** 2)
+    mmi = 2.085 + 1.428 * magnitude - 1.402 * numpy.log(
+        numpy.maximum(hypocentral_distance, 1.0))
+    return numpy.clip(mmi, 1.0, 10.0)
+
+
+def write_synthetic_grid(
+        grid_xml_path,
+        event_id,
+        magnitude,
+        half_width,
+        resolution,
+        longitude=DEFAULT_LONGITUDE,
+        latitude=DEFAULT_LATITUDE,
+        depth=10.0):
+    """Write the grid.xml of a synthetic event.
+
+    The grid is centred on the epicentre and laid out as the BMKG grids:
+    rows from north to south, points from west to east.
+
+    :param grid_xml_path: Path of the grid.xml to write.
+    :type grid_xml_path: str
+
+    :param event_id: Id of the event e.g. '20260101000001'.
+    :type event_id: str
+
+    :param magnitude: Magnitude of the event.
+    :type magnitude: float
+
+    :param half_width: Half the width and height of the grid in degrees.
+    :type half_width: float
+
+    :param resolution: Spacing of the grid points in degrees.
+    :type resolution: float
+
+    :param longitude: (Optional) Longitude of the epicentre.
+    :type longitude: float
+
+    :param latitude: (Optional) Latitude of the epicentre.
+    :type latitude: float
+
+    :param depth: (Optional) Depth of the event in km.
+    :type depth: float
+
+    :return: The number of grid points.
+    :rtype: int
+    """
+    count = int(round(2 * half_width / resolution)) + 1
+    longitudes = longitude - half_width + numpy.arange(count) * resolution
+    latitudes = latitude + half_width - numpy.arange(count) * resolution
+    longitudes, latitudes = numpy.meshgrid(longitudes, latitudes)
+    longitudes = longitudes.ravel()
+    latitudes = latitudes.ravel()
+    mmi = synthetic_mmi(
+        longitudes, latitudes, magnitude, longitude, latitude, depth)
+    # Inverse of the Worden et al. (2012) MMI - PGA and PGV relations
+    pga = 10 ** ((mmi - 1.78) / 3.7)
+    pgv = 10 ** ((mmi - 3.78) / 3.47)
+
+    timestamp = '%s-%s-%sT%s:%s:%s' % (
+        event_id[0:4], event_id[4:6], event_id[6:8],
+        event_id[8:10], event_id[10:12], event_id[12:14])
+    header = GRID_HEADER % {
+        'event_id': event_id,
+        'timestamp': timestamp,
+        'magnitude': magnitude,
+        'depth': depth,
+        'latitude': latitude,
+        'longitude': longitude,
+        'description': 'Synthetic M%.1f' % magnitude,
+        'lon_min': longitudes.min(),
+        'lat_min': latitudes.min(),
+        'lon_max': longitudes.max(),
+        'lat_max': latitudes.max(),
+        'resolution': resolution,
+        'nlon': count,
+        'nlat': count}
+    make_directory(os.path.dirname(os.path.abspath(grid_xml_path)))
+    with open(grid_xml_path, 'w') as grid_file:
+        grid_file.write(header)
+        numpy.savetxt(
+            grid_file,
+            numpy.column_stack([longitudes, latitudes, pga, pgv, mmi]),
+            fmt=['%.4f', '%.4f', '%.2f', '%.2f', '%.2f'])
+        grid_file.write(GRID_FOOTER)
+    LOGGER.debug('Wrote synthetic grid of %d points to %s' % (
+        count * count, grid_xml_path))
+    return count * count
+
+
+def write_synthetic_population(
+        raster_path,
+        longitude=DEFAULT_LONGITUDE,
+        latitude=DEFAULT_LATITUDE,
+        half_width=7.0,
+        resolution=POPULATION_RESOLUTION,
+        seed=0):
+    """Write a synthetic population raster and its keywords.
+
+    Cell counts follow a log-normal distribution, with a few dense cells as
+    in real population rasters.
+
+    :param raster_path: Path of the GeoTIFF to write.
+    :type raster_path: str
+
+    :param longitude: (Optional) Longitude of the centre of the raster.
+    :type longitude: float
+
+    :param latitude: (Optional) Latitude of the centre of the raster.
+    :type latitude: float
+
+    :param half_width: (Optional) Half the width and height of the raster in
+        degrees. The default covers the largest benchmark grid.
+    :type half_width: float
+
+    :param resolution: (Optional) Size of the cells in degrees.
+    :type resolution: float
+
+    :param seed: (Optional) Seed of the random counts.
+    :type seed: int
+
+    :return: The raster path.
+    :rtype: str
+    """
+    count = int(round(2 * half_width / resolution))
+    random = numpy.random.RandomState(seed)
+    population = random.lognormal(
+        mean=3.0, sigma=1.5, size=(count, count)).astype(numpy.float32)
+    geotransform = [
+        longitude - half_width, resolution, 0,
+        latitude + half_width, 0, -resolution]
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    make_directory(os.path.dirname(os.path.abspath(raster_path)))
+    write_raster(
+        raster_path, population, geotransform, srs.ExportToWkt(), -9999)
+
+    layer = read_qgis_layer(raster_path, 'Synthetic population')
+    KeywordIO().write_keywords(layer, {
+        'keyword_version': u'3.5',
+        'title': u'Synthetic population',
+        'layer_purpose': u'exposure',
+        'layer_geometry': u'raster',
+        'layer_mode': u'continuous',
+        'exposure': u'population',
+        'exposure_unit': u'count'})
+    LOGGER.debug('Wrote synthetic population to %s' % raster_path)
+    return raster_path
+
+
+def point_blob(longitude, latitude):
+    """Spatialite geometry blob of a WGS84 point.
+
+    :param longitude: Longitude of the point.
+    :type longitude: float
+
+    :param latitude: Latitude of the point.
+    :type latitude: float
+
+    :rtype: str
+    """
+    return (
+        '\x00\x01' + struct.pack('<i4d', 4326, longitude, latitude,
+                                 longitude, latitude) +
+        '\x7c' + struct.pack('<i2d', 1, longitude, latitude) + '\xfe')
+
+
+def write_synthetic_geonames(
+        sqlite_path,
+        longitude=DEFAULT_LONGITUDE,
+        latitude=DEFAULT_LATITUDE,
+        half_width=7.0,
+        count=5000,
+        seed=0):
+    """Write a synthetic geonames sqlite of populated places.
+
+    :param sqlite_path: Path of the sqlite to write. It is replaced if it
+        exists.
+    :type sqlite_path: str
+
+    :param longitude: (Optional) Longitude of the centre of the places.
+    :type longitude: float
+
+    :param latitude: (Optional) Latitude of the centre of the places.
+    :type latitude: float
+
+    :param half_width: (Optional) Half the width and height of the area
+        covered by the places in degrees.
+    :type half_width: float
+
+    :param count: (Optional) Number of places.
+    :type count: int
+
+    :param seed: (Optional) Seed of the random places.
+    :type seed: int
+
+    :return: The sqlite path.
+    :rtype: str
+    """
+    random = numpy.random.RandomState(seed)
+    longitudes = longitude + random.uniform(-half_width, half_width, count)
+    latitudes = latitude + random.uniform(-half_width, half_width, count)
+    # Few cities, many villages
+    populations = random.pareto(1.2, count) * 1000 + 100
+    codes = numpy.where(populations > 100000, 'PPLA', 'PPL')
+
+    make_directory(os.path.dirname(os.path.abspath(sqlite_path)))
+    if os.path.exists(sqlite_path):
+        os.remove(sqlite_path)
+    connection = sqlite3.connect(sqlite_path)
+    try:
+        connection.execute(
+            'CREATE TABLE geonames (PK_UID INTEGER PRIMARY KEY, name TEXT, '
+            'asciiname TEXT, fcode TEXT, population INTEGER, geometry BLOB)')
+        connection.executemany(
+            'INSERT INTO geonames '
+            '(name, asciiname, fcode, population, geometry) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [('Place %d' % i, 'Place %d' % i, str(codes[i]),
+              int(populations[i]),
+              sqlite3.Binary(point_blob(longitudes[i], latitudes[i])))
+             for i in range(count)])
+        connection.commit()
+    finally:
+        connection.close()
+    LOGGER.debug('Wrote %d synthetic places to %s' % (count, sqlite_path))
+    return sqlite_path
@@ -105,6 +105,11 @@ class EmptyShakeDirectoryError(Exception):
     pass
 
 
+class EventProcessingError(Exception):
+    """Raised if an event could not be processed and should be retried."""
+    pass
+
+
 class RESTRequestFailedError(Exception):
     """Raised if a REST request is failed
     """
@@ -0,0 +1,377 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Pre-tiled store of exposure rasters with windowed reads.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+
+import numpy
+# noinspection PyPackageRequirements
+from osgeo import gdal
+
+from realtime.exceptions import InvalidLayerError
+from realtime.utilities import (
+    base_data_dir,
+    make_directory,
+    realtime_logger_name)
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Width and height of the tiles in pixels
+DEFAULT_TILE_SIZE = 512
+
+# Sidecar files copied next to the windows so they keep their keywords
+SIDECAR_EXTENSIONS = ['.xml', '.keywords', '.qml']
+
+# Stores opened by this process, keyed by raster path
+_STORES = {}
+
+
+def exposure_store_dir():
+    """Create (if needed) and return the path to the exposure store dir."""
+    dir_path = os.path.join(base_data_dir(), 'exposure-store')
+    make_directory(dir_path)
+    return dir_path
+
+
+def raster_key(raster_path):
+    """Key identifying a version of a raster file.
+
+    :param raster_path: Path to the raster.
+    :type raster_path: str
+
+    :return: SHA-1 of the absolute path, size and modification time.
+    :rtype: str
+    """
+    raster_path = os.path.abspath(raster_path)
+    stat = os.stat(raster_path)
+    return hashlib.sha1('%s:%d:%d' % (
+        raster_path, stat.st_size, int(stat.st_mtime))).hexdigest()
+
+
+class ExposureStore(object):
+    """An exposure raster (e.g. population.tif) split in fixed size tiles.
+
+    The store is a directory holding:
+
+        * index.json - geotransform, projection, size, no data value and
+          the pixel window of every tile.
+        * tiles/<row>_<column>.npy - the tiles of a regular tile_size grid,
+          read memory mapped.
+
+    The raster is preprocessed once with :func:`build`, after which the
+    part covering an event is read with :func:`window` without touching
+    the rest of the national raster.
+    """
+
+    index_file_name = 'index.json'
+
+    def __init__(self, store_path):
+        """Constructor.
+
+        Use :func:`build` to create a store from a raster, or
+        :func:`exposure_store` to get the store of a raster.
+
+        :param store_path: Path to the store directory.
+        :type store_path: str
+
+        :raises: InvalidLayerError
+        """
+        self.store_path = store_path
+        index_path = os.path.join(store_path, self.index_file_name)
+        try:
+            with open(index_path) as index_file:
+                self.index = json.loads(index_file.read())
+        except (IOError, ValueError) as e:
+            raise InvalidLayerError(
+                'Exposure store %s is not readable.\n%s' % (store_path, e))
+        self.geotransform = self.index['geotransform']
+        self.columns = self.index['columns']
+        self.rows = self.index['rows']
+        self.tile_size = self.index['tile_size']
+        self.no_data = self.index['no_data']
+        self.dtype = numpy.dtype(self.index['dtype'])
+
+    @classmethod
+    def build(cls, raster_path, store_path, tile_size=DEFAULT_TILE_SIZE):
+        """Split a raster into a new store.
+
+        The store is written to a temporary directory and renamed into
+        place so other processes never see a partial store.
+
+        :param raster_path: Path to a north up raster e.g. population.tif.
+        :type raster_path: str
+
+        :param store_path: Path to the store directory to create.
+        :type store_path: str
+
+        :param tile_size: Width and height of the tiles in pixels.
+        :type tile_size: int
+
+        :return: The store.
+        :rtype: ExposureStore
+
+        :raises: InvalidLayerError
+        """
+        LOGGER.info('Building exposure store for %s' % raster_path)
+        dataset = gdal.Open(raster_path, gdal.GA_ReadOnly)
+        if dataset is None:
+            raise InvalidLayerError(
+                'Exposure raster %s could not be opened.' % raster_path)
+        geotransform = list(dataset.GetGeoTransform())
+        if geotransform[2] != 0 or geotransform[4] != 0:
+            raise InvalidLayerError(
+                'Exposure raster %s is rotated.' % raster_path)
+        band = dataset.GetRasterBand(1)
+        columns = dataset.RasterXSize
+        rows = dataset.RasterYSize
+        no_data = band.GetNoDataValue()
+
+        parent_dir = os.path.dirname(store_path)
+        make_directory(parent_dir)
+        temp_path = tempfile.mkdtemp(
+            prefix='.%s-' % os.path.basename(store_path), dir=parent_dir)
+        try:
+            tiles_dir = os.path.join(temp_path, 'tiles')
+            os.mkdir(tiles_dir)
+            tiles = []
+            dtype = None
+            for row in range(0, rows, tile_size):
+                height = min(tile_size, rows - row)
+                for column in range(0, columns, tile_size):
+                    width = min(tile_size, columns - column)
+                    data = band.ReadAsArray(column, row, width, height)
+                    dtype = data.dtype
+                    name = '%d_%d.npy' % (
+                        row // tile_size, column // tile_size)
+                    numpy.save(os.path.join(tiles_dir, name), data)
+                    tiles.append({
+                        'name': name,
+                        'row': row,
+                        'column': column,
+                        'rows': height,
+                        'columns': width})
+
+            index = {
+                'source': os.path.abspath(raster_path),
+                'geotransform': geotransform,
+                'projection': dataset.GetProjection(),
+                'columns': columns,
+                'rows': rows,
+                'tile_size': tile_size,
+                'no_data': no_data,
+                'dtype': numpy.dtype(dtype).str,
+                'tiles': tiles
+            }
+            with open(
+                    os.path.join(temp_path, cls.index_file_name),
+                    'w') as index_file:
+                index_file.write(json.dumps(index))
+            try:
+                os.rename(temp_path, store_path)
+            except OSError:
+                # Most likely another process built the same store meanwhile
+                LOGGER.debug('Exposure store %s was not stored' % store_path)
+        finally:
+            if os.path.exists(temp_path):
+                shutil.rmtree(temp_path, ignore_errors=True)
+        return cls(store_path)
+
+    def pixel_window(self, x_minimum, y_minimum, x_maximum, y_maximum):
+        """Pixel window of the raster covering a bounding box.
+
+        The window may extend beyond the raster.
+
+        :return: Tuple of (first row, first column, rows, columns).
+        :rtype: (int, int, int, int)
+        """
+        origin_x, pixel_width, _, origin_y, _, pixel_height = (
+            self.geotransform)
+        first_column = int(math.floor((x_minimum - origin_x) / pixel_width))
+        last_column = int(math.ceil((x_maximum - origin_x) / pixel_width))
+        first_row = int(math.floor((y_maximum - origin_y) / pixel_height))
+        last_row = int(math.ceil((y_minimum - origin_y) / pixel_height))
+        return (
+            first_row, first_column,
+            max(last_row - first_row, 0), max(last_column - first_column, 0))
+
+    def window(self, x_minimum, y_minimum, x_maximum, y_maximum):
+        """Read the part of the raster covering a bounding box.
+
+        Only the tiles intersecting the box are read, memory mapped. They
+        are found from the pixel window, as the tiles are a regular grid.
+        Cells of the window outside of the raster are set to the no data
+        value (0 if the raster has none).
+
+        :return: A tuple of (array, geotransform of the window).
+        :rtype: (numpy.ndarray, list)
+        """
+        first_row, first_column, rows, columns = self.pixel_window(
+            x_minimum, y_minimum, x_maximum, y_maximum)
+        fill = self.no_data if self.no_data is not None else 0
+        data = numpy.empty((rows, columns), dtype=self.dtype)
+        data.fill(fill)
+        # The part of the window inside the raster
+        inside_rows = (max(first_row, 0), min(first_row + rows, self.rows))
+        inside_columns = (
+            max(first_column, 0), min(first_column + columns, self.columns))
+        size = self.tile_size
+        for tile_row in range(
+                inside_rows[0] // size, (inside_rows[1] - 1) // size + 1):
+            for tile_column in range(
+                    inside_columns[0] // size,
+                    (inside_columns[1] - 1) // size + 1):
+                tile_data = numpy.load(
+                    os.path.join(
+                        self.store_path,
+                        'tiles',
+                        '%d_%d.npy' % (tile_row, tile_column)),
+                    mmap_mode='r')
+                row_start = max(inside_rows[0], tile_row * size)
+                row_end = min(inside_rows[1], (tile_row + 1) * size)
+                column_start = max(inside_columns[0], tile_column * size)
+                column_end = min(
+                    inside_columns[1], (tile_column + 1) * size)
+                data[row_start - first_row:row_end - first_row,
+                     column_start - first_column:
+                     column_end - first_column] = (
+                    tile_data[row_start - tile_row * size:
+                              row_end - tile_row * size,
+                              column_start - tile_column * size:
+                              column_end - tile_column * size])
+        origin_x, pixel_width, _, origin_y, _, pixel_height = (
+            self.geotransform)
+        geotransform = [
+            origin_x + first_column * pixel_width, pixel_width, 0,
+            origin_y + first_row * pixel_height, 0, pixel_height]
+        return data, geotransform
+
+    def write_window(self, output_path, x_minimum, y_minimum, x_maximum,
+                     y_maximum):
+        """Write the part of the raster covering a bounding box to a tif.
+
+        The keyword sidecar files of the source raster are copied next to
+        the window so it is read as the same kind of exposure.
+
+        :param output_path: Path of the GeoTIFF to write.
+        :type output_path: str
+
+        :return: The output path.
+        :rtype: str
+        """
+        data, geotransform = self.window(
+            x_minimum, y_minimum, x_maximum, y_maximum)
+        write_raster(
+            output_path,
+            data,
+            geotransform,
+            self.index['projection'],
+            self.no_data)
+
+        source_base = os.path.splitext(self.index['source'])[0]
+        output_base = os.path.splitext(output_path)[0]
+        for extension in SIDECAR_EXTENSIONS:
+            if os.path.exists(source_base + extension):
+                shutil.copyfile(
+                    source_base + extension, output_base + extension)
+        return output_path
+
+
+def write_raster(output_path, data, geotransform, projection, no_data=None):
+    """Write an array to a single band GeoTIFF.
+
+    :param output_path: Path of the GeoTIFF to write.
+    :type output_path: str
+
+    :param data: Array of shape (rows, columns).
+    :type data: numpy.ndarray
+
+    :param geotransform: GDAL geotransform of the array.
+    :type geotransform: list
+
+    :param projection: WKT of the coordinate reference system.
+    :type projection: str
+
+    :param no_data: (Optional) The no data value.
+    :type no_data: float
+
+    :return: The output path.
+    :rtype: str
+    """
+    rows, columns = data.shape
+    driver = gdal.GetDriverByName('GTiff')
+    dataset = driver.Create(
+        output_path, max(columns, 1), max(rows, 1), 1,
+        gdal_array_type(data.dtype))
+    dataset.SetGeoTransform(geotransform)
+    dataset.SetProjection(str(projection))
+    band = dataset.GetRasterBand(1)
+    if no_data is not None:
+        band.SetNoDataValue(no_data)
+    if data.size:
+        band.WriteArray(data)
+    band.FlushCache()
+    # Closing the dataset flushes it to disk
+    del dataset
+    return output_path
+
+
+def gdal_array_type(dtype):
+    """GDAL data type code of a numpy dtype.
+
+    :param dtype: The numpy dtype.
+    :type dtype: numpy.dtype
+
+    :rtype: int
+    """
+    # noinspection PyPackageRequirements
+    from osgeo import gdal_array
+    return gdal_array.NumericTypeCodeToGDALTypeCode(numpy.dtype(dtype).type)
+
+
+def exposure_store(raster_path, tile_size=DEFAULT_TILE_SIZE):
+    """Get the store of a raster, building it the first time it is used.
+
+    The store is rebuilt when the raster changes and opened once per
+    process.
+
+    :param raster_path: Path to the exposure raster e.g. population.tif.
+    :type raster_path: str
+
+    :param tile_size: Width and height of the tiles in pixels.
+    :type tile_size: int
+
+    :return: The store.
+    :rtype: ExposureStore
+
+    :raises: InvalidLayerError
+    """
+    key = raster_key(raster_path)
+    store = _STORES.get(key)
+    if store is not None:
+        return store
+    store_path = os.path.join(exposure_store_dir(), key)
+    if os.path.exists(os.path.join(
+            store_path, ExposureStore.index_file_name)):
+        store = ExposureStore(store_path)
+    else:
+        store = ExposureStore.build(raster_path, store_path, tile_size)
+    _STORES[key] = store
+    return store
@@ -16,11 +16,9 @@ from PyQt4.QtCore import (
     QVariant,
     QTranslator,
     QCoreApplication)
-from PyQt4.QtXml import QDomDocument
 from qgis.core import QgsMapLayerRegistry
 from qgis.core import (
     QgsVectorLayer,
-    QgsRasterLayer,
     QgsVectorFileWriter,
     QgsField,
     QgsPalLabeling,
@@ -28,9 +26,11 @@ from qgis.core import (
     QgsCoordinateReferenceSystem,
     QgsProject,
     QgsComposerHtml)
+from realtime.datasets import shared_layer
 from realtime.exceptions import PetaJakartaAPIError, MapComposerError
 from realtime.flood.dummy_source_api import DummySourceAPI
 from realtime.flood.peta_jakarta_api import PetaJakartaAPI
+from realtime.rendering import render_context
 from realtime.utilities import realtime_logger_name
 
 from safe.test.utilities import get_qgis_app
@@ -167,6 +167,31 @@ class FloodEvent(QObject):
     def impact_exists(self):
         return os.path.exists(self.impact_path)
 
+    @property
+    def impact_data_path(self):
+        return os.path.join(self.report_path, 'impact_data.json')
+
+    def save_impact_data(self):
+        """Write the impact data next to the impact layer.
+
+        The report can then be generated by another process, see
+        :func:`load_impact_data`.
+        """
+        with open(self.impact_data_path, 'w') as f:
+            f.write(json.dumps(self.impact_data.__dict__))
+
+    def load_impact_data(self):
+        """Read the impact data written by :func:`save_impact_data`.
+
+        :return: False if there is no impact data.
+        :rtype: bool
+        """
+        if not os.path.exists(self.impact_data_path):
+            return False
+        with open(self.impact_data_path) as f:
+            self.impact_data.__dict__.update(json.loads(f.read()))
+        return True
+
     def save_hazard_data(self):
         if self.dummy_report_folder:
             filename = os.path.join(
@@ -256,7 +281,8 @@ class FloodEvent(QObject):
         self.hazard_layer = read_layer(self.hazard_path)
 
     def load_exposure_data(self):
-        self.exposure_layer = read_layer(self.population_path)
+        # Read once per process, see realtime.datasets
+        self.exposure_layer = shared_layer(self.population_path)
 
     def calculate_impact(self):
         if_manager = ImpactFunctionManager()
@@ -663,9 +689,12 @@ Telp. 121
 
         project_path = os.path.join(
             self.report_path, 'project-%s.qgs' % self.locale)
+        # Templates and context layers are loaded once per process, the
+        # event project only brings its settings, not its layers
+        context = render_context()
+        context.load_project(project_path)
+        context.reset()
         project_instance = QgsProject.instance()
-        project_instance.setFileName(project_path)
-        project_instance.read()
 
         # Set up the map renderer that will be assigned to the composition
         map_renderer = CANVAS.mapRenderer()
@@ -682,39 +711,34 @@ Telp. 121
 
         # get layer registry
         layer_registry = QgsMapLayerRegistry.instance()
-        layer_registry.removeAllMapLayers()
         # add impact layer
         population_affected_layer = read_qgis_layer(
             self.population_aggregate_path, self.tr('People Affected'))
         layer_registry.addMapLayer(population_affected_layer, True)
         # add boundary mask
-        boundary_mask = read_qgis_layer(
+        boundary_mask = context.static_layer(
             self.flood_fixtures_dir('boundary-mask.shp'))
-        layer_registry.addMapLayer(boundary_mask, False)
+        context.add_static_layer(boundary_mask)
         # add hazard layer
         hazard_layer = read_qgis_layer(
             self.hazard_path, self.tr('Flood Depth (cm)'))
         layer_registry.addMapLayer(hazard_layer, True)
         # add boundary layer
-        boundary_layer = read_qgis_layer(
+        boundary_layer = context.static_layer(
             self.flood_fixtures_dir('boundary-5.shp'))
-        layer_registry.addMapLayer(boundary_layer, False)
+        context.add_static_layer(boundary_layer)
         CANVAS.setExtent(boundary_layer.extent())
         CANVAS.refresh()
         # add basemap layer
         # this code uses OpenlayersPlugin
-        base_map = QgsRasterLayer(
+        base_map = context.static_layer(
             self.flood_fixtures_dir('jakarta.jpg'))
-        layer_registry.addMapLayer(base_map, False)
+        context.add_static_layer(base_map)
         CANVAS.refresh()
 
         template_path = self.flood_fixtures_dir('realtime-flood.qpt')
 
-        with open(template_path) as f:
-            template_content = f.read()
-
-        document = QDomDocument()
-        document.setContent(template_content)
+        document = context.template_document(template_path)
 
         # set destination CRS to Jakarta CRS
         # EPSG:32748
@@ -796,7 +820,7 @@ Telp. 121
 
         project_instance.write(QFileInfo(project_path))
 
-        layer_registry.removeAllMapLayers()
+        context.reset()
         map_renderer.setDestinationCrs(default_crs)
         map_renderer.setProjectionsEnabled(False)
 
@@ -11,6 +11,9 @@ from datetime import datetime
 
 from realtime.flood.flood_event import FloodEvent
 from realtime.flood.push_flood import push_flood_event_to_rest
+from realtime.instrumentation import (
+    ANALYSIS_METRICS_FILE_NAME,
+    EventMetrics)
 from realtime.utilities import realtime_logger_name, data_dir
 
 __author__ = 'Rizky Maulana Nugraha <lana.pcfre@gmail.com>'
@@ -30,8 +33,153 @@ def process_event(working_directory, locale_option='en', dummy_folder=None):
         should be named like the id of the event.
     :return:
     """
+    event_args = event_arguments(dummy_folder)
+
+    # Time spent in each processing stage, see realtime.instrumentation
+    metrics = EventMetrics('flood')
+    report_path = None
+    for locale in locales(locale_option):
+        report_path = process_locale(
+            working_directory, locale, event_args, metrics)
+
+    metrics.write(report_path)
+
+
+def analyse_event(
+        working_directory,
+        locale_option='en',
+        dummy_folder=None,
+        event_args=None):
+    """Calculate the impact of a floodmap event without generating reports.
+
+    The impact layers and the impact data are written in the report
+    directories, so :func:`render_event` can generate the reports in
+    another process.
+
+    :param working_directory: The working directory of floodmaps report
+    :param locale_option: the locale of the report
+    :param dummy_folder: the location of dummy_folder in the working dir.
+    :param event_args: (Optional) The arguments of the FloodEvent computed
+        by the caller with event_arguments, so the hour of the event does
+        not change in between. dummy_folder is ignored if given.
+    :return: The arguments of the FloodEvent, for render_event
+    :rtype: dict
+    """
+    if event_args is None:
+        event_args = event_arguments(dummy_folder)
+
+    metrics = EventMetrics('flood')
+    report_path = None
+    for locale in locales(locale_option):
+        report_path = process_locale(
+            working_directory, locale, event_args, metrics,
+            render_flag=False)
+
+    metrics.write(report_path, ANALYSIS_METRICS_FILE_NAME)
+    return event_args
+
+
+def render_event(working_directory, event_args, locale_option='en'):
+    """Generate and push the reports of a floodmap event.
+
+    :param working_directory: The working directory of floodmaps report
+    :param event_args: The arguments returned by analyse_event
+    :param locale_option: the locale of the report
+    :return:
+    """
+    metrics = EventMetrics('flood')
+    report_path = None
+    for locale in locales(locale_option):
+        report_path = process_locale(
+            working_directory, locale, event_args, metrics,
+            analyse_flag=False)
+
+    metrics.write(report_path)
+
+
+def process_locale(
+        working_directory,
+        locale,
+        event_args,
+        metrics,
+        analyse_flag=True,
+        render_flag=True):
+    """Calculate the impact and generate the report of a locale.
+
+    :param working_directory: The working directory of floodmaps report
+    :param locale: the locale of the report
+    :param event_args: The arguments of the FloodEvent, see event_arguments
+    :param metrics: The metrics of the event
+    :param analyse_flag: Whether to calculate the impact. If False it must
+        have been calculated by analyse_event.
+    :param render_flag: Whether to generate and push the report. If False
+        the errors are raised, so the caller of analyse_event sees them.
+    :return: The report path, None if the event could not be created
+    """
     population_path = os.environ['INASAFE_FLOOD_POPULATION_PATH']
+    LOGGER.info('Creating Flood Event for locale %s.' % locale)
+    report_path = None
+    try:
+        with metrics.stage('setup'):
+            event = FloodEvent(
+                working_dir=working_directory,
+                locale=locale,
+                population_path=population_path,
+                **event_args)
 
+        report_path = event.report_path
+        metrics.event_id = os.path.basename(report_path)
+        if analyse_flag:
+            with metrics.stage('impact'):
+                event.calculate_impact()
+        else:
+            event.load_impact_data()
+        if not render_flag:
+            # Handed off to render_event on disk
+            event.save_impact_data()
+            return report_path
+
+        with metrics.stage('pdf'):
+            event.generate_report()
+        with metrics.stage('push'):
+            ret = push_flood_event_to_rest(flood_event=event)
+    except Exception as e:
+        if not render_flag:
+            raise
+        LOGGER.error(e)
+        ret = False
+    if render_flag:
+        LOGGER.info('Is Push successful? %s.' % bool(ret))
+    return report_path
+
+
+def event_arguments(dummy_folder=None):
+    """The arguments of the FloodEvent of the current hour.
+
+    :param dummy_folder: the location of dummy_folder in the working dir.
+    :return: The keyword arguments of FloodEvent, except the working dir,
+        the locale and the population path
+    :rtype: dict
+    """
+    duration, level = flood_settings()
+    now = datetime.utcnow()
+    return {
+        'duration': duration,
+        'level': level,
+        'year': now.year,
+        'month': now.month,
+        'day': now.day,
+        'hour': now.hour,
+        'dummy_report_folder': dummy_folder
+    }
+
+
+def flood_settings():
+    """Read the duration and the level of the reports from the settings.
+
+    :return: A tuple of (duration, level).
+    :rtype: (int, str)
+    """
     # check settings file
     settings_file = os.path.join(
         data_dir(), 'settings', 'flood-settings.json')
@@ -66,36 +214,22 @@ def process_event(working_directory, locale_option='en', dummy_folder=None):
         sys.exit(
             'Valid level are: %s' % ','.join(allowed_level)
         )
+    return duration, level
+
 
+def locales(locale_option):
+    """The locales of the reports.
+
+    :param locale_option: the locale of the report
+    :return: the locales, en is always included
+    :rtype: list
+    """
     # We always want to generate en products too so we manipulate the locale
     # list and loop through them:
     locale_list = [locale_option]
     if 'en' not in locale_list:
         locale_list.append('en')
-
-    for locale in locale_list:
-        LOGGER.info('Creating Flood Event for locale %s.' % locale)
-        now = datetime.utcnow()
-        try:
-            event = FloodEvent(
-                working_dir=working_directory,
-                locale=locale,
-                population_path=population_path,
-                duration=duration,
-                level=level,
-                year=now.year,
-                month=now.month,
-                day=now.day,
-                hour=now.hour,
-                dummy_report_folder=dummy_folder)
-
-            event.calculate_impact()
-            event.generate_report()
-            ret = push_flood_event_to_rest(flood_event=event)
-        except Exception as e:
-            LOGGER.error(e)
-            ret = False
-        LOGGER.info('Is Push successful? %s.' % bool(ret))
+    return locale_list
 
 
 if __name__ == '__main__':
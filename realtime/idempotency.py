@@ -0,0 +1,320 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Idempotent submission of the realtime tasks.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+The same event is often submitted again while it is processed: bursts of
+inotify events, cron reruns and manual resubmissions. A submission is keyed
+by the event and a hash of its input, see :func:`idempotency_key`. The first
+submission of a key claims a lease recording the id of the task whose
+result is the one of the whole processing, and the duplicates submitted
+until the lease is released get that id instead of queueing the
+processing again. A lease expires in case the worker holding
+it died.
+
+The tasks submit their chain with :func:`submit_chain`, the lease is
+released by the render task with :func:`lease_released`, or by an error
+callback if a task of the chain fails. Processes working on the same event
+outside of celery (the watcher, the make_map command) are serialised by
+:meth:`IdempotencyStore.lock`.
+"""
+import errno
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from realtime.routing import compute_queue
+from realtime.utilities import (
+    base_data_dir,
+    make_directory,
+    realtime_logger_name)
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Seconds after which the lease of a processing is given up
+DEFAULT_LEASE_SECONDS = 2 * 60 * 60
+
+
+def idempotency_dir():
+    """Create (if needed) and return the path to the idempotency dir."""
+    dir_path = os.path.join(base_data_dir(), 'idempotency')
+    make_directory(dir_path)
+    return dir_path
+
+
+def file_hash(path, block_size=1024 * 1024):
+    """SHA-1 hex digest of a file, read by blocks.
+
+    :param path: Path to the file.
+    :type path: str
+
+    :param block_size: Number of bytes read per iteration.
+    :type block_size: int
+
+    :return: The hex digest, None if the file can not be read.
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as input_file:
+            while True:
+                block = input_file.read(block_size)
+                if not block:
+                    break
+                digest.update(block)
+    except IOError:
+        return None
+    return digest.hexdigest()
+
+
+def idempotency_key(*parts):
+    """Key of a submission, e.g. from the event id and its input hash.
+
+    :param parts: The values identifying the submission. None and numbers
+        are allowed.
+
+    :return: A hex digest usable as a file name.
+    :rtype: str
+    """
+    return hashlib.sha1(
+        '\0'.join(repr(part) for part in parts)).hexdigest()
+
+
+class IdempotencyStore(object):
+    """Leases of the processings in flight, kept as <key>.json files.
+
+    Claims and releases are serialised between processes with an exclusive
+    lock on a single lock file of the directory, so they must not be nested
+    in :meth:`lock` of the same process.
+    """
+
+    def __init__(self, directory, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Constructor.
+
+        :param directory: The directory of the leases and locks.
+        :type directory: str
+
+        :param lease_seconds: (Optional) Seconds after which a lease
+            expires.
+        :type lease_seconds: int
+        """
+        make_directory(directory)
+        self.directory = directory
+        self.lease_seconds = lease_seconds
+
+    def _path(self, key, extension):
+        """Path of a file of a key."""
+        return os.path.join(self.directory, '%s.%s' % (key, extension))
+
+    @contextmanager
+    def lock(self, key):
+        """Hold the exclusive lock of a key, waiting for other processes.
+
+        The lock is released when the process dies, so there is nothing to
+        expire. Lock files are not removed, as removing them would let two
+        processes hold the lock of a key at the same time.
+
+        :param key: The key, e.g. an event id.
+        :type key: str
+        """
+        with open(self._path(key, 'lock'), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+                LOGGER.info(
+                    'Waiting for %s held by another process' % key)
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def in_flight(self, key):
+        """The lease of a key, if it did not expire.
+
+        :param key: The key of the submission.
+        :type key: str
+
+        :return: The lease with the task_id, claimed_at and expires_at
+            keys, None if there is none.
+        :rtype: dict
+        """
+        try:
+            with open(self._path(key, 'json')) as lease_file:
+                lease = json.loads(lease_file.read())
+        except IOError:
+            return None
+        except ValueError:
+            LOGGER.warning('Ignoring the corrupted lease of %s' % key)
+            return None
+        if lease.get('expires_at', 0) < time.time():
+            LOGGER.info('The lease of %s by %s expired' % (
+                key, lease.get('task_id')))
+            return None
+        return lease
+
+    def claim(self, key, task_id):
+        """Claim the processing of a key for a task, unless it is in flight.
+
+        :param key: The key of the submission.
+        :type key: str
+
+        :param task_id: Id of the task giving the result of the processing,
+            e.g. the last task of a chain.
+        :type task_id: str
+
+        :return: The id of the task processing the key: task_id if the
+            processing was claimed, the id of the task in flight otherwise.
+        :rtype: str
+        """
+        with self.lock('store'):
+            lease = self.in_flight(key)
+            if lease is not None:
+                LOGGER.info('%s is in flight, attaching to %s' % (
+                    key, lease['task_id']))
+                return lease['task_id']
+            now = time.time()
+            self._write(key, {
+                'task_id': task_id,
+                'claimed_at': now,
+                'expires_at': now + self.lease_seconds})
+        return task_id
+
+    def release(self, key, task_id=None):
+        """Release the lease of a key once its processing is done.
+
+        :param key: The key of the submission.
+        :type key: str
+
+        :param task_id: (Optional) Only release the lease of this task, so
+            an expired lease claimed again is kept.
+        :type task_id: str
+        """
+        with self.lock('store'):
+            if task_id is not None:
+                lease = self.in_flight(key)
+                if lease is not None and lease['task_id'] != task_id:
+                    return
+            try:
+                os.remove(self._path(key, 'json'))
+            except OSError:
+                pass
+
+    def _write(self, key, lease):
+        """Write a lease atomically."""
+        handle, temp_path = tempfile.mkstemp(
+            suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(handle, 'w') as lease_file:
+                lease_file.write(json.dumps(lease))
+            os.rename(temp_path, self._path(key, 'json'))
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def idempotency_store(hazard):
+    """Get the idempotency store of a hazard.
+
+    :param hazard: The hazard e.g. 'earthquake', 'flood' or 'ash'.
+    :type hazard: str
+
+    :rtype: IdempotencyStore
+    """
+    return IdempotencyStore(os.path.join(idempotency_dir(), hazard))
+
+
+def submit_chain(
+        hazard, lease_key, analyse_signature, render_signature, priority):
+    """Queue the analysis and render chain of an event, unless in flight.
+
+    :param hazard: The hazard e.g. 'earthquake', 'flood' or 'ash'.
+    :type hazard: str
+
+    :param lease_key: Key of the submission, see :func:`idempotency_key`.
+        It must be among the arguments of the render signature, which
+        releases the lease with :func:`lease_released`.
+    :type lease_key: str
+
+    :param analyse_signature: Signature of the analysis task.
+    :type analyse_signature: celery.canvas.Signature
+
+    :param render_signature: Signature of the render task, getting the
+        result of the analysis as first argument.
+    :type render_signature: celery.canvas.Signature
+
+    :param priority: Priority of both tasks.
+    :type priority: int
+
+    :return: The id of the render task of the chain, the one already in
+        flight for a duplicate submission. Get its result with
+        AsyncResult(task_id): a failure of the analysis is raised by get().
+    :rtype: str
+    """
+    # noinspection PyPackageRequirements
+    from celery import chain
+    # noinspection PyPackageRequirements
+    from celery.utils import uuid
+    from realtime.tasks.generic import release_lease
+
+    store = idempotency_store(hazard)
+    task_id = uuid()
+    in_flight_id = store.claim(lease_key, task_id)
+    if in_flight_id != task_id:
+        LOGGER.info('The %s event is already processed by %s' % (
+            hazard, in_flight_id))
+        return in_flight_id
+
+    # A failed task stops the chain before the render task releases the
+    # lease, so the error callback does it. It gets the failed task id.
+    errback = release_lease.s(hazard, lease_key, task_id).set(
+        queue=compute_queue(hazard))
+    analyse_signature.set(priority=priority)
+    analyse_signature.link_error(errback)
+    render_signature.set(priority=priority, task_id=task_id)
+    render_signature.link_error(errback)
+    try:
+        chain(analyse_signature, render_signature).apply_async()
+    except Exception:
+        store.release(lease_key, task_id)
+        raise
+    return task_id
+
+
+@contextmanager
+def lease_released(hazard, lease_key, task_id):
+    """Release the lease of a chain when its render task is done.
+
+    :param hazard: The hazard e.g. 'earthquake', 'flood' or 'ash'.
+    :type hazard: str
+
+    :param lease_key: Key of the lease, None if there is none, e.g. when
+        the render task is called directly.
+    :type lease_key: str
+
+    :param task_id: Id of the render task.
+    :type task_id: str
+    """
+    try:
+        yield
+    finally:
+        if lease_key:
+            idempotency_store(hazard).release(lease_key, task_id)
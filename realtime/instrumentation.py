@@ -0,0 +1,422 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Timing and resource usage of the event processing stages.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from realtime.utilities import realtime_logger_name
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Name of the per event metrics file
+METRICS_FILE_NAME = 'metrics.json'
+
+# Name of the metrics file of an analysis run apart from the rendering
+ANALYSIS_METRICS_FILE_NAME = 'metrics-analysis.json'
+
+# Prefix of the Prometheus metric names
+METRIC_PREFIX = 'inasafe_realtime'
+
+# Peak RSS of the stages in progress in this process, see _stage_peak_rss
+_OPEN_STAGES = []
+
+# Whether the peak RSS of this process can be reset, None until tried
+_CAN_RESET_PEAK = None
+
+# Peak RSS of this process seen before the resets of _reset_peak_rss
+_PROCESS_PEAK = [0]
+
+
+def metrics_dir():
+    """Directory of the Prometheus textfile collector.
+
+    Set the INASAFE_REALTIME_METRICS_DIR environment variable to the
+    --collector.textfile.directory of the node exporter to publish the
+    metrics of the last event of each hazard.
+
+    :return: The directory or None if the metrics are not published.
+    :rtype: str
+    """
+    return os.environ.get('INASAFE_REALTIME_METRICS_DIR') or None
+
+
+def _cpu_time():
+    """User and system CPU time of this process in seconds."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss():
+    """Peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OS X and in kilobytes elsewhere
+    if sys.platform != 'darwin':
+        peak *= 1024
+    # ru_maxrss is reset with the VmHWM on Linux
+    _sample_peak_rss()
+    return max(peak, _PROCESS_PEAK[0])
+
+
+def _status_bytes(field):
+    """A memory field of /proc/self/status in bytes, None if unknown.
+
+    :param field: The field e.g. 'VmRSS' or 'VmHWM'.
+    :type field: str
+
+    :rtype: int
+    """
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith(field + ':'):
+                    # e.g. 'VmHWM:    123456 kB'
+                    return int(line.split()[1]) * 1024
+    except (IOError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset the VmHWM of this process to its current RSS (Linux 4.0+).
+
+    :return: Whether it was reset.
+    :rtype: bool
+    """
+    global _CAN_RESET_PEAK
+    if _CAN_RESET_PEAK is False:
+        return False
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        _CAN_RESET_PEAK = True
+    except IOError:
+        _CAN_RESET_PEAK = False
+    return _CAN_RESET_PEAK
+
+
+def _sample_peak_rss():
+    """Add the RSS reached until now to the stages in progress.
+
+    The VmHWM since the last reset, or the current RSS if it can not be
+    reset. It is added to the peak of the process too.
+    """
+    if _CAN_RESET_PEAK is False:
+        rss = _status_bytes('VmRSS')
+    else:
+        rss = _status_bytes('VmHWM')
+    if rss is None:
+        return
+    _PROCESS_PEAK[0] = max(_PROCESS_PEAK[0], rss)
+    for stage_peak in _OPEN_STAGES:
+        stage_peak[0] = max(stage_peak[0], rss)
+
+
+@contextmanager
+def _stage_peak_rss():
+    """Measure the peak RSS of a block of code.
+
+    The VmHWM of the process is reset when the block starts and read when
+    it ends. A nested block resets it too, so the peak reached until then
+    is first added to the blocks in progress. Where the VmHWM can not be
+    reset, the peak is the largest RSS at the boundaries of the block and
+    of its nested blocks.
+
+    :return: A one item list holding the peak in bytes when the block
+        ended, 0 if the RSS is unknown e.g. on OS X.
+    :rtype: list
+    """
+    stage_peak = [0]
+    _sample_peak_rss()
+    _OPEN_STAGES.append(stage_peak)
+    _reset_peak_rss()
+    _sample_peak_rss()
+    try:
+        yield stage_peak
+    finally:
+        _sample_peak_rss()
+        # The peaks of other stages may be equal lists
+        for index, open_peak in enumerate(_OPEN_STAGES):
+            if open_peak is stage_peak:
+                del _OPEN_STAGES[index]
+                break
+
+
+def _write_atomically(path, content):
+    """Write a file through a temporary file so readers never see half."""
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(
+        prefix='.%s-' % os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(handle, 'w') as output_file:
+            output_file.write(content)
+        os.chmod(temp_path, 0o644)
+        os.rename(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _gauge_lines(name, help_text, samples):
+    """Lines of a gauge in the Prometheus text exposition format.
+
+    :param name: Name of the metric, without the prefix.
+    :type name: str
+
+    :param help_text: Description of the metric.
+    :type help_text: str
+
+    :param samples: The (labels dict, value) of every sample.
+    :type samples: list
+
+    :rtype: list
+    """
+    full_name = '%s_%s' % (METRIC_PREFIX, name)
+    lines = [
+        '# HELP %s %s' % (full_name, help_text),
+        '# TYPE %s gauge' % full_name]
+    for labels, value in samples:
+        label_text = ','.join(
+            '%s="%s"' % (key, labels[key]) for key in sorted(labels))
+        lines.append('%s{%s} %s' % (full_name, label_text, value))
+    return lines
+
+
+def write_queue_metrics(depths):
+    """Publish the number of messages and consumers of the task queues.
+
+    :param depths: A tuple of (messages, consumers) keyed by queue name,
+        None for a queue that does not exist.
+    :type depths: dict
+
+    :return: Path to the metrics file, None if the metrics are not
+        published.
+    :rtype: str
+    """
+    collector_dir = metrics_dir()
+    if collector_dir is None:
+        return None
+    messages = []
+    consumers = []
+    for name in sorted(depths):
+        if depths[name] is None:
+            continue
+        labels = {'queue': name}
+        messages.append((labels, depths[name][0]))
+        consumers.append((labels, depths[name][1]))
+    lines = _gauge_lines(
+        'queue_messages', 'Messages waiting in a task queue.', messages)
+    lines.extend(_gauge_lines(
+        'queue_consumers', 'Consumers of a task queue.', consumers))
+    path = os.path.join(collector_dir, '%s_queues.prom' % METRIC_PREFIX)
+    _write_atomically(path, '\n'.join(lines) + '\n')
+    return path
+
+
+def timed(name):
+    """Decorator timing every call of a method as a stage.
+
+    The stage is recorded in the metrics attribute of the instance, calls
+    are not timed if it is missing or None.
+
+    :param name: Name of the stage.
+    :type name: str
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = getattr(self, 'metrics', None)
+            if metrics is None:
+                return method(self, *args, **kwargs)
+            with metrics.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class EventMetrics(object):
+    """Wall time, CPU time and peak RSS of the stages of an event.
+
+    Stages are timed with :func:`stage` (a context manager) or with the
+    :func:`timed` decorator on methods of an object holding the metrics in
+    its metrics attribute. A stage run several times, e.g. once per locale,
+    adds up its wall and CPU times and counts its calls. The peak RSS of a
+    stage is the largest RSS of the process during the stage, see
+    :func:`_stage_peak_rss`, while the process_peak_rss_bytes of the event
+    is the high water mark of the process since it started.
+
+    Example::
+
+        metrics = EventMetrics('earthquake', event_id)
+        with metrics.stage('contours'):
+            ...
+        metrics.write(event_directory)
+    """
+
+    def __init__(self, hazard, event_id=None):
+        """Constructor.
+
+        :param hazard: The hazard e.g. 'earthquake', 'flood' or 'ash'.
+        :type hazard: str
+
+        :param event_id: (Optional) The id of the event.
+        :type event_id: str
+        """
+        self.hazard = hazard
+        self.event_id = event_id
+        self.start_time = time.time()
+        self.stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage of the event processing.
+
+        The stage is recorded even if it raises.
+
+        :param name: Name of the stage e.g. 'contours'.
+        :type name: str
+        """
+        wall_start = time.time()
+        cpu_start = _cpu_time()
+        stage_peak = [0]
+        try:
+            with _stage_peak_rss() as stage_peak:
+                yield
+        finally:
+            self.add(
+                name,
+                time.time() - wall_start,
+                _cpu_time() - cpu_start,
+                stage_peak[0])
+
+    def add(self, name, wall_seconds, cpu_seconds, peak_rss_bytes):
+        """Add a run of a stage.
+
+        :param name: Name of the stage.
+        :type name: str
+
+        :param wall_seconds: Elapsed time.
+        :type wall_seconds: float
+
+        :param cpu_seconds: CPU time used by the process.
+        :type cpu_seconds: float
+
+        :param peak_rss_bytes: Peak RSS of the process during the stage.
+        :type peak_rss_bytes: int
+        """
+        stage = self.stages.setdefault(name, {
+            'calls': 0,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'peak_rss_bytes': 0})
+        stage['calls'] += 1
+        stage['wall_seconds'] += wall_seconds
+        stage['cpu_seconds'] += cpu_seconds
+        stage['peak_rss_bytes'] = max(stage['peak_rss_bytes'], peak_rss_bytes)
+        LOGGER.debug(
+            '%s stage %s took %.3fs (%.3fs CPU)' % (
+                self.hazard, name, wall_seconds, cpu_seconds))
+
+    def as_dict(self):
+        """The metrics as a JSON serialisable dict.
+
+        :rtype: dict
+        """
+        return OrderedDict([
+            ('hazard', self.hazard),
+            ('event_id', self.event_id),
+            ('start_time', self.start_time),
+            ('wall_seconds', time.time() - self.start_time),
+            ('process_peak_rss_bytes', _peak_rss()),
+            ('stages', self.stages)])
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format.
+
+        The event id is not a label, to keep the number of series bounded,
+        so the file describes the last event processed for the hazard.
+
+        :rtype: str
+        """
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.extend(_gauge_lines(name, help_text, samples))
+
+        hazard = {'hazard': self.hazard}
+        metrics = self.as_dict()
+        metric(
+            'event_start_timestamp_seconds',
+            'Time the processing of the last event started.',
+            [(hazard, repr(self.start_time))])
+        metric(
+            'event_wall_seconds',
+            'Wall time spent processing the last event.',
+            [(hazard, repr(metrics['wall_seconds']))])
+        metric(
+            'process_peak_rss_bytes',
+            'Peak RSS of the process since it started.',
+            [(hazard, repr(metrics['process_peak_rss_bytes']))])
+        for key, help_text in [
+                ('wall_seconds', 'Wall time spent in a stage.'),
+                ('cpu_seconds', 'CPU time spent in a stage.'),
+                ('peak_rss_bytes', 'Peak RSS of the process in a stage.'),
+                ('calls', 'Number of runs of a stage.')]:
+            samples = []
+            for name, stage in self.stages.items():
+                labels = dict(hazard)
+                labels['stage'] = name
+                samples.append((labels, repr(stage[key])))
+            metric('stage_%s' % key, help_text, samples)
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory=None, file_name=METRICS_FILE_NAME):
+        """Write the metrics file of the event and publish them.
+
+        :param directory: (Optional) Directory of the event where the
+            metrics file is written.
+        :type directory: str
+
+        :param file_name: (Optional) Name of the metrics file.
+        :type file_name: str
+
+        :return: Path to the metrics file, None if no directory is given.
+        :rtype: str
+        """
+        path = None
+        # Metrics must never break the event processing
+        # noinspection PyBroadException
+        try:
+            if directory is not None:
+                path = os.path.join(directory, file_name)
+                _write_atomically(path, json.dumps(self.as_dict(), indent=2))
+            collector_dir = metrics_dir()
+            if collector_dir is not None:
+                _write_atomically(
+                    os.path.join(
+                        collector_dir,
+                        '%s_%s.prom' % (METRIC_PREFIX, self.hazard)),
+                    self.prometheus_text())
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Could not write the %s metrics' % self.hazard)
+        return path
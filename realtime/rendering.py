@@ -0,0 +1,394 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Map composition rendering helpers.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import logging
+import os
+
+from qgis.core import (
+    QgsComposition,
+    QgsMapLayerRegistry,
+    QgsProject,
+    QgsRasterLayer)
+
+from PyQt4.QtCore import QRect, QRectF, QSize, QSizeF, Qt
+from PyQt4.QtGui import QImage, QPainter, QPrinter
+from PyQt4.QtXml import QDomDocument
+
+from realtime.instrumentation import EventMetrics
+from realtime.utilities import realtime_logger_name
+from safe.storage.core import read_qgis_layer
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Render modes, selected with the INASAFE_REALTIME_RENDER_MODE environment
+# variable
+SINGLE_PASS_RENDER_MODE = 'single_pass'
+TWO_PASS_RENDER_MODE = 'two_pass'
+
+THUMBNAIL_SIZE = QSize(200, 200)
+
+# Static layers opened as plain images instead of with read_qgis_layer
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+
+# The render context of this process, see render_context()
+_RENDER_CONTEXT = None
+
+
+def _modification_time(path):
+    """Modification time of a file or None if it does not exist."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class RenderContext(object):
+    """Project, templates and static layers shared by the reports.
+
+    Loading the QGIS project, parsing the composer templates and opening
+    the context layers (terrain, boundaries, base maps) is the same for
+    every report rendered by a worker, so it is done once per process.
+    Between two reports :func:`reset` only removes the per event layers.
+
+    Static layers are registered without giving their ownership to the
+    map layer registry, so they survive the removal of the layers and are
+    just added again to the next report needing them.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        # (path, mtime) of the project loaded and the ids of its layers
+        self.project_key = None
+        self.project_layer_ids = []
+        # path -> (mtime, QDomDocument)
+        self.templates = {}
+        # (path, title) -> (mtime, QgsMapLayer)
+        self.static_layers = {}
+
+    def reset(self, project_path=None):
+        """Remove the per event layers from the map layer registry.
+
+        :param project_path: (Optional) The project the next report uses.
+            If it is the loaded one its layers are kept, otherwise the
+            project is loaded again by :func:`load_project`.
+        :type project_path: str
+        """
+        keep_ids = []
+        if (project_path is not None and
+                self.project_key == self._project_key(project_path)):
+            keep_ids = self.project_layer_ids
+        else:
+            self.project_key = None
+            self.project_layer_ids = []
+
+        # noinspection PyArgumentList
+        registry = QgsMapLayerRegistry.instance()
+        layer_ids = [
+            layer_id for layer_id in registry.mapLayers().keys()
+            if layer_id not in keep_ids]
+        if layer_ids:
+            registry.removeMapLayers(layer_ids)
+
+    def load_project(self, project_path):
+        """Load a QGIS project unless it is already loaded.
+
+        :param project_path: Path to the project.
+        :type project_path: str
+        """
+        project_key = self._project_key(project_path)
+        # noinspection PyArgumentList
+        project = QgsProject.instance()
+        project.setFileName(project_path)
+        if self.project_key == project_key:
+            LOGGER.debug('Project %s is already loaded' % project_path)
+            return
+
+        # noinspection PyArgumentList
+        registry = QgsMapLayerRegistry.instance()
+        layer_ids = set(registry.mapLayers().keys())
+        project.read()
+        self.project_key = project_key
+        self.project_layer_ids = [
+            layer_id for layer_id in registry.mapLayers().keys()
+            if layer_id not in layer_ids]
+
+    def template_document(self, template_path):
+        """Get the parsed composer template.
+
+        QgsComposition.loadFromTemplate does not modify the document so it
+        can be shared by all the compositions.
+
+        :param template_path: Path to the .qpt template.
+        :type template_path: str
+
+        :return: The template document.
+        :rtype: QDomDocument
+        """
+        template_path = os.path.abspath(template_path)
+        mtime = _modification_time(template_path)
+        cached = self.templates.get(template_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(template_path) as template_file:
+            template_content = template_file.read()
+        document = QDomDocument()
+        document.setContent(template_content)
+        self.templates[template_path] = (mtime, document)
+        return document
+
+    def static_layer(self, layer_path, title=None):
+        """Get a layer that is the same for every report.
+
+        :param layer_path: Path to the layer.
+        :type layer_path: str
+
+        :param title: (Optional) Title of the layer.
+        :type title: str
+
+        :return: The layer, opened again only if its file changed.
+        :rtype: QgsMapLayer
+        """
+        key = (os.path.abspath(layer_path), title)
+        mtime = _modification_time(layer_path)
+        cached = self.static_layers.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        extension = os.path.splitext(layer_path)[1].lower()
+        if extension in IMAGE_EXTENSIONS:
+            layer = QgsRasterLayer(layer_path, title or '')
+        else:
+            layer = read_qgis_layer(layer_path, title)
+        self.static_layers[key] = (mtime, layer)
+        return layer
+
+    # noinspection PyMethodMayBeStatic
+    def add_static_layer(self, layer, add_to_legend=False):
+        """Add a static layer to the map layer registry.
+
+        :param layer: A layer from :func:`static_layer`.
+        :type layer: QgsMapLayer
+
+        :param add_to_legend: (Optional) Whether to add it to the legend.
+        :type add_to_legend: bool
+        """
+        # noinspection PyArgumentList
+        registry = QgsMapLayerRegistry.instance()
+        if layer.id() not in registry.mapLayers():
+            registry.addMapLayers([layer], add_to_legend, False)
+
+    @staticmethod
+    def _project_key(project_path):
+        """Key of a version of a project file."""
+        project_path = os.path.abspath(project_path)
+        return project_path, _modification_time(project_path)
+
+
+def render_context():
+    """Get the render context of this process.
+
+    :rtype: RenderContext
+    """
+    global _RENDER_CONTEXT
+    if _RENDER_CONTEXT is None:
+        _RENDER_CONTEXT = RenderContext()
+    return _RENDER_CONTEXT
+
+
+def render_mode():
+    """Get the mode used to export map compositions.
+
+    The default 'two_pass' mode exports the PDF and the PNG with separate
+    renders of the composition, keeping the map of the PDF as vectors. Set
+    the INASAFE_REALTIME_RENDER_MODE environment variable to 'single_pass'
+    to render the composition once: it is faster, but the map of the PDF
+    is then the rasterized map of the PNG, at the resolution of the PNG.
+
+    :return: SINGLE_PASS_RENDER_MODE or TWO_PASS_RENDER_MODE.
+    :rtype: str
+    """
+    mode = os.environ.get(
+        'INASAFE_REALTIME_RENDER_MODE', TWO_PASS_RENDER_MODE)
+    if mode not in [SINGLE_PASS_RENDER_MODE, TWO_PASS_RENDER_MODE]:
+        return TWO_PASS_RENDER_MODE
+    return mode
+
+
+def save_thumbnail(image, thumbnail_path, size=THUMBNAIL_SIZE):
+    """Save a scaled down copy of an image.
+
+    :param image: The full size image.
+    :type image: QImage
+
+    :param thumbnail_path: Path of the thumbnail.
+    :type thumbnail_path: str
+
+    :param size: (Optional) Size the image is scaled to, keeping its aspect
+        ratio and covering all the size.
+    :type size: QSize
+    """
+    thumbnail = image.scaled(
+        size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+    thumbnail.save(thumbnail_path)
+    LOGGER.info('Generated Thumbnail: %s' % thumbnail_path)
+
+
+def render_page_image(composition, page_number=0):
+    """Rasterize a page of a composition at its print resolution.
+
+    :param composition: The composition.
+    :type composition: QgsComposition
+
+    :param page_number: (Optional) The page to render.
+    :type page_number: int
+
+    :return: The page image.
+    :rtype: QImage
+    """
+    dpmm = composition.printResolution() / 25.4
+    width = int(dpmm * composition.paperWidth())
+    height = int(dpmm * composition.paperHeight())
+    image = QImage(QSize(width, height), QImage.Format_ARGB32)
+    image.setDotsPerMeterX(int(dpmm * 1000))
+    image.setDotsPerMeterY(int(dpmm * 1000))
+    image.fill(0)
+
+    composition.setPlotStyle(QgsComposition.Print)
+    painter = QPainter(image)
+    composition.renderPage(painter, page_number)
+    painter.end()
+    return image
+
+
+def export_pdf_from_image(composition, image, pdf_path, page_number=0):
+    """Export a page to PDF reusing its rasterized map items.
+
+    The composition is printed with its map items hidden, so only the
+    cheap items (labels, pictures, html frames) are rendered again, then
+    the map items are drawn from the page image.
+
+    :param composition: The composition.
+    :type composition: QgsComposition
+
+    :param image: The page rendered by :func:`render_page_image`.
+    :type image: QImage
+
+    :param pdf_path: Path of the PDF.
+    :type pdf_path: str
+
+    :param page_number: (Optional) The page to export.
+    :type page_number: int
+    """
+    printer = QPrinter()
+    printer.setOutputFormat(QPrinter.PdfFormat)
+    printer.setOutputFileName(pdf_path)
+    printer.setPaperSize(
+        QSizeF(composition.paperWidth(), composition.paperHeight()),
+        QPrinter.Millimeter)
+    printer.setFullPage(True)
+    printer.setColorMode(QPrinter.Color)
+    printer.setResolution(composition.printResolution())
+
+    page_top = page_number * (
+        composition.paperHeight() + composition.spaceBetweenPages())
+    map_items = [
+        item for item in composition.composerMapItems() if item.isVisible()]
+    for item in map_items:
+        item.hide()
+    composition.setPlotStyle(QgsComposition.Print)
+    painter = QPainter(printer)
+    try:
+        composition.renderPage(painter, page_number)
+        # Millimetres to printer and to image pixels
+        printer_scale = painter.device().width() / composition.paperWidth()
+        image_scale = image.width() / composition.paperWidth()
+        for item in map_items:
+            item_rect = item.sceneBoundingRect().translated(0, -page_top)
+            source = QRect(
+                int(round(item_rect.x() * image_scale)),
+                int(round(item_rect.y() * image_scale)),
+                int(round(item_rect.width() * image_scale)),
+                int(round(item_rect.height() * image_scale)))
+            target = QRectF(
+                item_rect.x() * printer_scale,
+                item_rect.y() * printer_scale,
+                item_rect.width() * printer_scale,
+                item_rect.height() * printer_scale)
+            painter.drawImage(target, image.copy(source))
+    finally:
+        painter.end()
+        for item in map_items:
+            item.show()
+
+
+def export_composition(
+        composition,
+        pdf_path,
+        image_path,
+        thumbnail_path,
+        mode=None,
+        metrics=None):
+    """Export the first page of a composition to PDF, PNG and thumbnail.
+
+    In the single pass mode the page is rasterized once, the PNG and the
+    thumbnail are derived from that image and the PDF reuses its map
+    items. In the two pass mode the PDF and the PNG are rendered
+    separately.
+
+    :param composition: The composition.
+    :type composition: QgsComposition
+
+    :param pdf_path: Path of the PDF.
+    :type pdf_path: str
+
+    :param image_path: Path of the PNG.
+    :type image_path: str
+
+    :param thumbnail_path: Path of the thumbnail.
+    :type thumbnail_path: str
+
+    :param mode: (Optional) SINGLE_PASS_RENDER_MODE or TWO_PASS_RENDER_MODE,
+        defaults to :func:`render_mode`.
+    :type mode: str
+
+    :param metrics: (Optional) Metrics recording the pdf and png stages.
+    :type metrics: EventMetrics
+    """
+    if mode is None:
+        mode = render_mode()
+    if metrics is None:
+        metrics = EventMetrics('report')
+    page_number = 0
+
+    if mode == TWO_PASS_RENDER_MODE:
+        with metrics.stage('pdf'):
+            composition.exportAsPDF(pdf_path)
+        LOGGER.info('Generated PDF: %s' % pdf_path)
+        with metrics.stage('png'):
+            image = composition.printPageAsRaster(page_number)
+            image.save(image_path)
+            save_thumbnail(image, thumbnail_path)
+        LOGGER.info('Generated Image: %s' % image_path)
+    else:
+        with metrics.stage('png'):
+            image = render_page_image(composition, page_number)
+            image.save(image_path)
+            save_thumbnail(image, thumbnail_path)
+        LOGGER.info('Generated Image: %s' % image_path)
+        with metrics.stage('pdf'):
+            export_pdf_from_image(composition, image, pdf_path, page_number)
+        LOGGER.info('Generated PDF: %s' % pdf_path)
@@ -0,0 +1,246 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Queues and priorities of the realtime tasks.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+Every hazard has its own compute queue, consumed by its own compute worker,
+so an hourly flood analysis never takes a process an earthquake needs. The
+number of processes of the workers is weighted by hazard, see
+:func:`compute_concurrency`. The render queue is shared by the hazards, as
+there is only one Xvfb render process, so its tasks are sent with a
+priority: earthquakes above ash above floods, and the stronger the shake
+the higher. With a prefetch of one task the render worker takes the most
+important waiting task when it is done with the current one.
+
+Queue depths are published for the Prometheus textfile collector with::
+
+    python -m realtime.routing
+
+e.g. every minute from cron, and the worker commands are printed with::
+
+    python -m realtime.routing --workers
+"""
+import argparse
+import logging
+import multiprocessing
+import sys
+
+from realtime.earthquake.grid_model import read_grid_header
+from realtime.exceptions import GridXmlParseError
+from realtime.instrumentation import write_queue_metrics
+from realtime.utilities import realtime_logger_name
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Queue of the tasks rendering reports with QGIS under Xvfb, its worker
+# must have a concurrency of 1 (see celeryconfig_sample.py)
+RENDER_QUEUE = 'inasafe-realtime'
+
+# Hazards, most important first
+HAZARDS = ['earthquake', 'ash', 'flood']
+
+# Share of the compute processes of each hazard
+COMPUTE_WEIGHTS = {
+    'earthquake': 4,
+    'ash': 2,
+    'flood': 1
+}
+
+# Priority of the tasks of each hazard, higher first as in AMQP
+HAZARD_PRIORITIES = {
+    'earthquake': 6,
+    'ash': 3,
+    'flood': 0
+}
+
+# A shake gets one more priority step from each of these magnitudes
+MAGNITUDE_STEPS = [5.0, 6.0, 7.0]
+
+# Highest priority, the x-max-priority of the queues
+MAX_PRIORITY = 9
+
+
+def compute_queue(hazard):
+    """Name of the queue of the analysis tasks of a hazard.
+
+    :param hazard: The hazard e.g. 'earthquake', 'flood' or 'ash'.
+    :type hazard: str
+
+    :rtype: str
+    """
+    return 'inasafe-realtime-compute-%s' % hazard
+
+
+def queue_names():
+    """Names of all the realtime queues.
+
+    :rtype: list
+    """
+    return [RENDER_QUEUE] + [compute_queue(hazard) for hazard in HAZARDS]
+
+
+def task_priority(hazard, magnitude=None):
+    """Priority of the tasks of an event.
+
+    :param hazard: The hazard e.g. 'earthquake', 'flood' or 'ash'.
+    :type hazard: str
+
+    :param magnitude: (Optional) Magnitude of an earthquake.
+    :type magnitude: float
+
+    :return: The priority, from 0 to MAX_PRIORITY.
+    :rtype: int
+    """
+    priority = HAZARD_PRIORITIES[hazard]
+    if magnitude is not None:
+        priority += len(
+            [step for step in MAGNITUDE_STEPS if magnitude >= step])
+    return min(priority, MAX_PRIORITY)
+
+
+def shake_priority(grid_xml_path):
+    """Priority of the tasks of a shake, boosted by its magnitude.
+
+    Only the header of the grid is read.
+
+    :param grid_xml_path: Path to the grid.xml of the shake.
+    :type grid_xml_path: str
+
+    :return: The priority, the earthquake one if the magnitude can not be
+        read.
+    :rtype: int
+    """
+    try:
+        _, event, _, _ = read_grid_header(grid_xml_path)
+        magnitude = float(event['magnitude'])
+    except (GridXmlParseError, IOError, KeyError, ValueError) as e:
+        LOGGER.info('No magnitude in %s: %s' % (grid_xml_path, e))
+        magnitude = None
+    return task_priority('earthquake', magnitude)
+
+
+def compute_concurrency(hazard, cpu_count=None):
+    """Number of processes of the compute worker of a hazard.
+
+    The processors are shared by the hazards according to COMPUTE_WEIGHTS,
+    with at least one process per hazard.
+
+    :param hazard: The hazard e.g. 'earthquake', 'flood' or 'ash'.
+    :type hazard: str
+
+    :param cpu_count: (Optional) Number of processors, defaults to the
+        processors of this machine.
+    :type cpu_count: int
+
+    :rtype: int
+    """
+    if cpu_count is None:
+        cpu_count = multiprocessing.cpu_count()
+    total = sum(COMPUTE_WEIGHTS.values())
+    return max(1, int(round(
+        float(cpu_count) * COMPUTE_WEIGHTS[hazard] / total)))
+
+
+def realtime_queues():
+    """The realtime queues, declared with a maximum priority.
+
+    Use it as CELERY_QUEUES. An existing queue must be deleted before it
+    is declared again with a maximum priority.
+
+    :rtype: list
+    """
+    # noinspection PyPackageRequirements
+    from kombu import Queue
+    return [
+        Queue(
+            name,
+            routing_key=name,
+            queue_arguments={'x-max-priority': MAX_PRIORITY})
+        for name in queue_names()]
+
+
+def queue_depths(connection, names=None):
+    """Number of messages waiting and consumers of the queues.
+
+    :param connection: Connection to the broker.
+    :type connection: kombu.Connection
+
+    :param names: (Optional) Names of the queues, defaults to
+        :func:`queue_names`.
+    :type names: list
+
+    :return: A tuple of (messages, consumers) keyed by queue name, None
+        for the queues that do not exist.
+    :rtype: dict
+    """
+    if names is None:
+        names = queue_names()
+    depths = {}
+    for name in names:
+        # A failed passive declare closes the channel
+        channel = connection.channel()
+        try:
+            _, messages, consumers = channel.queue_declare(
+                queue=name, passive=True)
+            depths[name] = (messages, consumers)
+        except connection.channel_errors:
+            depths[name] = None
+        finally:
+            try:
+                channel.close()
+            except connection.channel_errors:
+                pass
+    return depths
+
+
+def main(arguments=None):
+    """Publish the queue depths or print the worker commands.
+
+    :param arguments: (Optional) Command line arguments, defaults to
+        sys.argv.
+    :type arguments: list
+
+    :return: The exit status.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Realtime task queues.')
+    parser.add_argument(
+        '--workers', action='store_true',
+        help='Print the commands of the workers of this machine.')
+    options = parser.parse_args(arguments)
+
+    if options.workers:
+        print 'celery worker -A realtime.celery_app -Q %s -c 1' % (
+            RENDER_QUEUE)
+        for hazard in HAZARDS:
+            print 'celery worker -A realtime.celery_app -Q %s -c %d' % (
+                compute_queue(hazard), compute_concurrency(hazard))
+        return 0
+
+    # noinspection PyPackageRequirements
+    from kombu import Connection
+    from realtime.celeryconfig import BROKER_URL
+    connection = Connection(BROKER_URL)
+    try:
+        depths = queue_depths(connection)
+    finally:
+        connection.release()
+    for name in queue_names():
+        print '%-40s %s' % (name, depths[name])
+    write_queue_metrics(depths)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,14 @@
 # coding=utf-8
 import logging
-import os
 
-from realtime.ash.make_map import process_event
+from realtime.ash.make_map import analyse_event, render_event
 from realtime.celery_app import app
 from realtime.celeryconfig import ASH_WORKING_DIRECTORY
+from realtime.idempotency import (
+    idempotency_key,
+    lease_released,
+    submit_chain)
+from realtime.routing import RENDER_QUEUE, compute_queue, task_priority
 from realtime.utilities import realtime_logger_name
 
 __author__ = 'Rizky Maulana Nugraha <lana.pcfre@gmail.com>'
@@ -16,7 +20,7 @@ LOGGER = logging.getLogger(realtime_logger_name())
 
 
 @app.task(
-    name='realtime.tasks.ash.process_ash', queue='inasafe-realtime')
+    name='realtime.tasks.ash.process_ash', queue=compute_queue('ash'))
 def process_ash(
         event_time=None,
         volcano_name=None,
@@ -25,6 +29,17 @@ def process_ash(
         region=None,
         alert_level=None,
         hazard_url=None):
+    """Process an ash event with a chain of analysis and render tasks.
+
+    An event submitted again while it is processed is not queued again, see
+    :mod:`realtime.idempotency`.
+
+    :return: The id of the render task of the event, the one already in
+        flight for a duplicate submission. AsyncResult(task_id).get()
+        returns whether the report was generated and raises the error of
+        the analysis if it failed.
+    :rtype: str
+    """
     LOGGER.info('-------------------------------------------')
 
     # if 'INASAFE_LOCALE' in os.environ:
@@ -33,10 +48,13 @@ def process_ash(
     #     locale_option = 'en'
     locale_option = 'en'
 
-    working_directory = ASH_WORKING_DIRECTORY
-    try:
-        process_event(
-            working_directory,
+    lease_key = idempotency_key(
+        locale_option, event_time, volcano_name, volcano_location,
+        eruption_height, region, alert_level, hazard_url)
+    return submit_chain(
+        'ash',
+        lease_key,
+        analyse_ash.s(
             locale_option=locale_option,
             event_time=event_time,
             volcano_name=volcano_name,
@@ -44,10 +62,78 @@ def process_ash(
             eruption_height=eruption_height,
             region=region,
             alert_level=alert_level,
-            hazard_url=hazard_url)
-        LOGGER.info('Process event end.')
-        return True
-    except Exception as e:
-        LOGGER.exception(e)
+            hazard_url=hazard_url),
+        render_ash.s(locale_option, lease_key),
+        task_priority('ash'))
+
+
+@app.task(
+    name='realtime.tasks.ash.analyse_ash', queue=compute_queue('ash'))
+def analyse_ash(
+        locale_option='en',
+        event_time=None,
+        volcano_name=None,
+        volcano_location=None,
+        eruption_height=None,
+        region=None,
+        alert_level=None,
+        hazard_url=None):
+    """Calculate the impact of an ash event, without generating the report.
+
+    :return: The event folder for render_ash.
+    :rtype: str
+
+    :raises: The errors of the analysis, which stop the chain.
+    """
+    LOGGER.info('-------------------------------------------')
+
+    working_directory = ASH_WORKING_DIRECTORY
+    event_folder = analyse_event(
+        working_directory,
+        locale_option=locale_option,
+        event_time=event_time,
+        volcano_name=volcano_name,
+        volcano_location=volcano_location,
+        eruption_height=eruption_height,
+        region=region,
+        alert_level=alert_level,
+        hazard_url=hazard_url)
+    LOGGER.info('Analyse event end.')
+    return event_folder
+
+
+@app.task(
+    name='realtime.tasks.ash.render_ash', queue=RENDER_QUEUE)
+def render_ash(event_folder=None, locale_option='en', lease_key=None):
+    """Generate and push the report of an event analysed by analyse_ash.
+
+    :param event_folder: The event folder returned by analyse_ash.
+    :type event_folder: str
+
+    :param locale_option: The locale of the report.
+    :type locale_option: str
+
+    :param lease_key: (Optional) Key of the lease claimed by process_ash,
+        released when the report is done.
+    :type lease_key: str
+
+    :return: True if the report was generated.
+    :rtype: bool
+    """
+    LOGGER.info('-------------------------------------------')
+
+    with lease_released(
+            'ash', lease_key, render_ash.request.id):
+        if not event_folder:
+            LOGGER.info('No analysed event to render')
+            return False
+
+        working_directory = ASH_WORKING_DIRECTORY
+        try:
+            render_event(working_directory, event_folder, locale_option)
+            LOGGER.info('Process event end.')
+            return True
+        except Exception as e:
+            LOGGER.exception(e)
 
-    return False
+        return False
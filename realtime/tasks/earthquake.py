@@ -6,7 +6,13 @@ import os
 
 from realtime.celery_app import app
 from realtime.celeryconfig import EARTHQUAKE_WORKING_DIRECTORY
-from realtime.earthquake.make_map import process_event
+from realtime.earthquake.make_map import analyse_event, render_event
+from realtime.idempotency import (
+    file_hash,
+    idempotency_key,
+    lease_released,
+    submit_chain)
+from realtime.routing import RENDER_QUEUE, compute_queue, shake_priority
 from realtime.utilities import realtime_logger_name
 
 __author__ = 'Rizky Maulana Nugraha <lana.pcfre@gmail.com>'
@@ -18,8 +24,28 @@ LOGGER = logging.getLogger(realtime_logger_name())
 
 
 @app.task(
-    name='realtime.tasks.earthquake.process_shake', queue='inasafe-realtime')
+    name='realtime.tasks.earthquake.process_shake',
+    queue=compute_queue('earthquake'))
 def process_shake(event_id=None):
+    """Process a shake event with a chain of analysis and render tasks.
+
+    The analysis runs on the earthquake compute queue, the rendering on the
+    render queue. The products of the analysis are handed off on disk, in
+    the event directory. Both tasks get a priority boosted by the magnitude
+    of the shake, see :func:`realtime.routing.shake_priority`.
+
+    A shake submitted again with the same grid while it is processed is
+    not queued again, see :mod:`realtime.idempotency`.
+
+    :param event_id: The event id.
+    :type event_id: str
+
+    :return: The id of the render task of the shake, the one already in
+        flight for a duplicate submission, or False if the shake grid does
+        not exist. AsyncResult(task_id).get() returns whether the reports
+        were rendered and raises the error of the analysis if it failed.
+    :rtype: str, bool
+    """
     LOGGER.info('-------------------------------------------')
 
     if 'INASAFE_LOCALE' in os.environ:
@@ -27,31 +53,104 @@ def process_shake(event_id=None):
     else:
         locale_option = 'en'
 
-    working_directory = EARTHQUAKE_WORKING_DIRECTORY
-
     if not check_event_exists(event_id):
         LOGGER.info('Shake grid not exists')
         return False
 
-    try:
-        process_event(working_directory, event_id, locale_option)
-        LOGGER.info('Process event end.')
-        return True
-    except Exception as e:
-        LOGGER.exception(e)
+    lease_key = idempotency_key(
+        event_id, locale_option, file_hash(grid_path(event_id)))
+    priority = shake_priority(grid_path(event_id))
+    LOGGER.info('Shake %s has priority %d' % (event_id, priority))
+    return submit_chain(
+        'earthquake',
+        lease_key,
+        analyse_shake.s(event_id, locale_option),
+        render_shake.s(locale_option, lease_key),
+        priority)
+
+
+@app.task(
+    name='realtime.tasks.earthquake.analyse_shake',
+    queue=compute_queue('earthquake'))
+def analyse_shake(event_id=None, locale_option='en'):
+    """Run the analysis of a shake event, without rendering.
+
+    :param event_id: The event id.
+    :type event_id: str
+
+    :param locale_option: The locale of the reports.
+    :type locale_option: str
+
+    :return: The ids of the events analysed, for render_shake.
+    :rtype: list
 
-    return False
+    :raises: The errors of the analysis, which stop the chain.
+    """
+    LOGGER.info('-------------------------------------------')
+
+    working_directory = EARTHQUAKE_WORKING_DIRECTORY
+    event_ids = analyse_event(working_directory, event_id, locale_option)
+    LOGGER.info('Analyse event end.')
+    return event_ids or []
+
+
+@app.task(
+    name='realtime.tasks.earthquake.render_shake', queue=RENDER_QUEUE)
+def render_shake(event_ids=None, locale_option='en', lease_key=None):
+    """Render and push the reports of the events analysed by analyse_shake.
+
+    :param event_ids: The ids of the events analysed.
+    :type event_ids: list
+
+    :param locale_option: The locale of the reports.
+    :type locale_option: str
+
+    :param lease_key: (Optional) Key of the lease claimed by process_shake,
+        released when the reports are done.
+    :type lease_key: str
+
+    :return: True if the reports were rendered, False if an event could
+        not be set up.
+    :rtype: bool
+    """
+    LOGGER.info('-------------------------------------------')
+
+    with lease_released(
+            'earthquake', lease_key, render_shake.request.id):
+        if not event_ids:
+            LOGGER.info('No analysed event to render')
+            return False
+
+        working_directory = EARTHQUAKE_WORKING_DIRECTORY
+        try:
+            rendered = render_event(
+                working_directory, event_ids, locale_option)
+            LOGGER.info('Process event end.')
+            return rendered
+        except Exception as e:
+            LOGGER.exception(e)
+
+        return False
 
 
 @app.task(
     name='realtime.tasks.earthquake.check_event_exists',
-    queue='inasafe-realtime')
+    queue=compute_queue('earthquake'))
 def check_event_exists(event_id=None):
     LOGGER.info('-------------------------------------------')
 
-    working_directory = EARTHQUAKE_WORKING_DIRECTORY
-    grid_path = os.path.join(
-        working_directory,
+    return os.path.exists(grid_path(event_id))
+
+
+def grid_path(event_id):
+    """Path to the grid.xml of a shake event.
+
+    :param event_id: The event id.
+    :type event_id: str
+
+    :rtype: str
+    """
+    return os.path.join(
+        EARTHQUAKE_WORKING_DIRECTORY,
         event_id,
         'output/grid.xml')
-    return os.path.exists(grid_path)
@@ -5,7 +5,15 @@ import os
 
 from realtime.celery_app import app
 from realtime.celeryconfig import FLOOD_WORKING_DIRECTORY
-from realtime.flood.make_map import process_event
+from realtime.flood.make_map import (
+    analyse_event,
+    event_arguments,
+    render_event)
+from realtime.idempotency import (
+    idempotency_key,
+    lease_released,
+    submit_chain)
+from realtime.routing import RENDER_QUEUE, compute_queue, task_priority
 from realtime.utilities import realtime_logger_name
 
 __author__ = 'Rizky Maulana Nugraha <lana.pcfre@gmail.com>'
@@ -17,8 +25,24 @@ LOGGER = logging.getLogger(realtime_logger_name())
 
 
 @app.task(
-    name='realtime.tasks.flood.process_flood', queue='inasafe-realtime')
+    name='realtime.tasks.flood.process_flood',
+    queue=compute_queue('flood'))
 def process_flood(event_folder=None):
+    """Process a flood event with a chain of analysis and render tasks.
+
+    The report of the hour submitted again while it is processed is not
+    queued again, see :mod:`realtime.idempotency`.
+
+    :param event_folder: (Optional) The dummy folder of the event in the
+        working directory.
+    :type event_folder: str
+
+    :return: The id of the render task of the event, the one already in
+        flight for a duplicate submission. AsyncResult(task_id).get()
+        returns whether the reports were generated and raises the error of
+        the analysis if it failed.
+    :rtype: str
+    """
     LOGGER.info('-------------------------------------------')
 
     if 'INASAFE_LOCALE' in os.environ:
@@ -26,13 +50,84 @@ def process_flood(event_folder=None):
     else:
         locale_option = 'en'
 
+    # The hour of the event is read once, for the key and the analysis
+    event_args = event_arguments(event_folder)
+    lease_key = idempotency_key(locale_option, *sorted(event_args.items()))
+    return submit_chain(
+        'flood',
+        lease_key,
+        analyse_flood.s(event_folder, locale_option, event_args),
+        render_flood.s(locale_option, lease_key),
+        task_priority('flood'))
+
+
+@app.task(
+    name='realtime.tasks.flood.analyse_flood',
+    queue=compute_queue('flood'))
+def analyse_flood(event_folder=None, locale_option='en', event_args=None):
+    """Calculate the impact of a flood event, without generating reports.
+
+    :param event_folder: (Optional) The dummy folder of the event in the
+        working directory.
+    :type event_folder: str
+
+    :param locale_option: The locale of the reports.
+    :type locale_option: str
+
+    :param event_args: (Optional) The arguments of the event computed by
+        process_flood, computed for the current hour if not given.
+    :type event_args: dict
+
+    :return: The arguments of the event for render_flood.
+    :rtype: dict
+
+    :raises: The errors of the analysis, which stop the chain.
+    """
+    LOGGER.info('-------------------------------------------')
+
     working_directory = FLOOD_WORKING_DIRECTORY
-    try:
-        process_event(
-            working_directory, locale_option, dummy_folder=event_folder)
-        LOGGER.info('Process event end.')
-        return True
-    except Exception as e:
-        LOGGER.exception(e)
-
-    return False
+    event_args = analyse_event(
+        working_directory,
+        locale_option,
+        dummy_folder=event_folder,
+        event_args=event_args)
+    LOGGER.info('Analyse event end.')
+    return event_args
+
+
+@app.task(
+    name='realtime.tasks.flood.render_flood', queue=RENDER_QUEUE)
+def render_flood(event_args=None, locale_option='en', lease_key=None):
+    """Generate and push the reports of an event analysed by analyse_flood.
+
+    :param event_args: The arguments of the event returned by
+        analyse_flood.
+    :type event_args: dict
+
+    :param locale_option: The locale of the reports.
+    :type locale_option: str
+
+    :param lease_key: (Optional) Key of the lease claimed by process_flood,
+        released when the reports are done.
+    :type lease_key: str
+
+    :return: True if the reports were generated.
+    :rtype: bool
+    """
+    LOGGER.info('-------------------------------------------')
+
+    with lease_released(
+            'flood', lease_key, render_flood.request.id):
+        if not event_args:
+            LOGGER.info('No analysed event to render')
+            return False
+
+        working_directory = FLOOD_WORKING_DIRECTORY
+        try:
+            render_event(working_directory, event_args, locale_option)
+            LOGGER.info('Process event end.')
+            return True
+        except Exception as e:
+            LOGGER.exception(e)
+
+        return False
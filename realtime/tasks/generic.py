@@ -1,7 +1,13 @@
 # coding=utf-8
 import logging
+import os
+import socket
 
 from realtime.celery_app import app
+from realtime.datasets import warm_status
+from realtime.exceptions import EventProcessingError
+from realtime.idempotency import idempotency_store
+from realtime.routing import MAX_PRIORITY, RENDER_QUEUE
 from realtime.utilities import realtime_logger_name
 
 __author__ = 'Rizky Maulana Nugraha <lana.pcfre@gmail.com>'
@@ -14,7 +20,8 @@ LOGGER = logging.getLogger(realtime_logger_name())
 
 @app.task(
     name='realtime.tasks.generic.check_broker_connection',
-    queue='inasafe-realtime')
+    queue=RENDER_QUEUE,
+    priority=MAX_PRIORITY)
 def check_broker_connection():
     """Check broker connection with Realtime Tasks
 
@@ -23,3 +30,60 @@ def check_broker_connection():
     # We didn't do anything actually just return a boolean value
     # to indicate it is executed by the worker.
     return True
+
+
+@app.task(
+    name='realtime.tasks.generic.check_worker_health',
+    queue=RENDER_QUEUE,
+    priority=MAX_PRIORITY)
+def check_worker_health():
+    """Report which datasets are warm in the worker process running it.
+
+    It goes to the render queue by default, send it with
+    queue=realtime.routing.compute_queue(hazard) to check a compute worker.
+
+    :return: The host, the pid, whether no dataset failed to warm up and
+        the status of every dataset (see realtime.datasets.warm_status).
+    :rtype: dict
+    """
+    datasets = warm_status()
+    return {
+        'hostname': socket.gethostname(),
+        'pid': os.getpid(),
+        'healthy': all(
+            status['state'] != 'failed' for status in datasets.values()),
+        'datasets': datasets
+    }
+
+
+@app.task(
+    name='realtime.tasks.generic.release_lease',
+    queue=RENDER_QUEUE,
+    priority=MAX_PRIORITY)
+def release_lease(failed_task_id, hazard, lease_key, task_id):
+    """Release the lease of a chain whose task failed.
+
+    It is the error callback of the chains of
+    :func:`realtime.idempotency.submit_chain`. A render task that did not
+    run because the analysis failed is marked as failed, so the callers
+    waiting on its result see the failure.
+
+    :param failed_task_id: Id of the task that failed, given by celery.
+    :type failed_task_id: str
+
+    :param hazard: The hazard e.g. 'earthquake', 'flood' or 'ash'.
+    :type hazard: str
+
+    :param lease_key: Key of the lease.
+    :type lease_key: str
+
+    :param task_id: Id of the render task of the chain.
+    :type task_id: str
+    """
+    LOGGER.info('Releasing the lease of the failed chain of %s' % task_id)
+    idempotency_store(hazard).release(lease_key, task_id)
+    if failed_task_id != task_id:
+        release_lease.backend.mark_as_failure(
+            task_id,
+            EventProcessingError(
+                'Task %s of the chain failed' % failed_task_id))
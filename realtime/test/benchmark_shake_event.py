@@ -0,0 +1,320 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **ShakeEvent benchmarks on synthetic shakemaps.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+Times the stages of :class:`ShakeEvent` (construction, local_city_features,
+calculate_impacts and render_map) on the synthetic grids of
+:data:`GRID_PRESETS`. Everything, including the population raster and the
+geonames sqlite, is generated so the benchmark runs offline::
+
+    python -m realtime.test.benchmark_shake_event --grid small typical \\
+        --repeat 3 --output /tmp/before.json
+    python -m realtime.test.benchmark_shake_event --grid small typical \\
+        --repeat 3 --compare /tmp/before.json
+
+The event directory and the grid and impact caches are removed before each
+run. The exposure store, the geonames index and the QGIS project are kept
+between runs, as in a long running worker, so the first run of a process is
+also slower than the next ones.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+import numpy
+
+from realtime.earthquake.shake_event import ShakeEvent
+from realtime.earthquake.synthetic_shakemap import (
+    GRID_PRESETS,
+    write_synthetic_geonames,
+    write_synthetic_grid,
+    write_synthetic_population)
+from realtime.exposure_store import exposure_store
+from realtime.instrumentation import EventMetrics
+from realtime.utilities import (
+    base_data_dir,
+    make_directory,
+    realtime_logger_name,
+    shakemap_data_dir,
+    shakemap_extract_dir)
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# ShakeEvent stages timed by the benchmark, in the order they run
+STAGES = [
+    'construction',
+    'local_city_features',
+    'calculate_impacts',
+    'render_map']
+
+# Default relative slow down of a stage reported as a regression
+DEFAULT_TOLERANCE = 0.2
+
+
+def benchmark_dir():
+    """Create (if needed) and return the path to the benchmark dir."""
+    dir_path = os.path.join(base_data_dir(), 'benchmarks')
+    make_directory(dir_path)
+    return dir_path
+
+
+def git_revision():
+    """Commit of the working tree, None if it is not a git checkout."""
+    # noinspection PyBroadException
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT).strip()
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+def prepare_inputs(input_dir):
+    """Generate the grids, the population raster and the geonames sqlite.
+
+    Files already generated are reused.
+
+    :param input_dir: Directory of the generated files.
+    :type input_dir: str
+
+    :return: A tuple of (population raster path, geonames sqlite path).
+    :rtype: (str, str)
+    """
+    make_directory(input_dir)
+    for name, preset in GRID_PRESETS.items():
+        grid_path = os.path.join(input_dir, '%s-grid.xml' % name)
+        if not os.path.exists(grid_path):
+            write_synthetic_grid(
+                grid_path,
+                preset['event_id'],
+                preset['magnitude'],
+                preset['half_width'],
+                preset['resolution'])
+
+    population_path = os.path.join(input_dir, 'population.tif')
+    if not os.path.exists(population_path):
+        write_synthetic_population(population_path)
+    geonames_path = os.path.join(input_dir, 'geonames.sqlite')
+    if not os.path.exists(geonames_path):
+        write_synthetic_geonames(geonames_path)
+
+    # A worker builds the exposure store once, it is not part of an event
+    exposure_store(population_path)
+    return population_path, geonames_path
+
+
+def run_event(grid_path, event_id, population_path, geonames_path):
+    """Process a synthetic event, timing every ShakeEvent stage.
+
+    :param grid_path: Path to the synthetic grid.xml.
+    :type grid_path: str
+
+    :param event_id: Id of the event.
+    :type event_id: str
+
+    :param population_path: Path to the population raster.
+    :type population_path: str
+
+    :param geonames_path: Path to the geonames sqlite.
+    :type geonames_path: str
+
+    :return: A tuple of (benchmark metrics, metrics of the event).
+    :rtype: (EventMetrics, EventMetrics)
+    """
+    # Start from a cold event: no products, no cached grid or impact
+    event_dir = os.path.join(shakemap_extract_dir(), event_id)
+    shutil.rmtree(event_dir, ignore_errors=True)
+    shutil.rmtree(shakemap_data_dir(), ignore_errors=True)
+    make_directory(event_dir)
+    shutil.copyfile(grid_path, os.path.join(event_dir, 'grid.xml'))
+
+    metrics = EventMetrics('benchmark', event_id)
+    with metrics.stage('construction'):
+        shake_event = ShakeEvent(
+            working_dir=shakemap_extract_dir(),
+            event_id=event_id,
+            population_raster_path=population_path,
+            geonames_sqlite_path=geonames_path,
+            data_is_local_flag=True)
+    with metrics.stage('local_city_features'):
+        shake_event.local_city_features()
+    with metrics.stage('calculate_impacts'):
+        shake_event.calculate_impacts()
+    with metrics.stage('render_map'):
+        shake_event.render_map()
+    return metrics, shake_event.metrics
+
+
+def summarise(runs):
+    """Median and minimum wall time of each stage over the runs.
+
+    :param runs: Wall time of the stages of every run keyed by stage.
+    :type runs: list
+
+    :rtype: OrderedDict
+    """
+    summary = OrderedDict()
+    for stage in runs[0].keys():
+        values = [run[stage] for run in runs]
+        summary[stage] = {
+            'median': float(numpy.median(values)),
+            'min': min(values)}
+    return summary
+
+
+def run_benchmark(grid_names, repeat, input_dir):
+    """Run the benchmark on some of the synthetic grids.
+
+    :param grid_names: Names of grids in GRID_PRESETS.
+    :type grid_names: list
+
+    :param repeat: Number of runs per grid.
+    :type repeat: int
+
+    :param input_dir: Directory of the generated inputs.
+    :type input_dir: str
+
+    :return: The results, see :func:`compare` for their use.
+    :rtype: dict
+    """
+    population_path, geonames_path = prepare_inputs(input_dir)
+    results = OrderedDict([
+        ('commit', git_revision()),
+        ('created', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('repeat', repeat),
+        ('grids', OrderedDict())])
+    for name in grid_names:
+        preset = GRID_PRESETS[name]
+        runs = []
+        breakdown = None
+        for _ in range(repeat):
+            metrics, event_metrics = run_event(
+                os.path.join(input_dir, '%s-grid.xml' % name),
+                preset['event_id'],
+                population_path,
+                geonames_path)
+            runs.append(OrderedDict(
+                (stage, metrics.stages[stage]['wall_seconds'])
+                for stage in STAGES))
+            breakdown = event_metrics.stages
+        count = int(round(2 * preset['half_width'] / preset['resolution']))
+        results['grids'][name] = OrderedDict([
+            ('points', (count + 1) ** 2),
+            ('magnitude', preset['magnitude']),
+            ('runs', runs),
+            ('summary', summarise(runs)),
+            ('breakdown', breakdown)])
+        for stage, values in results['grids'][name]['summary'].items():
+            print '%-8s %-20s median %8.3fs  min %8.3fs' % (
+                name, stage, values['median'], values['min'])
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare the median stage times to a baseline.
+
+    :param results: Results of :func:`run_benchmark`.
+    :type results: dict
+
+    :param baseline: Results of an earlier run e.g. on another commit.
+    :type baseline: dict
+
+    :param tolerance: Relative slow down above which a stage regressed.
+    :type tolerance: float
+
+    :return: The regressions as (grid, stage, ratio) tuples.
+    :rtype: list
+    """
+    regressions = []
+    print 'Compared to %s (%s)' % (
+        baseline.get('commit'), baseline.get('created'))
+    for name, grid in results['grids'].items():
+        baseline_grid = baseline['grids'].get(name)
+        if baseline_grid is None:
+            continue
+        for stage, values in grid['summary'].items():
+            baseline_values = baseline_grid['summary'].get(stage)
+            if baseline_values is None or not baseline_values['median']:
+                continue
+            ratio = values['median'] / baseline_values['median']
+            flag = ''
+            if ratio > 1 + tolerance:
+                regressions.append((name, stage, ratio))
+                flag = ' REGRESSION'
+            print '%-8s %-20s %8.3fs -> %8.3fs  x%.2f%s' % (
+                name, stage, baseline_values['median'], values['median'],
+                ratio, flag)
+    return regressions
+
+
+def main(arguments=None):
+    """Run the benchmark from the command line.
+
+    :param arguments: (Optional) Command line arguments, defaults to
+        sys.argv.
+    :type arguments: list
+
+    :return: The exit status, 1 if a stage regressed against the baseline.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark ShakeEvent on synthetic shakemaps.')
+    parser.add_argument(
+        '--grid', nargs='+', choices=GRID_PRESETS.keys(),
+        default=GRID_PRESETS.keys(), help='Grids to run.')
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='Runs per grid.')
+    parser.add_argument(
+        '--work-dir',
+        help='Realtime work dir, defaults to INASAFE_WORK_DIR.')
+    parser.add_argument(
+        '--output', help='Path of the results, defaults to '
+        '<work dir>/benchmarks/<commit>.json.')
+    parser.add_argument(
+        '--compare', help='Results of an earlier run to compare with.')
+    parser.add_argument(
+        '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help='Relative slow down reported as a regression.')
+    options = parser.parse_args(arguments)
+
+    if options.work_dir:
+        os.environ['INASAFE_WORK_DIR'] = options.work_dir
+    results = run_benchmark(
+        options.grid,
+        options.repeat,
+        os.path.join(benchmark_dir(), 'inputs'))
+
+    output_path = options.output or os.path.join(
+        benchmark_dir(), '%s.json' % (results['commit'] or 'latest'))
+    with open(output_path, 'w') as output_file:
+        output_file.write(json.dumps(results, indent=2))
+    print 'Results written to %s' % output_path
+
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.loads(baseline_file.read())
+        if compare(results, baseline, options.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
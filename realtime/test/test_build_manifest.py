@@ -0,0 +1,111 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Build Manifest Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import unittest
+
+from realtime.earthquake.build_manifest import BuildManifest, inputs_hash
+from safe.common.utilities import temp_dir
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class TestBuildManifest(unittest.TestCase):
+    """Tests for the manifest of the event products."""
+
+    def setUp(self):
+        self.event_dir = os.path.join(temp_dir('test'), 'manifest-event')
+        shutil.rmtree(self.event_dir, ignore_errors=True)
+        os.makedirs(self.event_dir)
+        self.builds = []
+
+    def tearDown(self):
+        shutil.rmtree(self.event_dir, ignore_errors=True)
+
+    def builder(self, file_name):
+        """Get a builder writing a file and counting its calls."""
+        def build():
+            self.builds.append(file_name)
+            path = os.path.join(self.event_dir, file_name)
+            with open(path, 'w') as output_file:
+                output_file.write(file_name)
+            return path
+        return build
+
+    def test_build(self):
+        """Test products are only rebuilt when their inputs change."""
+        manifest = BuildManifest(self.event_dir)
+        inputs = {'grid': 'a', 'algorithm': 'nearest'}
+        path = manifest.build('contours', inputs, self.builder('c.shp'))
+        self.assertEqual(path, os.path.join(self.event_dir, 'c.shp'))
+
+        # A new manifest reads the recorded products back
+        manifest = BuildManifest(self.event_dir)
+        self.assertEqual(
+            manifest.build('contours', inputs, self.builder('c.shp')), path)
+        self.assertEqual(self.builds, ['c.shp'])
+        self.assertEqual(
+            manifest.products['contours']['outputs'], ['c.shp'])
+
+        manifest.build(
+            'contours', {'grid': 'b', 'algorithm': 'nearest'},
+            self.builder('c.shp'))
+        manifest.build(
+            'contours', {'grid': 'b', 'algorithm': 'nearest'},
+            self.builder('c.shp'), force_flag=True)
+        self.assertEqual(self.builds, ['c.shp'] * 3)
+
+    def test_missing_output(self):
+        """Test a product is rebuilt when one of its outputs is missing."""
+        manifest = BuildManifest(self.event_dir)
+        paths = manifest.build(
+            'cities', {'grid': 'a'},
+            lambda: [self.builder('a.shp')(), self.builder('b.shp')()])
+        self.assertEqual(len(paths), 2)
+        self.assertTrue(manifest.is_current('cities', {'grid': 'a'}))
+        os.remove(paths[1])
+        self.assertFalse(manifest.is_current('cities', {'grid': 'a'}))
+
+        manifest.invalidate('cities')
+        self.assertIsNone(manifest.outputs('cities'))
+
+    def test_concurrent_save(self):
+        """Test manifests of several processes keep each other's products."""
+        first = BuildManifest(self.event_dir)
+        second = BuildManifest(self.event_dir)
+        first.build('contours', {'grid': 'a'}, self.builder('c.shp'))
+        second.build('cities', {'grid': 'a'}, self.builder('d.shp'))
+        self.assertEqual(
+            sorted(BuildManifest(self.event_dir).products),
+            ['cities', 'contours'])
+
+        # Only the products invalidated by a manifest are removed
+        first.invalidate('contours')
+        self.assertEqual(
+            sorted(BuildManifest(self.event_dir).products), ['cities'])
+        self.assertEqual(sorted(first.products), ['cities'])
+
+    def test_inputs_hash(self):
+        """Test the inputs hash does not depend on the key order."""
+        self.assertEqual(
+            inputs_hash({'a': 1, 'b': 'c'}), inputs_hash({'b': 'c', 'a': 1}))
+        self.assertNotEqual(
+            inputs_hash({'a': 1}), inputs_hash({'a': 2}))
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestBuildManifest, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
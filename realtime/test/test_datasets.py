@@ -0,0 +1,100 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Dataset Warm Up Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import unittest
+
+from realtime import datasets
+from realtime.datasets import warm_status, warm_up, warmup_hazards
+from safe.common.utilities import temp_dir, unique_filename
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+# Environment variables changed by the tests
+VARIABLES = ['INASAFE_WARMUP_HAZARDS', 'INASAFE_FLOOD_POPULATION_PATH']
+
+
+class TestDatasets(unittest.TestCase):
+    """Tests for the warm up of the datasets of the worker processes."""
+
+    def setUp(self):
+        self.environment = dict(
+            (name, os.environ.get(name)) for name in VARIABLES)
+        for name in VARIABLES:
+            os.environ.pop(name, None)
+        self.directory = unique_filename(dir=temp_dir('test'))
+        os.makedirs(self.directory)
+        datasets._WARM.clear()
+
+    def tearDown(self):
+        for name, value in self.environment.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(self.directory, ignore_errors=True)
+        datasets._WARM.clear()
+
+    def test_warmup_hazards(self):
+        """Test the hazards warmed up are read from the environment."""
+        self.assertEqual(warmup_hazards(), ['earthquake', 'ash', 'flood'])
+        os.environ['INASAFE_WARMUP_HAZARDS'] = 'flood, earthquake,unknown'
+        self.assertEqual(warmup_hazards(), ['flood', 'earthquake'])
+        os.environ['INASAFE_WARMUP_HAZARDS'] = ''
+        self.assertEqual(warmup_hazards(), [])
+
+    def test_missing(self):
+        """Test datasets not configured or not there are reported."""
+        status = warm_up(hazards=['flood'])
+        self.assertEqual(status.keys(), ['flood-population'])
+        self.assertEqual(status['flood-population']['state'], 'missing')
+        self.assertEqual(
+            status['flood-population']['detail'], 'Not configured')
+
+        os.environ['INASAFE_FLOOD_POPULATION_PATH'] = os.path.join(
+            self.directory, 'population.shp')
+        status = warm_up(hazards=['flood'])
+        self.assertEqual(status['flood-population']['state'], 'missing')
+        self.assertEqual(
+            status['flood-population']['detail'], 'No such file')
+        self.assertEqual(status['flood-population']['pid'], os.getpid())
+
+    def test_failed(self):
+        """Test a dataset failing to load is reported, not raised."""
+        population_path = os.path.join(self.directory, 'population.shp')
+        with open(population_path, 'w') as population_file:
+            population_file.write('not a shapefile')
+        os.environ['INASAFE_FLOOD_POPULATION_PATH'] = population_path
+        warm_up(hazards=['flood'])
+        status = warm_status()['flood-population']
+        self.assertEqual(status['state'], 'failed')
+        self.assertEqual(status['path'], population_path)
+        self.assertTrue(status['detail'])
+
+    def test_fork_safe_only(self):
+        """Test the layers are not warmed up before forking."""
+        os.environ['INASAFE_FLOOD_POPULATION_PATH'] = os.path.join(
+            self.directory, 'population.shp')
+        self.assertEqual(
+            warm_up(fork_safe_only=True, hazards=['flood', 'ash']), {})
+        self.assertEqual(
+            [spec[0] for spec in datasets.datasets(['earthquake'])],
+            ['earthquake-population', 'earthquake-geonames'])
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestDatasets, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
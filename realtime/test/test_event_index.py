@@ -0,0 +1,134 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Event Index Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import threading
+import time
+import unittest
+
+from realtime.earthquake.event_index import (
+    EventIndex,
+    event_index,
+    event_timestamp)
+from safe.common.utilities import temp_dir, unique_filename
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class TestEventIndex(unittest.TestCase):
+    """Tests for the persistent event index."""
+
+    def setUp(self):
+        self.working_dir = os.path.join(temp_dir('test'), 'event-index')
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+        for name in [
+                '20150918201057', '20150918201011', '20150918195000',
+                '20991231000000', 'not-an-event', '20151332000000']:
+            os.makedirs(os.path.join(self.working_dir, name))
+        self.index_path = unique_filename(
+            prefix='event-index', suffix='.sqlite', dir=temp_dir('test'))
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+
+    def test_event_timestamp(self):
+        """Test differences of timestamps are seconds between events."""
+        self.assertEqual(
+            event_timestamp('20150918201057') -
+            event_timestamp('20150918200959'), 58)
+
+    def test_queries(self):
+        """Test the latest, within and exists queries."""
+        index = EventIndex(self.working_dir, self.index_path)
+        self.assertEqual(index.event_ids(), [
+            '20150918195000', '20150918201011', '20150918201057',
+            '20991231000000'])
+        self.assertEqual(index.latest(), '20991231000000')
+        self.assertEqual(
+            index.latest(before='20160101000000'), '20150918201057')
+        self.assertEqual(
+            index.within(100, newest='20150918201057'),
+            ['20150918201057', '20150918201011'])
+        self.assertEqual(index.within(100), ['20991231000000'])
+        self.assertTrue(index.exists('20150918201011'))
+        self.assertFalse(index.exists('20150918201012'))
+        self.assertFalse(index.exists('not-an-event'))
+
+    def test_refresh(self):
+        """Test the index follows added and removed event directories."""
+        index = EventIndex(self.working_dir, self.index_path)
+        self.assertEqual(len(index.event_ids()), 4)
+
+        os.makedirs(os.path.join(self.working_dir, '20150918201100'))
+        shutil.rmtree(os.path.join(self.working_dir, '20991231000000'))
+        self.assertEqual(index.latest(), '20150918201100')
+        self.assertFalse(index.exists('20991231000000'))
+
+        # The index persists between processes
+        index = EventIndex(self.working_dir, self.index_path)
+        self.assertEqual(len(index.event_ids()), 4)
+
+    def test_unmodified_directory(self):
+        """Test an unmodified working dir is not listed again."""
+        index = EventIndex(self.working_dir, self.index_path)
+        # Pretend the directory was last modified a while ago
+        past = time.time() - 60
+        os.utime(self.working_dir, (past, past))
+        index.refresh()
+
+        # A change keeping the old mtime is not seen without force_flag
+        os.makedirs(os.path.join(self.working_dir, '20150918201100'))
+        os.utime(self.working_dir, (past, past))
+        self.assertFalse(index.exists('20150918201100'))
+        index.refresh(force_flag=True)
+        self.assertTrue(index.exists('20150918201100'))
+
+    def test_missing_directory(self):
+        """Test a missing working dir has no events."""
+        index = EventIndex(
+            os.path.join(self.working_dir, 'missing'), self.index_path)
+        self.assertIsNone(index.event_ids())
+        self.assertIsNone(index.latest())
+        self.assertEqual(index.within(100), [])
+
+    def test_event_index(self):
+        """Test the index of a working dir is opened once."""
+        self.assertIs(
+            event_index(self.working_dir), event_index(self.working_dir))
+
+    def test_event_index_threads(self):
+        """Test the index of a working dir can be used by two threads."""
+        indexes = [event_index(self.working_dir)]
+        results = []
+
+        def query():
+            index = event_index(self.working_dir)
+            indexes.append(index)
+            results.append(index.latest())
+
+        thread = threading.Thread(target=query)
+        thread.start()
+        thread.join()
+        self.assertEqual(results, ['20991231000000'])
+        self.assertIsNot(indexes[0], indexes[1])
+        self.assertEqual(indexes[0].latest(), '20991231000000')
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestEventIndex, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
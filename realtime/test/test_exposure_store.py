@@ -0,0 +1,111 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Exposure Store Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import unittest
+
+import numpy
+# noinspection PyPackageRequirements
+from osgeo import gdal, osr
+
+from realtime.exposure_store import ExposureStore
+from safe.common.utilities import temp_dir, unique_filename
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+def write_raster(data, geotransform, no_data=-9999):
+    """Write an array to a temporary WGS84 GeoTIFF and return its path."""
+    path = unique_filename(
+        prefix='population', suffix='.tif', dir=temp_dir('test'))
+    rows, columns = data.shape
+    dataset = gdal.GetDriverByName('GTiff').Create(
+        path, columns, rows, 1, gdal.GDT_Float32)
+    dataset.SetGeoTransform(geotransform)
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataset.SetProjection(srs.ExportToWkt())
+    band = dataset.GetRasterBand(1)
+    band.SetNoDataValue(no_data)
+    band.WriteArray(data)
+    band.FlushCache()
+    dataset = None
+    with open(path.replace('.tif', '.xml'), 'w') as keywords_file:
+        keywords_file.write('<keywords />')
+    return path
+
+
+class TestExposureStore(unittest.TestCase):
+    """Tests for the pre-tiled exposure store."""
+
+    def setUp(self):
+        # 10 x 12 raster of 0.1 degree cells with values row * 100 + column
+        self.data = (
+            numpy.arange(10)[:, None] * 100 +
+            numpy.arange(12)[None, :]).astype(numpy.float32)
+        self.raster_path = write_raster(
+            self.data, [100.0, 0.1, 0, 5.0, 0, -0.1])
+        self.store_path = os.path.join(temp_dir('test'), 'exposure-store')
+        shutil.rmtree(self.store_path, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.store_path, ignore_errors=True)
+
+    def test_build(self):
+        """Test a raster is split in tiles."""
+        store = ExposureStore.build(
+            self.raster_path, self.store_path, tile_size=4)
+        self.assertEqual(len(store.index['tiles']), 9)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.store_path, 'tiles', '2_2.npy')))
+
+    def test_window(self):
+        """Test reading the part of the raster covering a bbox."""
+        store = ExposureStore.build(
+            self.raster_path, self.store_path, tile_size=4)
+        data, geotransform = store.window(100.25, 4.35, 100.75, 4.85)
+        numpy.testing.assert_array_equal(data, self.data[1:7, 2:8])
+        numpy.testing.assert_allclose(
+            geotransform, [100.2, 0.1, 0, 4.9, 0, -0.1])
+
+        # Cells outside of the raster are no data
+        data, _ = store.window(99.95, 4.85, 100.15, 5.05)
+        self.assertEqual(data.shape, (3, 3))
+        self.assertEqual(data[0, 0], -9999)
+        self.assertEqual(data[1, 1], self.data[0, 0])
+        self.assertEqual(data[2, 2], self.data[1, 1])
+
+        # Windows outside of the raster read no tile
+        data, _ = store.window(98.0, 0.0, 99.0, 1.0)
+        self.assertEqual(data.shape, (10, 10))
+        self.assertTrue((data == -9999).all())
+
+    def test_write_window(self):
+        """Test writing a window keeps the raster metadata and keywords."""
+        store = ExposureStore.build(
+            self.raster_path, self.store_path, tile_size=4)
+        output_path = unique_filename(suffix='.tif', dir=temp_dir('test'))
+        store.write_window(output_path, 100.25, 4.35, 100.75, 4.85)
+        dataset = gdal.Open(output_path)
+        numpy.testing.assert_array_equal(
+            dataset.GetRasterBand(1).ReadAsArray(), self.data[1:7, 2:8])
+        self.assertEqual(dataset.GetRasterBand(1).GetNoDataValue(), -9999)
+        self.assertTrue(os.path.exists(output_path.replace('.tif', '.xml')))
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestExposureStore, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
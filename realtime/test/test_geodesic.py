@@ -0,0 +1,65 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Geodesic Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import unittest
+
+import numpy
+
+from realtime.earthquake.geodesic import (
+    bearing,
+    cardinal_directions,
+    distance,
+    distance_and_bearings)
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class TestGeodesic(unittest.TestCase):
+    """Tests for the great circle calculations."""
+
+    def test_distance(self):
+        """Test great circle distances in km."""
+        # One degree along the equator and along a meridian
+        numpy.testing.assert_allclose(
+            distance(0, 0, [1, 0, 0], [0, 1, 0]),
+            [111.195, 111.195, 0], atol=1e-3)
+        # Jakarta to Jayapura
+        numpy.testing.assert_allclose(
+            distance(106.85, -6.21, [140.72], [-2.53]), [3760.0], rtol=1e-2)
+
+    def test_bearing(self):
+        """Test initial bearings follow the QgsPoint.azimuth convention."""
+        numpy.testing.assert_allclose(
+            bearing(0, 0, [0, 1, 0, -1], [1, 0, -1, 0]),
+            [0, 90, 180, -90], atol=1e-9)
+
+    def test_distance_and_bearings(self):
+        """Test distance and bearings to and from the epicentre."""
+        distances, directions_to, directions_from = distance_and_bearings(
+            140.62, -2.43, [140.692667], [-2.562624])
+        numpy.testing.assert_allclose(distances, [16.812], atol=1e-3)
+        numpy.testing.assert_allclose(directions_to, [-28.698], atol=1e-3)
+        numpy.testing.assert_allclose(directions_from, [151.305], atol=1e-3)
+
+    def test_cardinal_directions(self):
+        """Test bearings are converted to compass points."""
+        self.assertEqual(
+            list(cardinal_directions([160, 225.4, -28.7, 0, 359, -180])),
+            ['SSE', 'SW', 'NNW', 'N', 'N', 'S'])
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestGeodesic, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
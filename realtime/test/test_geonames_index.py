@@ -0,0 +1,145 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Geonames Index Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import sqlite3
+import struct
+import unittest
+
+import numpy
+
+from realtime.earthquake.geonames_index import (
+    GeonamesIndex,
+    blob_to_point,
+    geonames_index)
+from safe.common.utilities import temp_dir, unique_filename
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+PLACES = [
+    # name, fcode, population, longitude, latitude
+    ('Jayapura', 'PPLA', 134895, 140.70, -2.53),
+    ('Sentani', 'PPL', 17000, 140.51, -2.57),
+    ('Abepura', 'PPL', 0, 140.62, -2.60),
+    ('Cyclops', 'MT', 100, 140.60, -2.50),
+    ('Sarmi', 'PPL', 7000, 138.75, -1.85),
+    ('Biak', 'PPL', 103610, 136.10, -1.18),
+]
+
+
+def point_blob(longitude, latitude):
+    """Spatialite geometry blob of a WGS84 point."""
+    return (
+        '\x00\x01' + struct.pack('<i4d', 4326, longitude, latitude,
+                                 longitude, latitude) +
+        '\x7c' + struct.pack('<i2d', 1, longitude, latitude) + '\xfe')
+
+
+def write_geonames(places):
+    """Write places to a temporary geonames sqlite and return its path."""
+    path = unique_filename(
+        prefix='geonames', suffix='.sqlite', dir=temp_dir('test'))
+    connection = sqlite3.connect(path)
+    connection.execute(
+        'CREATE TABLE geonames (PK_UID INTEGER PRIMARY KEY, asciiname TEXT, '
+        'fcode TEXT, population INTEGER, geometry BLOB)')
+    for name, code, population, longitude, latitude in places:
+        connection.execute(
+            'INSERT INTO geonames (asciiname, fcode, population, geometry) '
+            'VALUES (?, ?, ?, ?)',
+            (name, code, population,
+             sqlite3.Binary(point_blob(longitude, latitude))))
+    connection.commit()
+    connection.close()
+    return path
+
+
+class TestGeonamesIndex(unittest.TestCase):
+    """Tests for the in memory geonames index."""
+
+    def test_blob_to_point(self):
+        """Test reading a point from a spatialite blob."""
+        self.assertEqual(
+            blob_to_point(point_blob(140.7, -2.53)), (140.7, -2.53))
+        self.assertIsNone(blob_to_point('POINT(1 2)'))
+
+    def test_from_sqlite(self):
+        """Test only the populated places are loaded."""
+        index = GeonamesIndex.from_sqlite(write_geonames(PLACES))
+        self.assertEqual(len(index), 4)
+        self.assertEqual(
+            list(index.names), ['Jayapura', 'Sentani', 'Sarmi', 'Biak'])
+        self.assertEqual(list(index.ids), [1, 2, 5, 6])
+        self.assertEqual(len(index.features), 6)
+
+    def test_bbox(self):
+        """Test bounding box queries."""
+        index = GeonamesIndex.from_sqlite(write_geonames(PLACES))
+        selection = index.bbox(140.0, -3.0, 141.0, -2.0)
+        self.assertEqual(list(index.names[selection]), ['Jayapura', 'Sentani'])
+        selection = index.bbox(136.10, -1.85, 138.75, -1.18)
+        self.assertEqual(list(index.names[selection]), ['Sarmi', 'Biak'])
+        self.assertEqual(index.bbox(100, 0, 101, 1).size, 0)
+
+    def test_expanding_bbox(self):
+        """Test finding the smallest zoomed out box holding places."""
+        index = GeonamesIndex.from_sqlite(write_geonames(PLACES))
+        boxes, selection, found = index.expanding_bbox(
+            139.0, -2.0, 139.4, -1.6, 2.0, 5)
+        self.assertTrue(found)
+        self.assertEqual([box[4] for box in boxes], [0, 0, 1])
+        numpy.testing.assert_allclose(boxes[2][:4], [138.4, -2.6, 140.0, -1.0])
+        self.assertEqual(list(index.names[selection]), ['Sarmi'])
+
+        # Every feature is counted, populated places are selected
+        boxes, selection, found = index.expanding_bbox(
+            139.0, -2.0, 139.4, -1.6, 2.0, 5, minimum_count=10)
+        self.assertFalse(found)
+        self.assertEqual(len(boxes), 6)
+        self.assertEqual([box[4] for box in boxes], [0, 0, 1, 5, 6, None])
+        self.assertEqual(selection.size, 4)
+
+        # The search stops at the first box holding a feature, even if it
+        # is not a populated place
+        boxes, selection, found = index.expanding_bbox(
+            140.55, -2.55, 140.65, -2.45, 2.0, 5)
+        self.assertTrue(found)
+        self.assertEqual([box[4] for box in boxes], [1])
+        numpy.testing.assert_allclose(
+            boxes[0][:4], [140.55, -2.55, 140.65, -2.45])
+        self.assertEqual(selection.size, 0)
+
+    def test_nearest(self):
+        """Test nearest neighbour queries."""
+        index = GeonamesIndex.from_sqlite(
+            write_geonames(PLACES), cell_size=0.5)
+        selection = index.nearest(140.62, -2.43, 3)
+        self.assertEqual(
+            list(index.names[selection]), ['Jayapura', 'Sentani', 'Sarmi'])
+        selection = index.nearest(130.0, 0.0, 10)
+        self.assertEqual(
+            list(index.names[selection]),
+            ['Biak', 'Sarmi', 'Sentani', 'Jayapura'])
+
+    def test_geonames_index(self):
+        """Test the index is only loaded once per process."""
+        path = write_geonames(PLACES)
+        index = geonames_index(path)
+        self.assertIs(geonames_index(path), index)
+        numpy.testing.assert_allclose(index.longitudes[0], 140.70)
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestGeonamesIndex, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,84 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Grid Cache Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import unittest
+
+import numpy
+
+from realtime.earthquake.grid_cache import GridCache, file_sha1
+from realtime.test.test_grid_model import SMALL_GRID, write_grid
+from safe.common.utilities import temp_dir
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class TestGridCache(unittest.TestCase):
+    """Tests for the persistent grid cache."""
+
+    def setUp(self):
+        self.cache_dir = os.path.join(temp_dir('test'), 'grid-cache')
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_load(self):
+        """Test a grid is parsed once and then loaded from the cache."""
+        grid_path = write_grid(SMALL_GRID)
+        cache = GridCache(cache_dir=self.cache_dir)
+        key = file_sha1(grid_path)
+        self.assertIsNone(cache.get(key))
+
+        parsed = cache.load(grid_path)
+        self.assertEqual(parsed.source_hash, key)
+        self.assertTrue(os.path.isdir(cache.entry_path(key)))
+
+        cached = cache.load(grid_path)
+        self.assertIsInstance(cached.data, numpy.memmap)
+        self.assertEqual(cached.source_hash, key)
+        self.assertEqual(cached.fields, parsed.fields)
+        self.assertEqual(cached.magnitude, parsed.magnitude)
+        numpy.testing.assert_array_equal(cached.data, parsed.data)
+
+    def test_evict(self):
+        """Test the least recently used entries are evicted first."""
+        cache = GridCache(cache_dir=self.cache_dir)
+        paths = []
+        for magnitude in ['5.0', '6.0', '7.0']:
+            paths.append(write_grid(
+                SMALL_GRID.replace('magnitude="6.5"', 'magnitude="%s"' % (
+                    magnitude, ))))
+        keys = [file_sha1(path) for path in paths]
+        for path in paths:
+            cache.load(path)
+        # Make the first entry the most recently used one
+        entry_size = cache.size() / 3
+        for index, key in enumerate(keys):
+            os.utime(cache.entry_path(key), (index, index))
+        os.utime(cache.entry_path(keys[0]), (10, 10))
+
+        cache.max_size = entry_size * 2
+        removed = cache.evict()
+        self.assertEqual(removed, [keys[1]])
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestGridCache, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,156 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Grid Model Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import unittest
+
+import numpy
+
+from realtime.earthquake.grid_model import GridModel, read_grid_header
+from realtime.exceptions import GridXmlParseError
+from safe.common.utilities import temp_dir, unique_filename
+from safe.test.utilities import standard_data_path
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+# Shake ID for this test
+SHAKE_ID = '20131105060809'
+
+SMALL_GRID = """<?xml version="1.0" encoding="US-ASCII" standalone="yes"?>
+<shakemap_grid xmlns="http://earthquake.usgs.gov/eqcenter/shakemap"
+ event_id="20150101000000" shakemap_version="1">
+<event magnitude="6.5" depth="10" lat="-1.000000" lon="120.000000"
+ event_timestamp="2015-01-01T00:00:00WIB" event_network=""
+ event_description="Sulawesi " />
+<grid_specification lon_min="119.000000" lat_min="-2.000000"
+ lon_max="121.000000" lat_max="0.000000" nominal_lon_spacing="1.000000"
+ nominal_lat_spacing="1.000000" nlon="3" nlat="3" />
+<grid_field index="1" name="LON" units="dd" />
+<grid_field index="2" name="LAT" units="dd" />
+<grid_field index="3" name="PGA" units="pctg" />
+<grid_field index="4" name="MMI" units="intensity" />
+<grid_data>
+119.0000 0.0000 1.1 2.1
+120.0000 0.0000 1.2 2.2
+121.0000 0.0000 1.3 2.3
+119.0000 -1.0000 2.1 3.1
+120.0000 -1.0000 2.2 6.5
+121.0000 -1.0000 2.3 3.3
+119.0000 -2.0000 3.1 4.1
+120.0000 -2.0000 3.2 4.2
+121.0000 -2.0000 3.3 4.3
+</grid_data>
+</shakemap_grid>
+"""
+
+
+def write_grid(content):
+    """Write grid content to a temporary grid.xml and return its path."""
+    path = unique_filename(
+        prefix='grid', suffix='.xml', dir=temp_dir('test'))
+    with open(path, 'w') as grid_file:
+        grid_file.write(content)
+    return path
+
+
+class TestGridModel(unittest.TestCase):
+    """Tests for the numpy grid.xml reader."""
+
+    def test_from_file(self):
+        """Test we can read the header and the body of a grid.xml."""
+        grid_model = GridModel.from_file(write_grid(SMALL_GRID))
+        self.assertEqual(grid_model.event_id, '20150101000000')
+        self.assertEqual(grid_model.magnitude, 6.5)
+        self.assertEqual(grid_model.location, 'Sulawesi')
+        self.assertEqual(grid_model.rows, 3)
+        self.assertEqual(grid_model.columns, 3)
+        self.assertEqual(grid_model.fields, ['LON', 'LAT', 'PGA', 'MMI'])
+        self.assertEqual(grid_model.point_count, 9)
+        self.assertEqual(grid_model.mmi.dtype, numpy.float64)
+        numpy.testing.assert_allclose(
+            grid_model.pga, [1.1, 1.2, 1.3, 2.1, 2.2, 2.3, 3.1, 3.2, 3.3])
+        self.assertEqual(grid_model.grid('mmi')[1, 1], 6.5)
+        self.assertEqual(grid_model.grid('mmi')[2, 0], 4.1)
+
+    def test_incomplete_grid(self):
+        """Test missing points are NaN in the two dimensional grid."""
+        lines = SMALL_GRID.splitlines(True)
+        # Drop the south west point
+        content = ''.join(
+            line for line in lines if not line.startswith('119.0000 -2.0'))
+        grid_model = GridModel.from_file(write_grid(content))
+        self.assertEqual(grid_model.point_count, 8)
+        grid = grid_model.grid('MMI')
+        self.assertTrue(numpy.isnan(grid[2, 0]))
+        self.assertEqual(grid[2, 1], 4.2)
+
+    def test_sample(self):
+        """Test sampling the grid like a pixel lookup on the mmi raster."""
+        grid_model = GridModel.from_file(write_grid(SMALL_GRID))
+        values = grid_model.sample(
+            [120.0, 119.1, 120.9, 119.7, 121.0, 125.0],
+            [-1.0, -0.1, -1.9, -0.9, -2.0, -1.0])
+        numpy.testing.assert_allclose(
+            values, [6.5, 2.1, 4.3, 6.5, 4.3, 0.0])
+        self.assertEqual(grid_model.sample([], []).size, 0)
+
+    def test_data_hash(self):
+        """Test the data hash only depends on the grid values."""
+        data_hash = GridModel.from_file(write_grid(SMALL_GRID)).data_hash
+        republished = SMALL_GRID.replace(
+            'shakemap_version="1"', 'shakemap_version="2"')
+        self.assertEqual(
+            GridModel.from_file(write_grid(republished)).data_hash, data_hash)
+        changed = SMALL_GRID.replace('6.5\n', '6.6\n')
+        self.assertNotEqual(
+            GridModel.from_file(write_grid(changed)).data_hash, data_hash)
+
+    def test_read_grid_header(self):
+        """Test we can read only the header of a grid.xml."""
+        grid_attributes, event, specification, fields = read_grid_header(
+            write_grid(SMALL_GRID))
+        self.assertEqual(grid_attributes['event_id'], '20150101000000')
+        self.assertEqual(event['magnitude'], '6.5')
+        self.assertEqual(specification['nlon'], '3')
+        self.assertEqual(fields, ['LON', 'LAT', 'PGA', 'MMI'])
+
+    def test_invalid_grid(self):
+        """Test a broken grid.xml raises GridXmlParseError."""
+        content = SMALL_GRID.replace('4.3\n', '')
+        self.assertRaises(
+            GridXmlParseError, GridModel.from_file, write_grid(content))
+        self.assertRaises(
+            GridXmlParseError, GridModel.from_file, write_grid('<foo>'))
+
+    def test_shakemap_fixture(self):
+        """Test reading the standard shakemap fixture."""
+        grid_path = standard_data_path(
+            'hazard', 'shake_data', SHAKE_ID, 'output', 'grid.xml')
+        self.assertTrue(os.path.exists(grid_path))
+        grid_model = GridModel.from_file(grid_path)
+        self.assertEqual(grid_model.event_id, SHAKE_ID)
+        self.assertEqual(grid_model.magnitude, 3.6)
+        self.assertEqual(grid_model.longitude, 140.62)
+        self.assertEqual(grid_model.latitude, -2.43)
+        self.assertEqual(grid_model.location, 'Papua')
+        self.assertEqual(grid_model.x_minimum, 139.37)
+        self.assertEqual(grid_model.y_minimum, -3.67875)
+        self.assertEqual(grid_model.point_count, 101 * 101)
+        self.assertEqual(grid_model.grid().shape, (101, 101))
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestGridModel, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
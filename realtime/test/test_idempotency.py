@@ -0,0 +1,125 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Idempotency Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import threading
+import time
+import unittest
+
+from realtime import idempotency
+from realtime.idempotency import (
+    IdempotencyStore,
+    file_hash,
+    idempotency_key,
+    lease_released)
+from safe.common.utilities import temp_dir, unique_filename
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class TestIdempotency(unittest.TestCase):
+    """Tests for the idempotent submission of the realtime tasks."""
+
+    def setUp(self):
+        self.directory = unique_filename(dir=temp_dir('test'))
+        self.store = IdempotencyStore(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_idempotency_key(self):
+        """Test the key changes with the event and its input."""
+        grid_path = os.path.join(self.directory, 'grid.xml')
+        with open(grid_path, 'w') as grid_file:
+            grid_file.write('<shakemap_grid/>')
+        grid_hash = file_hash(grid_path)
+        key = idempotency_key('20150918201057', grid_hash)
+        self.assertEqual(key, idempotency_key('20150918201057', grid_hash))
+        self.assertNotEqual(key, idempotency_key('20150918201057', None))
+        self.assertNotEqual(key, idempotency_key('20150918201058', grid_hash))
+
+        with open(grid_path, 'a') as grid_file:
+            grid_file.write('\n')
+        self.assertNotEqual(grid_hash, file_hash(grid_path))
+        self.assertIsNone(file_hash(grid_path + '.missing'))
+
+    def test_claim(self):
+        """Test duplicates attach to the task in flight until released."""
+        key = idempotency_key('20150918201057')
+        self.assertEqual(self.store.claim(key, 'first'), 'first')
+        self.assertEqual(self.store.claim(key, 'second'), 'first')
+        self.assertEqual(self.store.in_flight(key)['task_id'], 'first')
+
+        # Only the task holding the lease releases it
+        self.store.release(key, 'second')
+        self.assertEqual(self.store.claim(key, 'third'), 'first')
+        self.store.release(key, 'first')
+        self.assertIsNone(self.store.in_flight(key))
+        self.assertEqual(self.store.claim(key, 'third'), 'third')
+
+    def test_expired_lease(self):
+        """Test an expired lease is claimed again."""
+        store = IdempotencyStore(self.directory, lease_seconds=-1)
+        key = idempotency_key('20150918201057')
+        self.assertEqual(store.claim(key, 'first'), 'first')
+        self.assertIsNone(store.in_flight(key))
+        self.assertEqual(store.claim(key, 'second'), 'second')
+
+    def test_lease_released(self):
+        """Test the render task releases its lease even if it raises."""
+        old_store = idempotency.idempotency_store
+        idempotency.idempotency_store = lambda hazard: self.store
+        try:
+            key = idempotency_key('20150918201057')
+            self.store.claim(key, 'render')
+            with self.assertRaises(ValueError):
+                with lease_released('earthquake', key, 'render'):
+                    raise ValueError()
+            self.assertIsNone(self.store.in_flight(key))
+
+            # A render task called without a lease
+            with lease_released('earthquake', None, 'render'):
+                pass
+        finally:
+            idempotency.idempotency_store = old_store
+
+    def test_lock(self):
+        """Test the holders of the lock of a key take turns."""
+        events = []
+        locked = threading.Event()
+
+        def hold():
+            with self.store.lock('20150918201057'):
+                locked.set()
+                time.sleep(0.2)
+                events.append('first')
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        self.assertTrue(locked.wait(5))
+        with self.store.lock('20150918201057'):
+            events.append('second')
+        thread.join()
+        self.assertEqual(events, ['first', 'second'])
+
+        # Other keys do not wait
+        with self.store.lock('20150918201058'):
+            pass
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestIdempotency, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,98 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Impact Cache Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import time
+import unittest
+
+from realtime.earthquake.impact_cache import ImpactCache, impact_key
+from safe.common.utilities import temp_dir, unique_filename
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class TestImpactCache(unittest.TestCase):
+    """Tests for the impact result cache."""
+
+    def setUp(self):
+        self.cache_dir = os.path.join(temp_dir('test'), 'impact-cache')
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.tif_path = unique_filename(suffix='.tif', dir=temp_dir('test'))
+        self.keywords_path = self.tif_path.replace('.tif', '.xml')
+        with open(self.tif_path, 'w') as tif_file:
+            tif_file.write('impact')
+        with open(self.keywords_path, 'w') as keywords_file:
+            keywords_file.write('<keywords />')
+        self.keywords = {
+            'fatalities_per_mmi': {2: 0.0, 8: 12.5},
+            'exposed_per_mmi': {2: 100.0, 8: 700.0},
+            'displaced_per_mmi': {2: 0.0, 8: 72.0},
+            'total_fatalities': 10,
+            'total_population': 800.0}
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_impact_key(self):
+        """Test every fingerprint is part of the key."""
+        key = impact_key('grid', 'population', 'nearest', 'native')
+        self.assertEqual(
+            key, impact_key('grid', 'population', 'nearest', 'native'))
+        self.assertNotEqual(
+            key, impact_key('grid2', 'population', 'nearest', 'native'))
+        self.assertNotEqual(
+            key, impact_key('grid', 'population2', 'nearest', 'native'))
+        self.assertNotEqual(
+            key, impact_key('grid', 'population', 'invdist', 'native'))
+
+    def test_get_put(self):
+        """Test a stored result is copied back with int mmi keys."""
+        cache = ImpactCache(self.cache_dir)
+        tif_path = unique_filename(suffix='.tif', dir=temp_dir('test'))
+        keywords_path = tif_path.replace('.tif', '.xml')
+        self.assertIsNone(cache.get('key', tif_path, keywords_path))
+
+        cache.put('key', self.keywords, self.tif_path, self.keywords_path)
+        result = cache.get('key', tif_path, keywords_path)
+        self.assertEqual(result['fatalities_per_mmi'], {2: 0.0, 8: 12.5})
+        self.assertEqual(result['exposed_per_mmi'][8], 700.0)
+        self.assertEqual(result['displaced_per_mmi'][8], 72.0)
+        self.assertEqual(result['total_fatalities'], 10)
+        with open(tif_path) as tif_file:
+            self.assertEqual(tif_file.read(), 'impact')
+        self.assertTrue(os.path.exists(keywords_path))
+
+        # Only the counts are loaded when no path is given
+        self.assertEqual(
+            cache.get('key')['exposed_per_mmi'], {2: 100.0, 8: 700.0})
+
+    def test_evict(self):
+        """Test the least recently used entries are removed."""
+        cache = ImpactCache(self.cache_dir, max_entries=2)
+        for key in ['a', 'b']:
+            cache.put(key, self.keywords, self.tif_path, self.keywords_path)
+        # Make 'a' the least recently used one
+        old_time = time.time() - 100
+        os.utime(cache.entry_path('a'), (old_time, old_time))
+        cache.put('c', self.keywords, self.tif_path, self.keywords_path)
+        self.assertFalse(os.path.exists(cache.entry_path('a')))
+        self.assertTrue(os.path.exists(cache.entry_path('b')))
+        self.assertTrue(os.path.exists(cache.entry_path('c')))
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestImpactCache, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
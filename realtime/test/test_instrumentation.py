@@ -0,0 +1,141 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Instrumentation Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import json
+import os
+import shutil
+import unittest
+
+from realtime.instrumentation import (
+    EventMetrics,
+    timed,
+    write_queue_metrics)
+from safe.common.utilities import temp_dir
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class Event(object):
+    """An object timing its methods with the timed decorator."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    @timed('impact')
+    def analyse(self, value):
+        return value * 2
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Tests for the event processing metrics."""
+
+    def setUp(self):
+        self.metrics_dir = os.path.join(temp_dir('test'), 'metrics')
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        os.makedirs(self.metrics_dir)
+        self.old_value = os.environ.pop('INASAFE_REALTIME_METRICS_DIR', None)
+
+    def tearDown(self):
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        os.environ.pop('INASAFE_REALTIME_METRICS_DIR', None)
+        if self.old_value is not None:
+            os.environ['INASAFE_REALTIME_METRICS_DIR'] = self.old_value
+
+    def test_stage(self):
+        """Test stages run several times are added up."""
+        metrics = EventMetrics('earthquake', '20150101000000')
+        for _ in range(2):
+            with metrics.stage('contours'):
+                sum(range(1000))
+        try:
+            with metrics.stage('push'):
+                raise IOError()
+        except IOError:
+            pass
+
+        self.assertEqual(metrics.stages.keys(), ['contours', 'push'])
+        self.assertEqual(metrics.stages['contours']['calls'], 2)
+        self.assertEqual(metrics.stages['push']['calls'], 1)
+        self.assertGreaterEqual(metrics.stages['contours']['wall_seconds'], 0)
+        self.assertGreater(metrics.stages['contours']['peak_rss_bytes'], 0)
+
+    def test_stage_peak_rss(self):
+        """Test the peak RSS is measured per stage."""
+        metrics = EventMetrics('earthquake')
+        with metrics.stage('large'):
+            block = ' ' * (64 * 1024 * 1024)
+            with metrics.stage('nested'):
+                pass
+            del block
+        with metrics.stage('small'):
+            pass
+        large = metrics.stages['large']['peak_rss_bytes']
+        small = metrics.stages['small']['peak_rss_bytes']
+        self.assertGreater(large, 64 * 1024 * 1024)
+        self.assertLess(small, large - 32 * 1024 * 1024)
+        self.assertLessEqual(
+            metrics.stages['nested']['peak_rss_bytes'], large)
+        self.assertGreaterEqual(
+            metrics.as_dict()['process_peak_rss_bytes'], large)
+
+    def test_timed(self):
+        """Test the decorator records the stage in the instance metrics."""
+        event = Event(EventMetrics('earthquake'))
+        self.assertEqual(event.analyse(2), 4)
+        self.assertEqual(event.metrics.stages['impact']['calls'], 1)
+        # Methods still work without metrics
+        self.assertEqual(Event(None).analyse(3), 6)
+
+    def test_write(self):
+        """Test the json file and the Prometheus textfile."""
+        os.environ['INASAFE_REALTIME_METRICS_DIR'] = self.metrics_dir
+        metrics = EventMetrics('flood', 'event')
+        with metrics.stage('impact'):
+            pass
+        path = metrics.write(self.metrics_dir)
+
+        with open(path) as metrics_file:
+            content = json.loads(metrics_file.read())
+        self.assertEqual(content['event_id'], 'event')
+        self.assertEqual(content['stages']['impact']['calls'], 1)
+
+        with open(os.path.join(
+                self.metrics_dir, 'inasafe_realtime_flood.prom')) as prom:
+            lines = prom.read().splitlines()
+        self.assertIn(
+            '# TYPE inasafe_realtime_stage_wall_seconds gauge', lines)
+        self.assertIn(
+            'inasafe_realtime_stage_calls{hazard="flood",stage="impact"} 1',
+            lines)
+
+    def test_write_queue_metrics(self):
+        """Test the queue depths are published."""
+        depths = {'render': (3, 1), 'missing': None}
+        self.assertIsNone(write_queue_metrics(depths))
+
+        os.environ['INASAFE_REALTIME_METRICS_DIR'] = self.metrics_dir
+        path = write_queue_metrics(depths)
+        with open(path) as prom:
+            lines = prom.read().splitlines()
+        self.assertIn(
+            'inasafe_realtime_queue_messages{queue="render"} 3', lines)
+        self.assertIn(
+            'inasafe_realtime_queue_consumers{queue="render"} 1', lines)
+        self.assertFalse([line for line in lines if 'missing' in line])
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestInstrumentation, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,89 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **ITB Fatality Model Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import unittest
+
+import numpy
+
+from realtime.earthquake.itb_fatality import (
+    IMPACT_FUNCTION_ENGINE,
+    NATIVE_IMPACT_ENGINE,
+    fatality_rate,
+    impact_engine,
+    itb_fatality,
+    mmi_bands)
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class TestITBFatality(unittest.TestCase):
+    """Tests for the in process ITB fatality model."""
+
+    def test_fatality_rate(self):
+        """Test the ITB power model and the MMI 4 threshold."""
+        self.assertEqual(fatality_rate(3.9), 0)
+        self.assertAlmostEqual(
+            fatality_rate(8), 10 ** (0.62275231 * 8 - 8.03314466))
+        numpy.testing.assert_allclose(
+            fatality_rate([2, 9]), [0, 10 ** (0.62275231 * 9 - 8.03314466)])
+
+    def test_mmi_bands(self):
+        """Test cells are put in the (mmi - 0.5, mmi + 0.5] bands."""
+        numpy.testing.assert_array_equal(
+            mmi_bands([1.5, 1.51, 2.5, 2.51, 10.5, 10.6, numpy.nan]),
+            [-1, 2, 2, 3, 10, -1, -1])
+
+    def test_itb_fatality(self):
+        """Test the counts per MMI band."""
+        mmi = numpy.array([[2.2, 4.1, 8.0], [8.4, 1.0, numpy.nan]])
+        population = numpy.array([[100, 200, 300], [400, 500, numpy.nan]])
+        result = itb_fatality(mmi, population)
+
+        self.assertEqual(
+            sorted(result['exposed_per_mmi'].keys()), range(2, 11))
+        self.assertEqual(result['exposed_per_mmi'][2], 100)
+        self.assertEqual(result['exposed_per_mmi'][4], 200)
+        self.assertEqual(result['exposed_per_mmi'][8], 700)
+        self.assertEqual(result['exposed_per_mmi'][9], 0)
+        self.assertEqual(result['total_population'], 1000)
+
+        fatalities = 700 * fatality_rate(8)
+        self.assertAlmostEqual(result['fatalities_per_mmi'][8], fatalities)
+        self.assertEqual(result['fatalities_per_mmi'][2], 0)
+        self.assertAlmostEqual(
+            result['displaced_per_mmi'][8], 0.1045 * (700 - fatalities))
+        self.assertAlmostEqual(
+            result['total_fatalities_raw'],
+            fatalities + 200 * fatality_rate(4))
+
+    def test_impact_engine(self):
+        """Test the impact engine switch."""
+        old_value = os.environ.pop('INASAFE_REALTIME_IMPACT_ENGINE', None)
+        try:
+            self.assertEqual(impact_engine(), IMPACT_FUNCTION_ENGINE)
+            os.environ['INASAFE_REALTIME_IMPACT_ENGINE'] = 'native'
+            self.assertEqual(impact_engine(), NATIVE_IMPACT_ENGINE)
+            os.environ['INASAFE_REALTIME_IMPACT_ENGINE'] = 'unknown'
+            self.assertEqual(impact_engine(), IMPACT_FUNCTION_ENGINE)
+        finally:
+            os.environ.pop('INASAFE_REALTIME_IMPACT_ENGINE', None)
+            if old_value is not None:
+                os.environ['INASAFE_REALTIME_IMPACT_ENGINE'] = old_value
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestITBFatality, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,159 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Earthquake Make Map Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import unittest
+
+from realtime.earthquake import make_map
+from realtime.earthquake.make_map import (
+    ShakeEventHandle,
+    create_shake_events,
+    list_events,
+    process_handles)
+from realtime.exceptions import EmptyShakeDirectoryError
+from realtime.instrumentation import EventMetrics
+from safe.common.utilities import temp_dir
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class FakeShakeEvent(object):
+    """Shake event recording the calls of process_handles."""
+
+    def __init__(self, event_id):
+        self.metrics = EventMetrics('earthquake', event_id)
+        self.calls = []
+        self.locale = None
+
+    def set_locale(self, locale):
+        self.locale = locale
+
+    def prepare_report(self, force_flag=False):
+        self.calls.append(('prepare_report', self.locale, force_flag))
+
+
+class FakeHandle(ShakeEventHandle):
+    """Handle materializing a FakeShakeEvent, or failing to."""
+
+    def __init__(self, working_dir, event_id, error=None):
+        ShakeEventHandle.__init__(self, working_dir, event_id)
+        self.error = error
+        self.released = False
+
+    def _create(self, force_flag):
+        if self.error is not None:
+            raise self.error
+        return FakeShakeEvent(self.event_id)
+
+    def event_dir(self):
+        return os.path.join(self.working_dir, self.event_id)
+
+    def release(self):
+        self.shake_event = self._shake_event
+        self.released = True
+        ShakeEventHandle.release(self)
+
+
+class TestMakeMap(unittest.TestCase):
+    """Tests for the earthquake event listing."""
+
+    def setUp(self):
+        self.working_dir = os.path.join(temp_dir('test'), 'shakemaps')
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+        # Two events of a burst and two older events
+        for event_id in [
+                '20150918200900', '20150918201057', '20150918201011',
+                '20150917101057']:
+            os.makedirs(os.path.join(self.working_dir, event_id))
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_create_shake_events(self):
+        """Test the events are listed without being parsed."""
+        shake_events = create_shake_events(
+            population_path='/does/not/exist.tif',
+            working_dir=self.working_dir,
+            locale='id')
+        self.assertEqual(
+            [shake_event.event_id for shake_event in shake_events],
+            ['20150918201057', '20150918201011'])
+        for shake_event in shake_events:
+            self.assertIsInstance(shake_event, ShakeEventHandle)
+            self.assertIsNone(shake_event.population_path)
+            self.assertEqual(shake_event.locale, 'id')
+        # Nothing is extracted nor parsed until the event is processed
+        self.assertIsNone(shake_events[0]._shake_event)
+
+    def test_create_shake_event(self):
+        """Test an event can be picked by id."""
+        shake_events = create_shake_events(
+            event_id='20150917101057',
+            population_path='/does/not/exist.tif',
+            working_dir=self.working_dir)
+        self.assertEqual(
+            [shake_event.event_id for shake_event in shake_events],
+            ['20150917101057'])
+
+    def test_create_shake_events_empty(self):
+        """Test an empty working dir has no events to process."""
+        empty_dir = os.path.join(self.working_dir, 'empty')
+        os.makedirs(empty_dir)
+        self.assertEqual(
+            create_shake_events(
+                population_path='/does/not/exist.tif',
+                working_dir=empty_dir),
+            [])
+
+    def test_list_events_errors(self):
+        """Test only an empty directory is nothing to process."""
+        def failing_index(working_dir):
+            raise IOError('Unreadable event index')
+
+        old_event_index = make_map.event_index
+        make_map.event_index = failing_index
+        try:
+            self.assertRaises(
+                IOError, list_events, self.working_dir, None, 'en', False,
+                None)
+        finally:
+            make_map.event_index = old_event_index
+
+    def test_process_handles_analysis(self):
+        """Test the analysis only prepares the reports of every locale."""
+        handles = [
+            FakeHandle(self.working_dir, '20150918201057'),
+            FakeHandle(
+                self.working_dir,
+                '20150918201011',
+                EmptyShakeDirectoryError('No grid')),
+            FakeHandle(self.working_dir, '20150918200900', ValueError())]
+        event_ids, setup_failed = process_handles(
+            handles, ['id', 'en'], force_flag=True, render_flag=False)
+        self.assertEqual(event_ids, ['20150918201057'])
+        self.assertTrue(setup_failed)
+        self.assertEqual(handles[0].shake_event.calls, [
+            ('prepare_report', 'id', True),
+            ('prepare_report', 'en', True)])
+        self.assertTrue(handles[0].released)
+        # The metrics of the analysis are kept apart in the event directory
+        self.assertTrue(os.path.exists(os.path.join(
+            self.working_dir, '20150918201057', 'metrics-analysis.json')))
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestMakeMap, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,122 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Composition Rendering Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import shutil
+import time
+import unittest
+
+from PyQt4.QtCore import QSize
+from PyQt4.QtGui import QImage
+from qgis.core import QgsMapLayerRegistry
+
+from safe.common.utilities import temp_dir, unique_filename
+from safe.test.utilities import get_qgis_app
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+from realtime.rendering import (
+    SINGLE_PASS_RENDER_MODE,
+    TWO_PASS_RENDER_MODE,
+    RenderContext,
+    render_mode,
+    save_thumbnail)
+from realtime.utilities import data_dir
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class TestRendering(unittest.TestCase):
+    """Tests for the export of map compositions."""
+
+    def test_render_mode(self):
+        """Test the render mode switch."""
+        old_value = os.environ.pop('INASAFE_REALTIME_RENDER_MODE', None)
+        try:
+            self.assertEqual(render_mode(), TWO_PASS_RENDER_MODE)
+            os.environ['INASAFE_REALTIME_RENDER_MODE'] = 'single_pass'
+            self.assertEqual(render_mode(), SINGLE_PASS_RENDER_MODE)
+            os.environ['INASAFE_REALTIME_RENDER_MODE'] = 'unknown'
+            self.assertEqual(render_mode(), TWO_PASS_RENDER_MODE)
+        finally:
+            os.environ.pop('INASAFE_REALTIME_RENDER_MODE', None)
+            if old_value is not None:
+                os.environ['INASAFE_REALTIME_RENDER_MODE'] = old_value
+
+    def test_save_thumbnail(self):
+        """Test the thumbnail covers 200 x 200 keeping the aspect ratio."""
+        image = QImage(QSize(1200, 800), QImage.Format_ARGB32)
+        image.fill(0)
+        thumbnail_path = unique_filename(
+            prefix='thumb', suffix='.png', dir=temp_dir('test'))
+        save_thumbnail(image, thumbnail_path)
+        thumbnail = QImage(thumbnail_path)
+        self.assertEqual(thumbnail.size(), QSize(300, 200))
+
+
+class TestRenderContext(unittest.TestCase):
+    """Tests for the per process render context."""
+
+    def setUp(self):
+        self.context = RenderContext()
+
+    def tearDown(self):
+        self.context.reset()
+
+    def test_template_document(self):
+        """Test templates are parsed again only when they change."""
+        template_path = os.path.join(data_dir(), 'realtime-template.qpt')
+        copy_path = unique_filename(suffix='.qpt', dir=temp_dir('test'))
+        shutil.copyfile(template_path, copy_path)
+        document = self.context.template_document(copy_path)
+        self.assertFalse(document.isNull())
+        self.assertIs(self.context.template_document(copy_path), document)
+
+        new_time = time.time() + 10
+        os.utime(copy_path, (new_time, new_time))
+        self.assertIsNot(self.context.template_document(copy_path), document)
+
+    def test_reset(self):
+        """Test reset keeps the static and the project layers."""
+        # noinspection PyArgumentList
+        registry = QgsMapLayerRegistry.instance()
+        project_path = os.path.join(data_dir(), 'realtime.qgs')
+        self.context.reset(project_path)
+        self.context.load_project(project_path)
+        project_layer_ids = set(self.context.project_layer_ids)
+        self.assertTrue(project_layer_ids)
+
+        places_path = os.path.join(data_dir(), 'context', 'places.shp')
+        places_layer = self.context.static_layer(places_path, 'Places')
+        self.assertIs(
+            self.context.static_layer(places_path, 'Places'), places_layer)
+        self.context.add_static_layer(places_layer)
+
+        self.context.reset(project_path)
+        self.assertEqual(set(registry.mapLayers().keys()), project_layer_ids)
+        # The static layer is still usable after its removal
+        self.assertTrue(places_layer.isValid())
+        self.context.add_static_layer(places_layer)
+        self.assertIn(places_layer.id(), registry.mapLayers())
+
+        self.context.reset()
+        self.assertEqual(registry.mapLayers(), {})
+        self.assertIsNone(self.context.project_key)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestRendering, 'test'),
+        unittest.makeSuite(TestRenderContext, 'test')])
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,134 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Task Routing Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import unittest
+
+from realtime.routing import (
+    HAZARDS,
+    MAX_PRIORITY,
+    RENDER_QUEUE,
+    compute_concurrency,
+    compute_queue,
+    queue_depths,
+    queue_names,
+    shake_priority,
+    task_priority)
+from safe.common.utilities import unique_filename
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+GRID_XML = """<?xml version="1.0" encoding="US-ASCII" standalone="yes"?>
+<shakemap_grid xmlns="http://earthquake.usgs.gov/eqcenter/shakemap" \
+event_id="20150918201057" shakemap_id="20150918201057">
+<event event_id="20150918201057" magnitude="%s" depth="10.0" lat="-7.5" \
+lon="107.0" event_timestamp="2015-09-18T20:10:57WIB" />
+<grid_specification lon_min="106.0" lat_min="-8.5" lon_max="108.0" \
+lat_max="-6.5" nominal_lon_spacing="1.0" nominal_lat_spacing="1.0" \
+nlon="3" nlat="3" />
+<grid_field index="1" name="LON" units="dd" />
+<grid_field index="2" name="LAT" units="dd" />
+<grid_field index="3" name="MMI" units="intensity" />
+<grid_data>
+106.0 -6.5 3.0
+</grid_data>
+</shakemap_grid>
+"""
+
+
+class FakeChannel(object):
+    """Channel answering passive queue declarations from a dict."""
+
+    def __init__(self, queues):
+        self.queues = queues
+
+    def queue_declare(self, queue, passive=False):
+        if queue not in self.queues:
+            raise KeyError(queue)
+        messages, consumers = self.queues[queue]
+        return queue, messages, consumers
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+    """Connection to a broker holding some queues."""
+
+    channel_errors = (KeyError, )
+
+    def __init__(self, queues):
+        self.queues = queues
+
+    def channel(self):
+        return FakeChannel(self.queues)
+
+
+class TestRouting(unittest.TestCase):
+    """Tests for the queues and priorities of the realtime tasks."""
+
+    def test_task_priority(self):
+        """Test earthquakes come before ash and ash before floods."""
+        self.assertGreater(
+            task_priority('earthquake'), task_priority('ash'))
+        self.assertGreater(task_priority('ash'), task_priority('flood'))
+        # Stronger shakes first
+        self.assertEqual(
+            task_priority('earthquake', 4.5), task_priority('earthquake'))
+        self.assertGreater(
+            task_priority('earthquake', 7.1),
+            task_priority('earthquake', 6.2))
+        self.assertEqual(task_priority('earthquake', 9.0), MAX_PRIORITY)
+
+    def test_shake_priority(self):
+        """Test the priority of a shake is read from its grid header."""
+        grid_path = unique_filename(suffix='.xml')
+        try:
+            with open(grid_path, 'w') as grid_file:
+                grid_file.write(GRID_XML % '7.2')
+            self.assertEqual(
+                shake_priority(grid_path), task_priority('earthquake', 7.2))
+        finally:
+            os.remove(grid_path)
+        # The base priority if the grid can not be read
+        self.assertEqual(
+            shake_priority('/does/not/exist.xml'),
+            task_priority('earthquake'))
+
+    def test_compute_concurrency(self):
+        """Test the processors are shared by hazard weight."""
+        self.assertEqual(
+            [compute_concurrency(hazard, 8) for hazard in HAZARDS],
+            [5, 2, 1])
+        # Every hazard has a process
+        self.assertEqual(
+            [compute_concurrency(hazard, 1) for hazard in HAZARDS],
+            [1, 1, 1])
+
+    def test_queue_depths(self):
+        """Test the queue depths are read with passive declarations."""
+        connection = FakeConnection({
+            RENDER_QUEUE: (2, 1),
+            compute_queue('earthquake'): (0, 5)})
+        depths = queue_depths(connection)
+        self.assertEqual(sorted(depths.keys()), sorted(queue_names()))
+        self.assertEqual(depths[RENDER_QUEUE], (2, 1))
+        self.assertEqual(depths[compute_queue('earthquake')], (0, 5))
+        self.assertIsNone(depths[compute_queue('flood')])
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestRouting, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -20,6 +20,7 @@ __copyright__ = ('Copyright 2012, Australia Indonesia Facility for '
 
 import os
 import shutil
+import time
 import unittest
 
 from realtime.earthquake.shake_data import ShakeData
@@ -97,7 +98,56 @@ class ShakeDataTest(unittest.TestCase):
         self.assertTrue(
             os.path.exists(final_grid_xml_file), 'grid.xml not found')
 
+
+class ShakeDataExtractTest(unittest.TestCase):
+    """Tests reusing an extracted grid.xml."""
+
+    def setUp(self):
+        """Create an event with a small grid.xml."""
+        self.working_dir = os.path.join(temp_dir('realtime-test'), 'extract')
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+        output_dir = os.path.join(self.working_dir, SHAKE_ID, 'output')
+        os.makedirs(output_dir)
+        self.source_path = os.path.join(output_dir, 'grid.xml')
+        with open(self.source_path, 'w') as grid_file:
+            grid_file.write('<shakemap_grid />')
+        self.shake_data = ShakeData(
+            working_dir=self.working_dir, event=SHAKE_ID)
+        self.shake_data.remove_extracted_files()
+
+    def tearDown(self):
+        """Delete the event."""
+        self.shake_data.remove_extracted_files()
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_extract_reuse(self):
+        """Test the extraction is reused while the content is the same."""
+        grid_path = self.shake_data.extract()
+        self.assertTrue(os.path.exists(
+            self.shake_data.extract_manifest_path()))
+        self.assertTrue(
+            self.shake_data.is_extracted(self.source_path, grid_path))
+
+        # Touching the source only costs a hash
+        past = time.time() - 60
+        os.utime(self.source_path, (past, past))
+        self.assertTrue(
+            self.shake_data.is_extracted(self.source_path, grid_path))
+
+        # A new grid.xml is extracted again
+        os.remove(self.source_path)
+        with open(self.source_path, 'w') as grid_file:
+            grid_file.write('<shakemap_grid  />')
+        self.assertFalse(
+            self.shake_data.is_extracted(self.source_path, grid_path))
+        grid_path = self.shake_data.extract()
+        with open(grid_path) as grid_file:
+            self.assertEqual(grid_file.read(), '<shakemap_grid  />')
+
+
 if __name__ == '__main__':
-    suite = unittest.makeSuite(ShakeDataTest, 'test')
+    suite = unittest.TestSuite([
+        unittest.makeSuite(ShakeDataTest, 'test'),
+        unittest.makeSuite(ShakeDataExtractTest, 'test')])
     runner = unittest.TextTestRunner(verbosity=2)
     runner.run(suite)
@@ -39,7 +39,9 @@ from realtime.utilities import (
     realtime_logger_name)
 from safe.common.utilities import temp_dir, unique_filename
 from safe.common.version import get_version
+from safe.storage.core import read_qgis_layer
 from safe.test.utilities import standard_data_path, get_qgis_app
+from safe.utilities.keyword_io import KeywordIO
 
 # The logger is initialised in realtime.__init__
 LOGGER = logging.getLogger(realtime_logger_name())
@@ -264,6 +266,61 @@ class TestShakeEvent(unittest.TestCase):
         self.assertDictEqual(
             shake_event.fatality_counts, expected_fatalities, message)
 
+    def test_native_impacts_parity(self):
+        """Test the native engine gives the counts of the impact function.
+
+        The native engine samples the grid at the centre of every
+        population cell while the impact function resamples the mmi
+        raster, so a small difference of the counts is tolerated.
+        """
+        working_dir = shakemap_extract_dir()
+        shake_event = ShakeEvent(
+            working_dir=working_dir,
+            event_id=SHAKE_ID_2,
+            data_is_local_flag=True)
+        exposure_path = shake_event._get_population_path()
+
+        def read_back(tif_path):
+            # Before the next engine overwrites the impact layer
+            return KeywordIO().read_keywords(
+                read_qgis_layer(tif_path, 'Impact'))
+
+        tif_path, _, native_keywords = shake_event.native_impacts(
+            exposure_path, 'nearest')
+        native_layer_keywords = read_back(tif_path)
+        tif_path, _, _ = shake_event.impact_function_impacts(
+            exposure_path, False, 'nearest')
+        expected_keywords = read_back(tif_path)
+
+        def counts(keywords, key):
+            return dict(
+                (int(mmi), float(count))
+                for mmi, count in keywords[key].items())
+
+        def assert_close(value, expected, message):
+            self.assertAlmostEqual(
+                value, expected,
+                delta=max(1.0, 0.01 * abs(expected)), msg=message)
+
+        for keywords in [native_keywords, native_layer_keywords]:
+            for key in [
+                    'exposed_per_mmi',
+                    'fatalities_per_mmi',
+                    'displaced_per_mmi']:
+                expected = counts(expected_keywords, key)
+                native = counts(keywords, key)
+                self.assertEqual(
+                    sorted(native.keys()), sorted(expected.keys()))
+                for mmi in expected:
+                    assert_close(
+                        native[mmi], expected[mmi],
+                        '%s[%s]: %s != %s' % (
+                            key, mmi, native[mmi], expected[mmi]))
+            assert_close(
+                float(keywords['total_fatalities']),
+                float(expected_keywords['total_fatalities']),
+                'total_fatalities')
+
     def test_sorted_impacted_cities(self):
         """Test getting impacted cities sorted by mmi then population."""
         working_dir = shakemap_extract_dir()
@@ -411,9 +468,9 @@ class TestShakeEvent(unittest.TestCase):
             'mmi': '3.6',
             'map-name': u'Estimated Earthquake Impact',
             'date': '5-11-2013',
-            'bearing-degrees': '-28.72\xb0',
+            'bearing-degrees': '-28.70\xb0',
             'formatted-date-time': '05-Nov-13 06:08:09 +0707',
-            'distance': '0.02',
+            'distance': '16.81',
             'direction-relation': u'of',
             'software-tag': software_tag,
             'credits': (
@@ -440,7 +497,7 @@ class TestShakeEvent(unittest.TestCase):
             u"M 3.6 5-11-2013 6:8:9 "
             u"Latitude: 2°25′48.00″S "
             u"Longitude: 140°37′12.00″E "
-            u"Depth: 10.0km Located 0.02km NNW of Papua")
+            u"Depth: 10.0km Located 16.81km NNW of Papua")
         result = shake_event.event_info()
         message = ('Got:\n%s\nExpected:\n%s\n' %
                    (result, expected_result))
@@ -94,7 +94,7 @@ class TestShakemapMonitoring(unittest.TestCase):
             self.assertEqual(kwargs.get('shake_id'), '20131105060809')
 
         handler = ShakemapPushHandler(
-            shakemap_folder, callback=process_shakemap_dummy)
+            shakemap_folder, callback=process_shakemap_dummy, debounce=1)
 
         notifier = watch_shakemaps_push(
             shakemap_folder, handler=handler, daemon=True)
@@ -113,3 +113,4 @@ class TestShakemapMonitoring(unittest.TestCase):
         # sleep to let inotify handles events
         time.sleep(5)
         notifier.stop()
+        handler.stop()
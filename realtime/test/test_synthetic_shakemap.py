@@ -0,0 +1,96 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Synthetic Shakemap Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import os
+import unittest
+
+import numpy
+# noinspection PyPackageRequirements
+from osgeo import gdal
+
+from realtime.earthquake.geonames_index import GeonamesIndex
+from realtime.earthquake.grid_model import GridModel
+from realtime.earthquake.synthetic_shakemap import (
+    synthetic_mmi,
+    write_synthetic_geonames,
+    write_synthetic_grid,
+    write_synthetic_population)
+from safe.common.utilities import temp_dir, unique_filename
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+class TestSyntheticShakemap(unittest.TestCase):
+    """Tests for the synthetic benchmark inputs."""
+
+    def test_synthetic_mmi(self):
+        """Test the intensity decreases away from the epicentre."""
+        mmi = synthetic_mmi(
+            numpy.array([120.0, 120.5, 121.0, 125.0]),
+            numpy.zeros(4), 7.0, 120.0, 0.0, 10.0)
+        self.assertTrue(numpy.all(numpy.diff(mmi) < 0))
+        self.assertTrue(numpy.all((mmi >= 1) & (mmi <= 10)))
+
+    def test_write_synthetic_grid(self):
+        """Test the synthetic grid is read like a BMKG grid."""
+        grid_path = unique_filename(
+            prefix='grid', suffix='.xml', dir=temp_dir('test'))
+        points = write_synthetic_grid(
+            grid_path, '20260101000001', 6.0, 1.0, 0.1,
+            longitude=120.0, latitude=-1.0)
+        grid_model = GridModel.from_file(grid_path)
+
+        self.assertEqual(points, 21 * 21)
+        self.assertEqual(grid_model.event_id, '20260101000001')
+        self.assertEqual(grid_model.magnitude, 6.0)
+        self.assertEqual(grid_model.rows, 21)
+        self.assertEqual(grid_model.columns, 21)
+        self.assertAlmostEqual(grid_model.x_minimum, 119.0)
+        self.assertAlmostEqual(grid_model.y_maximum, 0.0)
+        # Strongest shaking at the epicentre, in the middle of the grid
+        self.assertEqual(
+            numpy.nanargmax(grid_model.grid('mmi')), 10 * 21 + 10)
+
+    def test_write_synthetic_geonames(self):
+        """Test the synthetic places are loaded by the geonames index."""
+        sqlite_path = unique_filename(
+            prefix='geonames', suffix='.sqlite', dir=temp_dir('test'))
+        write_synthetic_geonames(
+            sqlite_path, longitude=120.0, latitude=-1.0, half_width=1.0,
+            count=50)
+        index = GeonamesIndex.from_sqlite(sqlite_path)
+        self.assertEqual(len(index), 50)
+        self.assertEqual(len(index.bbox(118.9, -2.1, 121.1, 0.1)), 50)
+
+    def test_write_synthetic_population(self):
+        """Test the synthetic population raster and its keywords."""
+        raster_path = unique_filename(
+            prefix='population', suffix='.tif', dir=temp_dir('test'))
+        write_synthetic_population(
+            raster_path, longitude=120.0, latitude=-1.0, half_width=0.5,
+            resolution=0.1)
+        self.assertTrue(os.path.exists(raster_path.replace('.tif', '.xml')))
+
+        dataset = gdal.Open(raster_path)
+        self.assertEqual(dataset.RasterXSize, 10)
+        self.assertEqual(dataset.RasterYSize, 10)
+        self.assertEqual(dataset.GetGeoTransform()[0], 119.5)
+        data = dataset.GetRasterBand(1).ReadAsArray()
+        self.assertTrue(numpy.all(data > 0))
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestSyntheticShakemap, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -32,6 +32,7 @@ from realtime.utilities import (
     is_event_id,
     purge_working_data,
     get_path_tail,
+    link_or_copy,
     realtime_logger_name)
 
 # Clear away working dirs so we can be sure they
@@ -123,5 +124,23 @@ class UtilsTest(unittest.TestCase):
         message = 'Expected %s, I got %s' % (expected_tail, actual_tail)
         self.assertEqual(expected_tail, actual_tail, message)
 
+    def test_link_or_copy(self):
+        """Test files are hard linked into place, replacing the target."""
+        source_path = os.path.join(base_data_dir(), 'link-source.txt')
+        target_path = os.path.join(base_data_dir(), 'link-target.txt')
+        with open(source_path, 'w') as source_file:
+            source_file.write('grid')
+        with open(target_path, 'w') as target_file:
+            target_file.write('old grid')
+        try:
+            linked = link_or_copy(source_path, target_path)
+            with open(target_path) as target_file:
+                self.assertEqual(target_file.read(), 'grid')
+            self.assertEqual(
+                linked, os.path.samefile(source_path, target_path))
+        finally:
+            os.remove(source_path)
+            os.remove(target_path)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,175 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Work Queue Test Cases.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import unittest
+
+from realtime.work_queue import DebouncedWorkQueue
+from safe.common.utilities import temp_dir, unique_filename
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+
+def wait_until(condition, timeout=5.0):
+    """Wait until a condition is true or the timeout expires."""
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestDebouncedWorkQueue(unittest.TestCase):
+    """Tests for the debounced work queue."""
+
+    def setUp(self):
+        self.calls = []
+        self.queue = None
+
+    def tearDown(self):
+        if self.queue is not None:
+            self.queue.stop(timeout=1)
+
+    def record(self, shake_id):
+        self.calls.append(shake_id)
+
+    def test_coalesce(self):
+        """Test a burst of events for a key runs the callback once."""
+        self.queue = DebouncedWorkQueue(self.record, debounce=0.1)
+        for _ in range(5):
+            self.queue.submit('20150918201057', shake_id='20150918201057')
+            time.sleep(0.02)
+        self.assertEqual(self.calls, [])
+        self.assertTrue(wait_until(self.queue.is_idle))
+        self.assertEqual(self.calls, ['20150918201057'])
+
+    def test_stable_size(self):
+        """Test a file still growing is not dispatched."""
+        path = unique_filename(
+            prefix='grid', suffix='.xml', dir=temp_dir('test'))
+        with open(path, 'w') as grid_file:
+            grid_file.write('<shakemap_grid')
+        self.queue = DebouncedWorkQueue(self.record, debounce=0.1)
+        self.queue.submit('a', path=path, shake_id='a')
+        # Written after the event, without a new event
+        time.sleep(0.05)
+        with open(path, 'a') as grid_file:
+            grid_file.write(' />')
+        time.sleep(0.1)
+        self.assertEqual(self.calls, [])
+        self.assertTrue(wait_until(self.queue.is_idle))
+        self.assertEqual(self.calls, ['a'])
+        os.remove(path)
+
+    def test_rerun_after_new_keys(self):
+        """Test a rerun of a running key waits behind new keys."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def process(shake_id):
+            self.calls.append(shake_id)
+            if shake_id == 'a' and len(self.calls) == 1:
+                started.set()
+                release.wait(5)
+
+        self.queue = DebouncedWorkQueue(process, debounce=0.05)
+        self.queue.submit('a', shake_id='a')
+        self.assertTrue(started.wait(5))
+        # Events for the running key are coalesced into one rerun
+        self.queue.submit('a', shake_id='a')
+        self.queue.submit('a', shake_id='a')
+        self.queue.submit('b', shake_id='b')
+        time.sleep(0.1)
+        release.set()
+        self.assertTrue(wait_until(self.queue.is_idle))
+        self.assertEqual(self.calls, ['a', 'b', 'a'])
+
+    def test_workers(self):
+        """Test no more jobs than workers run at the same time."""
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def process(shake_id):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            self.calls.append(shake_id)
+
+        self.queue = DebouncedWorkQueue(process, debounce=0.01, workers=2)
+        for key in 'abcde':
+            self.queue.submit(key, shake_id=key)
+        self.assertTrue(wait_until(self.queue.is_idle))
+        self.assertEqual(sorted(self.calls), list('abcde'))
+        self.assertEqual(running[1], 2)
+
+    def test_backoff(self):
+        """Test the delay doubles up to the maximum."""
+        self.queue = DebouncedWorkQueue(
+            self.record, retry_delay=10, max_retry_delay=60)
+        self.assertEqual(
+            [self.queue.backoff(attempts) for attempts in range(1, 6)],
+            [10, 20, 40, 60, 60])
+
+    def test_retry(self):
+        """Test a failing job is retried until it succeeds."""
+        def process(shake_id):
+            self.calls.append(shake_id)
+            if shake_id == 'a' and self.calls.count('a') < 3:
+                raise IOError('Not yet')
+
+        self.queue = DebouncedWorkQueue(
+            process, debounce=0.01, retry_delay=0.05)
+        self.queue.submit('a', shake_id='a')
+        # The queue keeps dispatching other keys meanwhile
+        self.queue.submit('b', shake_id='b')
+        self.assertTrue(wait_until(self.queue.is_idle))
+        self.assertEqual(self.calls, ['a', 'b', 'a', 'a'])
+
+    def test_dead_letter(self):
+        """Test a job failing every attempt is recorded and given up."""
+        dead_letter_path = os.path.join(temp_dir('test'), 'dead-letter')
+        shutil.rmtree(dead_letter_path, ignore_errors=True)
+
+        def process(shake_id):
+            self.calls.append(shake_id)
+            raise ValueError('Poisoned grid.xml')
+
+        self.queue = DebouncedWorkQueue(
+            process,
+            debounce=0.01,
+            max_attempts=3,
+            retry_delay=0.01,
+            dead_letter_dir=dead_letter_path)
+        self.queue.submit('a', shake_id='a')
+        self.assertTrue(wait_until(self.queue.is_idle))
+        self.assertEqual(self.calls, ['a', 'a', 'a'])
+
+        with open(os.path.join(dead_letter_path, 'a.json')) as record_file:
+            record = json.loads(record_file.read())
+        self.assertEqual(record['attempts'], 3)
+        self.assertEqual(record['kwargs'], {'shake_id': 'a'})
+        self.assertIn('Poisoned grid.xml', record['error'])
+        shutil.rmtree(dead_letter_path)
+
+
+if __name__ == '__main__':
+    suite = unittest.makeSuite(TestDebouncedWorkQueue, 'test')
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
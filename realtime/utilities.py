@@ -19,8 +19,10 @@ __date__ = '19/07/2012'
 __copyright__ = ('Copyright 2012, Australia Indonesia Facility for '
                  'Disaster Reduction')
 
+import errno
 import os
 import shutil
+import tempfile
 from datetime import datetime
 import ntpath
 
@@ -85,6 +87,16 @@ def report_data_dir():
     return dir_path
 
 
+def dead_letter_dir():
+    """Create (if needed) and return the path to the dead letter dir.
+
+    Events whose processing failed too many times are recorded there.
+    """
+    dir_path = os.path.join(base_data_dir(), 'dead-letter')
+    make_directory(dir_path)
+    return dir_path
+
+
 def make_directory(dir_path):
     """Make a directory, making sure it is world writable.
 
@@ -99,6 +111,45 @@ def make_directory(dir_path):
         os.umask(old_mask)
 
 
+def link_or_copy(source_path, target_path):
+    """Hard link a file into place, copying it if it can not be linked.
+
+    The target is replaced atomically. Linking fails when the paths are on
+    different filesystems or the filesystem has no hard links, the file is
+    copied then.
+
+    :param source_path: The file to link or copy.
+    :type source_path: str
+
+    :param target_path: The path of the link or copy.
+    :type target_path: str
+
+    :return: True if the file was linked, False if it was copied.
+    :rtype: bool
+    """
+    target_dir = os.path.dirname(os.path.abspath(target_path))
+    handle, temp_path = tempfile.mkstemp(
+        prefix='.%s-' % os.path.basename(target_path), dir=target_dir)
+    os.close(handle)
+    os.remove(temp_path)
+    try:
+        try:
+            os.link(source_path, temp_path)
+            linked = True
+        except OSError as e:
+            if e.errno not in (
+                    errno.EXDEV, errno.EPERM, errno.EMLINK,
+                    errno.EOPNOTSUPP):
+                raise
+            shutil.copyfile(source_path, temp_path)
+            linked = False
+        os.rename(temp_path, target_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return linked
+
+
 def purge_working_data():
     """Get rid of the shakemaps-* directories.
 
@@ -0,0 +1,327 @@
+# coding=utf-8
+"""
+InaSAFE Disaster risk assessment tool developed by AusAid and World Bank
+- **Debounced and deduplicating work queue for the file watchers.**
+
+Contact : ole.moller.nielsen@gmail.com
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+import itertools
+import json
+import logging
+import os
+import Queue
+import threading
+import time
+import traceback
+
+from realtime.utilities import make_directory, realtime_logger_name
+
+__author__ = 'akbargumbira@gmail.com'
+__date__ = '16/10/2026'
+
+LOGGER = logging.getLogger(realtime_logger_name())
+
+# Seconds without a new event for a key before its job is dispatched
+DEFAULT_DEBOUNCE = 5.0
+
+# Number of jobs run at the same time
+DEFAULT_WORKERS = 1
+
+# Number of times a job is run before it is given up
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Seconds before the first retry of a failed job, doubled for every retry
+# up to the maximum delay
+DEFAULT_RETRY_DELAY = 30.0
+DEFAULT_MAX_RETRY_DELAY = 30 * 60.0
+
+
+class DebouncedWorkQueue(object):
+    """Run a callback once per key after its events settle.
+
+    Every file system event submits its key (e.g. a shake id). The job of
+    a key is dispatched when no event came for the debounce window and its
+    file is complete: it was closed after writing or renamed into place, or
+    its size and mtime did not change during the window.
+
+    Events for a key already waiting are coalesced into one job. Events
+    for a key being processed are coalesced into a single rerun, which is
+    only dispatched after the new keys so a new shake never waits behind
+    the reprocessing of the previous one. Jobs run on a fixed number of
+    worker threads.
+
+    A job whose callback raises is retried after an exponential backoff,
+    behind the new keys too. After max_attempts failures it is given up
+    and recorded in the dead letter directory, until a new event comes for
+    its key.
+    """
+
+    def __init__(
+            self,
+            callback,
+            debounce=DEFAULT_DEBOUNCE,
+            workers=DEFAULT_WORKERS,
+            max_attempts=DEFAULT_MAX_ATTEMPTS,
+            retry_delay=DEFAULT_RETRY_DELAY,
+            max_retry_delay=DEFAULT_MAX_RETRY_DELAY,
+            dead_letter_dir=None):
+        """Constructor.
+
+        :param callback: Function called with the keyword arguments of the
+            submitted job. It raises to have the job retried.
+        :type callback: callable
+
+        :param debounce: (Optional) The debounce window in seconds.
+        :type debounce: float
+
+        :param workers: (Optional) The number of worker threads.
+        :type workers: int
+
+        :param max_attempts: (Optional) Number of runs of a failing job.
+        :type max_attempts: int
+
+        :param retry_delay: (Optional) Seconds before the first retry.
+        :type retry_delay: float
+
+        :param max_retry_delay: (Optional) Maximum seconds between retries.
+        :type max_retry_delay: float
+
+        :param dead_letter_dir: (Optional) Directory where the jobs given up
+            are recorded as <key>.json.
+        :type dead_letter_dir: str
+        """
+        self.callback = callback
+        self.debounce = debounce
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.dead_letter_dir = dead_letter_dir
+        self.condition = threading.Condition()
+        # key -> job waiting for its events to settle
+        self.pending = {}
+        # key -> job dispatched to the workers but not started
+        self.queued = {}
+        # keys of the running jobs, and the reruns submitted meanwhile
+        self.running = set()
+        self.reruns = {}
+        self.ready = Queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.stopped = False
+
+        self.threads = [threading.Thread(target=self._schedule)]
+        self.threads.extend(
+            threading.Thread(target=self._work) for _ in range(workers))
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, key, path=None, complete=False, **kwargs):
+        """Submit an event for a key.
+
+        :param key: The key coalescing the events e.g. the shake id.
+        :type key: str
+
+        :param path: (Optional) The file the job reads. It is checked for a
+            stable size before dispatching unless complete is True.
+        :type path: str
+
+        :param complete: (Optional) Whether the file is known to be
+            completely written, e.g. on close-write or rename.
+        :type complete: bool
+
+        :param kwargs: Keyword arguments of the callback.
+        """
+        with self.condition:
+            if key in self.running:
+                self.reruns[key] = self._job(
+                    key, path, complete, kwargs, self.reruns.get(key))
+                LOGGER.debug('%s is running, rerun scheduled' % key)
+                return
+
+            job = self.queued.pop(key, None)
+            if job is not None:
+                # Not started yet, wait again as the file changed
+                job['cancelled'] = True
+            job = self._job(
+                key, path, complete, kwargs, job or self.pending.get(key))
+            self.pending[key] = job
+            self.condition.notify_all()
+
+    def _job(self, key, path, complete, kwargs, previous=None):
+        """Create or update the job of a key."""
+        if previous is None:
+            job = {
+                'key': key,
+                'sequence': next(self.sequence),
+                'rerun': False}
+        else:
+            job = dict(previous, cancelled=False)
+        job['path'] = path
+        # A write after a close makes the file incomplete again
+        job['complete'] = complete
+        job['stat'] = self._stat(path)
+        job['kwargs'] = kwargs
+        job['deadline'] = time.time() + self.debounce
+        # New events give a failing job a new budget
+        job['attempts'] = 0
+        return job
+
+    def backoff(self, attempts):
+        """Seconds before retrying a job.
+
+        :param attempts: Number of failed runs of the job.
+        :type attempts: int
+
+        :rtype: float
+        """
+        return min(
+            self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+
+    @staticmethod
+    def _stat(path):
+        """Size and mtime of a file, None if there is no such file."""
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def _is_ready(self, job):
+        """Check whether the file of a due job is completely written.
+
+        The stat of the job is updated if the file is still changing.
+        """
+        if job['complete'] or job['path'] is None:
+            return True
+        stat = self._stat(job['path'])
+        if stat is not None and stat == job['stat']:
+            return True
+        job['stat'] = stat
+        return False
+
+    def _schedule(self):
+        """Move the jobs whose events settled to the ready queue."""
+        with self.condition:
+            while not self.stopped:
+                now = time.time()
+                for key, job in self.pending.items():
+                    if job['deadline'] > now:
+                        continue
+                    if not self._is_ready(job):
+                        LOGGER.debug('%s is still being written' % key)
+                        job['deadline'] = now + self.debounce
+                        continue
+                    del self.pending[key]
+                    self.queued[key] = job
+                    # New keys first, then reruns, each in submit order
+                    self.ready.put((job['rerun'], job['sequence'], job))
+
+                if self.pending:
+                    timeout = max(min(
+                        job['deadline'] for job in self.pending.values()
+                    ) - now, 0.01)
+                else:
+                    timeout = None
+                self.condition.wait(timeout)
+
+    def _work(self):
+        """Run the ready jobs."""
+        while True:
+            _, _, job = self.ready.get()
+            if job is None or self.stopped:
+                return
+            key = job['key']
+            with self.condition:
+                if job.get('cancelled') or self.queued.get(key) is not job:
+                    continue
+                del self.queued[key]
+                self.running.add(key)
+            error = None
+            # noinspection PyBroadException
+            try:
+                LOGGER.info('Processing %s' % key)
+                self.callback(**job['kwargs'])
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception('Processing %s failed' % key)
+                error = traceback.format_exc()
+            finally:
+                with self.condition:
+                    self.running.discard(key)
+                    rerun = self.reruns.pop(key, None)
+                    if rerun is None and error is not None:
+                        rerun = self._retry(job, error)
+                    if rerun is not None:
+                        rerun['rerun'] = True
+                        self.pending[key] = rerun
+                    self.condition.notify_all()
+
+    def _retry(self, job, error):
+        """Schedule the retry of a failed job or give it up.
+
+        :return: The job to retry, None if it is given up.
+        :rtype: dict
+        """
+        job['attempts'] += 1
+        if job['attempts'] >= self.max_attempts:
+            LOGGER.error('Giving up %s after %d attempts' % (
+                job['key'], job['attempts']))
+            self._dead_letter(job, error)
+            return None
+        delay = self.backoff(job['attempts'])
+        LOGGER.info('Retrying %s in %.0f seconds (attempt %d of %d)' % (
+            job['key'], delay, job['attempts'] + 1, self.max_attempts))
+        job = dict(job, cancelled=False)
+        # The file did not change, only the backoff is waited for
+        job['complete'] = True
+        job['deadline'] = time.time() + delay
+        return job
+
+    def _dead_letter(self, job, error):
+        """Record a job given up in the dead letter directory."""
+        if self.dead_letter_dir is None:
+            return
+        record = {
+            'key': job['key'],
+            'kwargs': job['kwargs'],
+            'path': job['path'],
+            'attempts': job['attempts'],
+            'failed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'error': error}
+        try:
+            make_directory(self.dead_letter_dir)
+            path = os.path.join(self.dead_letter_dir, '%s.json' % job['key'])
+            with open(path, 'w') as record_file:
+                record_file.write(json.dumps(record, indent=2, default=str))
+        except (IOError, OSError) as e:
+            LOGGER.exception(e)
+
+    def is_idle(self):
+        """Check whether there is no job waiting or running.
+
+        :rtype: bool
+        """
+        with self.condition:
+            return not (
+                self.pending or self.queued or self.running or self.reruns)
+
+    def stop(self, timeout=None):
+        """Stop the threads. Jobs not started yet are dropped.
+
+        :param timeout: (Optional) Seconds to wait for each thread.
+        :type timeout: float
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        for _ in self.threads[1:]:
+            self.ready.put((True, float('inf'), None))
+        for thread in self.threads:
+            thread.join(timeout)